@@ -0,0 +1,310 @@
+"""
+Benchmark the pipeline's heavy stages on synthetic panels of several sizes.
+
+Every stage is timed `--repeat` times on the same input (best and median
+wall time), then run once more under tracemalloc for its peak allocation.
+Tracing is kept out of the timed runs because it slows them down. One JSON
+line per stage and size is appended to benchmarks/history.jsonl, tagged with
+the git commit, so runs on two versions can be compared.
+
+Usage (from the DSC190/ folder):
+    python -m benchmarks.run                              # default sizes, all stages
+    python -m benchmarks.run --sizes 50x8 5000x20 --stages build_panel logspec_fe
+    python -m benchmarks.run --compare                    # flag slowdowns vs the previous commit
+"""
+import argparse
+import contextlib
+import datetime
+import gc
+import io
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import matplotlib
+matplotlib.use("Agg")
+
+import numpy as np
+import pandas as pd
+
+from src.config import PROJECT_ROOT
+from src.cleaning.build_panel import merge_panel
+from src.analysis.fixed_effects import fit_within
+from src.analysis.hdfe import fit_hdfe
+from src.analysis.bootstrap import fe_bootstrap
+from src.analysis.forecast_ev_panel import scenario_forecast, SWEEP_RATES
+from src.analysis.scenarios import evaluate_scenarios
+from src.analysis.arima_pool import run_arima_pool
+from src.visualization import plots
+from benchmarks.synthetic import synthetic_tables
+
+HISTORY_FILE = Path(__file__).resolve().parent / "history.jsonl"
+
+DEFAULT_SIZES = ["50x8", "500x8", "5000x20"]
+
+# Slowdown (best wall time vs the previous commit) reported as a regression
+DEFAULT_THRESHOLD = 0.20
+
+
+# =========================================================================================================
+# Stages: each takes the synthetic tables + merged panel and returns an output row count
+# =========================================================================================================
+def _log_panel(panel: pd.DataFrame) -> pd.DataFrame:
+    """The logspec / state_gas preparation: logs, trend and centered year."""
+    df = panel.dropna(subset=["ev_per_1000", "ports_per_100k", "gas_real_2023"]).copy()
+    df["log_ev_per_1000"] = np.log(df["ev_per_1000"].clip(lower=1e-3))
+    df["log_ports_per_100k"] = np.log(df["ports_per_100k"].clip(lower=1e-3))
+    df["log_gas_real_2023"] = np.log(df["gas_real_2023"])
+    df["Year_trend"] = df["year"] - df["year"].min()
+    df["year_centered"] = df["year"] - df["year"].mean()
+    return df
+
+
+def bench_build_panel(tables, panel, opts):
+    return len(merge_panel(**tables))
+
+
+def bench_logspec_fe(tables, panel, opts):
+    fe = fit_within(_log_panel(panel), "log_ev_per_1000", ["log_ports_per_100k", "Year_trend"],
+                    unit_col="state")
+    return fe.nobs
+
+
+def bench_logspec_bootstrap(tables, panel, opts):
+    boot = fe_bootstrap(_log_panel(panel), "log_ev_per_1000", ["log_ports_per_100k", "Year_trend"],
+                        unit_col="state", reps=opts.reps)
+    return len(boot)
+
+
+def bench_state_gas_fe(tables, panel, opts):
+    fe = fit_within(_log_panel(panel), "log_ev_per_1000", ["log_gas_real_2023", "year_centered"],
+                    unit_col="state")
+    return fe.nobs
+
+
+def bench_hdfe_trends(tables, panel, opts):
+    """State and year FE plus state-specific trends, two-way clustered."""
+    fe = fit_hdfe(_log_panel(panel), "log_ev_per_1000", ["log_ports_per_100k", "log_gas_real_2023"],
+                  absorb=["state", "year", "state#c.Year_trend"], cluster=["state", "year"])
+    return fe.nobs
+
+
+def _forecast_frame(panel):
+    merged = panel.rename(columns={
+        "state": "State", "year": "Year",
+        "ev_per_1000": "EVs_per_1000", "ports_per_100k": "Outlets_per_100k",
+    })[["State", "Year", "EVs_per_1000", "Outlets_per_100k"]].dropna()
+    merged["Year_trend"] = merged["Year"] - merged["Year"].min()
+    return merged
+
+
+def bench_forecast_scenarios(tables, panel, opts):
+    """FE fit, baseline forecast and the scenario cube, as in forecast_ev_panel."""
+    merged = _forecast_frame(panel)
+    model = fit_within(merged, "EVs_per_1000", ["Outlets_per_100k", "Year_trend"], unit_col="State")
+    first, last = int(merged["Year"].min()), int(merged["Year"].max())
+    years = list(range(last + 1, last + 6))
+    base = merged[merged["Year"] == last].set_index("State")[["Outlets_per_100k", "EVs_per_1000"]]
+    forecast = scenario_forecast(model, base, years, first, growth=0.2, value_col="forecast")
+    rates = np.concatenate([[0.2, 0.3], SWEEP_RATES])
+    cube = evaluate_scenarios(model, base["Outlets_per_100k"], years, first, rates)
+    return len(forecast) + cube.size
+
+
+def bench_forecast_arima(tables, panel, opts):
+    """
+    Per-unit ARIMA pool on the first `--arima-units` units (cost is linear in
+    units). The fits run in worker processes, so peak_mb covers only the parent.
+    """
+    merged = _forecast_frame(panel)
+    keep = merged["State"].cat.categories[:opts.arima_units]
+    merged = merged[merged["State"].isin(keep)]
+    merged["State"] = merged["State"].cat.remove_unused_categories()
+    last = int(merged["Year"].max())
+    forecasts, _ = run_arima_pool(merged, range(last + 1, last + 6))
+    return len(forecasts)
+
+
+def bench_plots(tables, panel, opts):
+    """The plots.py figures, rendered into a scratch folder."""
+    with tempfile.TemporaryDirectory() as tmp:
+        out_dir = Path(tmp)
+        plots.lineplot_top_states_ev(panel, top_n=5, out_dir=out_dir)
+        plots.scatter_ports_vs_ev(panel, out_dir=out_dir)
+        merged = plots.build_national_ev_gas(panel, tables["gas"])
+        plots.plot_ev_gas_timeseries(merged, out_dir=out_dir)
+        plots.plot_ev_vs_gas_scatter_levels(merged, out_dir=out_dir)
+        plots.plot_ev_vs_gas_scatter_growth(merged, out_dir=out_dir)
+        return len(list(out_dir.iterdir()))
+
+
+STAGES = {
+    "build_panel": bench_build_panel,
+    "logspec_fe": bench_logspec_fe,
+    "logspec_bootstrap": bench_logspec_bootstrap,
+    "state_gas_fe": bench_state_gas_fe,
+    "hdfe_trends": bench_hdfe_trends,
+    "forecast_scenarios": bench_forecast_scenarios,
+    "forecast_arima": bench_forecast_arima,
+    "plots": bench_plots,
+}
+
+
+# =========================================================================================================
+# Measurement
+# =========================================================================================================
+def measure(fn, args, repeat: int) -> dict:
+    """Best/median wall time over `repeat` runs, then one traced run for peak memory."""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        rows_out = fn(*args)
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "wall_best": min(times),
+        "wall_median": statistics.median(times),
+        "peak_mb": peak / 2**20,
+        "rows_out": int(rows_out),
+    }
+
+
+def parse_size(text: str) -> tuple[int, int]:
+    units, periods = text.lower().split("x")
+    return int(units), int(periods)
+
+
+def git_revision() -> dict:
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=PROJECT_ROOT, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    return {
+        "commit": git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no", "--", "src")),
+    }
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "node": platform.node(),
+    }
+
+
+# =========================================================================================================
+# History
+# =========================================================================================================
+def load_history(path=HISTORY_FILE) -> list[dict]:
+    if not path.exists():
+        return []
+    with path.open() as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def append_history(records: list[dict], path=HISTORY_FILE) -> None:
+    with path.open("a") as f:
+        for rec in records:
+            f.write(json.dumps(rec) + "\n")
+
+
+def find_regressions(records: list[dict], history: list[dict], threshold: float) -> list[str]:
+    """
+    Compare each record with the latest earlier record for the same stage and
+    size from a different commit on the same machine.
+    """
+    messages = []
+    for rec in records:
+        previous = [
+            h for h in history
+            if h["stage"] == rec["stage"] and h["units"] == rec["units"]
+            and h["periods"] == rec["periods"] and h["commit"] != rec["commit"]
+            and h["env"].get("node") == rec["env"].get("node")
+        ]
+        if not previous:
+            continue
+        prev = previous[-1]
+        ratio = rec["wall_best"] / prev["wall_best"] if prev["wall_best"] > 0 else np.inf
+        if ratio > 1.0 + threshold:
+            messages.append(
+                f"{rec['stage']} {rec['units']}x{rec['periods']}: {prev['wall_best']:.3f}s "
+                f"({prev['commit']}) -> {rec['wall_best']:.3f}s ({rec['commit']}), {ratio:.2f}x"
+            )
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline stages on synthetic panels.")
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES, help="UNITSxPERIODS, e.g. 500x8")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--reps", type=int, default=199, help="bootstrap replications")
+    parser.add_argument("--arima-units", type=int, default=50, help="units fitted in forecast_arima")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--history", type=Path, default=HISTORY_FILE)
+    parser.add_argument("--no-save", action="store_true", help="do not append to the history")
+    parser.add_argument("--compare", action="store_true",
+                        help="exit with status 1 if a stage is slower than on the previous commit")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    opts = parser.parse_args()
+
+    run_info = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        **git_revision(),
+        "env": environment(),
+    }
+    records = []
+    for size in opts.sizes:
+        n_units, n_periods = parse_size(size)
+        tables = synthetic_tables(n_units, n_periods, seed=opts.seed)
+        panel = merge_panel(**tables)
+        panel["state"] = panel["state"].astype("category")
+
+        for name in opts.stages:
+            # Stage output (figure paths, summaries) is noise here
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = measure(STAGES[name], (tables, panel, opts), opts.repeat)
+
+            rec = {**run_info, "stage": name, "units": n_units, "periods": n_periods,
+                   "rows_in": len(panel), "repeat": opts.repeat, **result}
+            records.append(rec)
+            print(f"{name:<20} {size:>10}  best {result['wall_best']:8.3f}s  "
+                  f"median {result['wall_median']:8.3f}s  peak {result['peak_mb']:8.1f} MB")
+
+    history = load_history(opts.history)
+    if not opts.no_save:
+        append_history(records, opts.history)
+        print(f"\nAppended {len(records)} results to {opts.history}")
+
+    if opts.compare:
+        regressions = find_regressions(records, history, opts.threshold)
+        if regressions:
+            print(f"\nSlower than the previous commit by more than {opts.threshold:.0%}:")
+            for msg in regressions:
+                print("  " + msg)
+            sys.exit(1)
+        print("\nNo regressions against the previous commit.")
+
+
+if __name__ == "__main__":
+    main()
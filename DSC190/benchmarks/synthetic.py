@@ -0,0 +1,143 @@
+"""
+Synthetic state panels shaped like the real one, at any size.
+
+Each unit gets a log-linear path for EVs per 1,000 and ports per 100k whose
+level, growth rate and noise are drawn to match the real panel: correlated
+state intercepts and slopes, plus small idiosyncratic noise. Population is
+lognormal with slow growth, and the gas price is one common series with
+year-to-year log shocks. The default moments were estimated from the
+2020-2023 state panel with `calibrate`.
+
+`synthetic_tables` returns the four cleaned tables (ev, ports, pop, gas) in
+the shapes the parsers write, so build_panel can be timed on them.
+`synthetic_panel` returns the merged panel that the analysis stages read.
+"""
+import numpy as np
+import pandas as pd
+
+from src.cleaning.build_panel import merge_panel
+
+# Per-unit log-linear paths: log(value) = intercept + slope * t + noise
+DEFAULT_MOMENTS = {
+    "ev_intercept": (0.38, 0.99),       # (mean, sd) at the first year
+    "ev_slope": (0.46, 0.058),
+    "ev_noise": 0.04,
+    "ports_intercept": (3.13, 0.77),
+    "ports_slope": (0.18, 0.057),
+    "ports_noise": 0.037,
+    "corr_intercepts": 0.72,
+    "corr_slopes": 0.45,
+    "log_population": (15.2, 1.02),
+    "population_growth": (0.0053, 0.0064),
+    "gas_start": 2.56,
+    "gas_log_shock": 0.25,
+}
+
+FIRST_YEAR = 2000
+
+
+def _correlated_normals(rng, n, mean_a, mean_b, corr):
+    """n draws of two correlated normals with (mean, sd) pairs mean_a, mean_b."""
+    z = rng.standard_normal((n, 2))
+    z[:, 1] = corr * z[:, 0] + np.sqrt(1.0 - corr**2) * z[:, 1]
+    return mean_a[0] + mean_a[1] * z[:, 0], mean_b[0] + mean_b[1] * z[:, 1]
+
+
+def synthetic_tables(n_units: int, n_periods: int, seed: int = 0,
+                     moments: dict = None, first_year: int = FIRST_YEAR) -> dict:
+    """
+    Cleaned tables for `n_units` units x `n_periods` years:
+    ev (state, state_fips, year, ev_count), ports (state, state_fips,
+    ports_total, year), pop (state_fips, state, year, population) and
+    gas (year, gas_real_2023).
+    """
+    m = {**DEFAULT_MOMENTS, **(moments or {})}
+    rng = np.random.default_rng(seed)
+
+    codes = np.arange(1, n_units + 1, dtype=np.int32)
+    names = np.char.add("Unit ", np.char.zfill(codes.astype(str), 6))
+    years = np.arange(first_year, first_year + n_periods, dtype=np.int16)
+    t = np.arange(n_periods, dtype=float)
+
+    ev_a, ports_a = _correlated_normals(
+        rng, n_units, m["ev_intercept"], m["ports_intercept"], m["corr_intercepts"]
+    )
+    ev_b, ports_b = _correlated_normals(
+        rng, n_units, m["ev_slope"], m["ports_slope"], m["corr_slopes"]
+    )
+    shape = (n_units, n_periods)
+    log_ev = ev_a[:, None] + ev_b[:, None] * t + m["ev_noise"] * rng.standard_normal(shape)
+    log_ports = ports_a[:, None] + ports_b[:, None] * t + m["ports_noise"] * rng.standard_normal(shape)
+
+    pop0 = rng.normal(*m["log_population"], n_units)
+    pop_growth = rng.normal(*m["population_growth"], n_units)
+    population = np.round(np.exp(pop0[:, None] + pop_growth[:, None] * t))
+
+    # Rows in unit-major order, as the cleaned tables are
+    state = np.repeat(names, n_periods)
+    state_fips = np.repeat(codes, n_periods)
+    year = np.tile(years, n_units)
+
+    ev = pd.DataFrame({
+        "state": state,
+        "state_fips": state_fips,
+        "year": year,
+        "ev_count": np.round(np.exp(log_ev) * population / 1000).astype(np.int64).ravel(),
+    })
+    ports = pd.DataFrame({
+        "state": state,
+        "state_fips": state_fips,
+        "ports_total": np.round(np.exp(log_ports) * population / 100_000).ravel(),
+        "year": year,
+    })
+    pop = pd.DataFrame({
+        "state_fips": state_fips,
+        "state": state,
+        "year": year,
+        "population": population.ravel(),
+    })
+    gas_path = m["gas_start"] * np.exp(np.cumsum(
+        np.r_[0.0, m["gas_log_shock"] * rng.standard_normal(n_periods - 1)]
+    ))
+    gas = pd.DataFrame({"year": years, "gas_real_2023": gas_path})
+    return {"ev": ev, "ports": ports, "pop": pop, "gas": gas}
+
+
+def synthetic_panel(n_units: int, n_periods: int, seed: int = 0, moments: dict = None) -> pd.DataFrame:
+    """Merged panel (PANEL_COLUMNS) with a categorical `state`, as read_table returns it."""
+    panel = merge_panel(**synthetic_tables(n_units, n_periods, seed, moments))
+    panel["state"] = panel["state"].astype("category")
+    return panel
+
+
+def calibrate(panel: pd.DataFrame) -> dict:
+    """Estimate DEFAULT_MOMENTS-style moments from a real state panel."""
+    panel = panel.dropna(subset=["ev_per_1000", "ports_per_100k", "population"])
+    out = {}
+    fits = {}
+    for col, key in [("ev_per_1000", "ev"), ("ports_per_100k", "ports")]:
+        rows = []
+        for _, g in panel.groupby("state", observed=True):
+            if len(g) < 2:
+                continue
+            t = (g["year"] - panel["year"].min()).to_numpy(dtype=float)
+            y = np.log(g[col].clip(lower=1e-3).to_numpy(dtype=float))
+            slope, intercept = np.polyfit(t, y, 1)
+            rows.append((intercept, slope, np.std(y - (intercept + slope * t))))
+        fits[key] = np.array(rows)
+        out[f"{key}_intercept"] = (fits[key][:, 0].mean(), fits[key][:, 0].std())
+        out[f"{key}_slope"] = (fits[key][:, 1].mean(), fits[key][:, 1].std())
+        out[f"{key}_noise"] = fits[key][:, 2].mean()
+    out["corr_intercepts"] = np.corrcoef(fits["ev"][:, 0], fits["ports"][:, 0])[0, 1]
+    out["corr_slopes"] = np.corrcoef(fits["ev"][:, 1], fits["ports"][:, 1])[0, 1]
+
+    by_state = panel.groupby("state", observed=True)["population"]
+    log_pop = np.log(by_state.mean())
+    growth = by_state.apply(lambda s: np.log(s).diff().mean())
+    out["log_population"] = (log_pop.mean(), log_pop.std())
+    out["population_growth"] = (growth.mean(), growth.std())
+
+    gas = panel.groupby("year")["gas_real_2023"].first().dropna()
+    out["gas_start"] = gas.iloc[0]
+    out["gas_log_shock"] = np.log(gas).diff().std()
+    return {k: tuple(float(x) for x in v) if isinstance(v, tuple) else float(v) for k, v in out.items()}
@@ -0,0 +1,168 @@
+"""
+Per-state ARIMA forecasts fitted across a process pool.
+
+Each state's series is fitted for every order in a small grid and the order
+with the lowest AIC is kept. Every individual fit is bounded by a timeout
+(enforced with SIGALRM where the platform supports it and the fit runs on the
+main thread; elsewhere fits run unbounded), and
+states whose fits all fail are reported with the reason instead of being
+dropped silently.
+"""
+import os
+import signal
+import threading
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Small (p, d, q) grid searched per state; d=1 keeps the trending level series
+# consistent with the original ARIMA(1, 1, 0) spec.
+DEFAULT_ORDERS = [(0, 1, 0), (1, 1, 0), (0, 1, 1), (1, 1, 1), (2, 1, 0)]
+
+
+class FitTimeout(Exception):
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise FitTimeout("fit exceeded timeout")
+
+
+def _fit_with_timeout(values: np.ndarray, order, timeout: float, start_params=None, **fit_kwargs):
+    """
+    Fit ARIMA(order). `start_params` warm-starts the optimizer (e.g. from a
+    previous fit); `fit_kwargs` go to ARIMA.fit.
+    """
+    from statsmodels.tsa.arima.model import ARIMA
+
+    # Signal handlers can only be installed from the main thread
+    use_alarm = (
+        timeout
+        and hasattr(signal, "setitimer")
+        and threading.current_thread() is threading.main_thread()
+    )
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        # Short series trigger start-parameter and convergence warnings on most fits
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            return ARIMA(values, order=order).fit(start_params=start_params, **fit_kwargs)
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+
+def fit_state(task: tuple) -> dict:
+    """
+    Fit every order for one state and forecast with the best one by AIC.
+
+    `task` is (state, values, orders, steps, timeout). Returns a dict with
+    state, order, aic, forecast (array or None) and error (str or None; set
+    as well when the state has a forecast but some orders failed or timed out).
+    """
+    state, values, orders, steps, timeout = task
+    best = None
+    errors = []
+    for order in orders:
+        try:
+            res = _fit_with_timeout(values, order, timeout)
+        except Exception as exc:  # keep going with the other orders
+            errors.append(f"{order}: {type(exc).__name__}: {exc}")
+            continue
+        if not np.isfinite(res.aic):
+            errors.append(f"{order}: non-finite AIC")
+            continue
+        if best is None or res.aic < best[1]:
+            best = (order, res.aic, res)
+
+    if best is None:
+        return {
+            "state": state,
+            "order": None,
+            "aic": np.nan,
+            "forecast": None,
+            "error": "; ".join(errors) or "no orders tried",
+        }
+
+    order, aic, res = best
+    return {
+        "state": state,
+        "order": order,
+        "aic": float(aic),
+        "forecast": np.asarray(res.forecast(steps=steps), dtype=float),
+        "error": "; ".join(errors) or None,
+    }
+
+
+def run_arima_pool(
+    df: pd.DataFrame,
+    forecast_years,
+    unit_col: str = "State",
+    time_col: str = "Year",
+    value_col: str = "EVs_per_1000",
+    orders=DEFAULT_ORDERS,
+    timeout: float = 30.0,
+    min_obs: int = 3,
+    max_workers: int = None,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Fit per-unit ARIMA models in parallel.
+
+    Returns (forecasts, fits):
+      forecasts: unit, Year, EVs_per_1000_arima
+      fits     : unit, n_obs, status ('ok' / 'partial' / 'failed' / 'too_short'), order, aic, error
+                 ('partial': forecast from the orders that fitted; error lists the rest)
+    """
+    forecast_years = list(forecast_years)
+    steps = len(forecast_years)
+
+    tasks = []
+    fit_rows = []
+    ordered = df.sort_values([unit_col, time_col])
+    for unit, g in ordered.groupby(unit_col, observed=True, sort=True):
+        values = g[value_col].to_numpy(dtype=float)
+        if len(values) < min_obs:
+            fit_rows.append({
+                unit_col: unit, "n_obs": len(values), "status": "too_short",
+                "order": None, "aic": np.nan,
+                "error": f"needs at least {min_obs} observations",
+            })
+            continue
+        tasks.append((unit, values, list(orders), steps, timeout))
+
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1 or len(tasks) <= 1:
+        results = [fit_state(t) for t in tasks]
+    else:
+        chunksize = max(1, len(tasks) // (max_workers * 4))
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(fit_state, tasks, chunksize=chunksize))
+
+    forecast_rows = []
+    for task, res in zip(tasks, results):
+        unit = res["state"]
+        fit_rows.append({
+            unit_col: unit,
+            "n_obs": len(task[1]),
+            "status": (
+                "failed" if res["forecast"] is None
+                else "ok" if res["error"] is None
+                else "partial"
+            ),
+            "order": None if res["order"] is None else str(res["order"]),
+            "aic": res["aic"],
+            "error": res["error"],
+        })
+        if res["forecast"] is None:
+            continue
+        for y, v in zip(forecast_years, res["forecast"]):
+            forecast_rows.append({unit_col: unit, time_col: y, f"{value_col}_arima": v})
+
+    forecasts = pd.DataFrame(forecast_rows, columns=[unit_col, time_col, f"{value_col}_arima"])
+    fits = pd.DataFrame(fit_rows).sort_values(unit_col).reset_index(drop=True)
+    return forecasts, fits
@@ -0,0 +1,307 @@
+"""
+Rolling-origin backtest of the panel FE and per-state ARIMA forecasts.
+
+For every origin year from the `min_train`-th observed year to the
+second-to-last, both models are refitted on the years up to the origin
+(expanding window) and forecast up to `horizon` years ahead, the same way
+forecast_ev_panel makes the real forecast:
+
+- panel: state FE model on Outlets_per_100k + Year_trend, with outlets
+  projected at the average outlet growth seen up to the origin (the
+  baseline scenario);
+- arima: per-state order search by AIC over DEFAULT_ORDERS.
+
+The forecasts are scored against the held-out years, and MAE and MAPE are
+reported per method, state and horizon.
+
+The panel folds are closed-form within fits of a few milliseconds each, so
+they run in the parent. The ARIMA folds are the expensive part and run
+across a process pool, one task per state. Each task walks its origins in
+order and warm-starts every order from its parameters at the previous
+origin: one extra year barely moves them, so the optimizer converges in a
+few iterations. With reselect_orders=False only the first origin searches
+every order and later origins refit the chosen one. Every fit keeps the
+pool's per-fit timeout, so a full backtest takes a bounded time.
+
+Usage (from the DSC190/ folder):
+    python -m src.analysis.backtest
+    python -m src.analysis.backtest --horizon 3 --min-train 4 --no-reselect
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.config import PANEL_FILE, FORECAST_DIR, TEXT_SUMMARIES_DIR
+from src.storage import read_table
+from src.instrument import record
+from src.analysis.model_cache import cached_fit_within
+from src.analysis.arima_pool import DEFAULT_ORDERS, _fit_with_timeout
+from src.analysis.forecast_ev_panel import scenario_forecast
+
+BACKTEST_FORECASTS_FILE = FORECAST_DIR / "backtest_forecasts.csv"
+BACKTEST_METRICS_FILE = FORECAST_DIR / "backtest_metrics.csv"
+BACKTEST_SUMMARY_FILE = TEXT_SUMMARIES_DIR / "backtest_summary.txt"
+
+
+def origin_years(years, min_train: int) -> list[int]:
+    """Origins with at least `min_train` years of history and one year to score."""
+    years = sorted({int(y) for y in years})
+    return years[min_train - 1:-1]
+
+
+# =========================================================================================================
+# Panel FE folds (parent process)
+# =========================================================================================================
+def panel_backtest(merged: pd.DataFrame, origins: list[int], horizon: int) -> pd.DataFrame:
+    """Baseline-scenario panel forecasts from every origin: State, origin, Year, horizon, forecast."""
+    first_year = int(merged["Year"].min())
+    last_year = int(merged["Year"].max())
+    outlets_first = merged[merged["Year"] == first_year].set_index("State")["Outlets_per_100k"]
+
+    frames = []
+    for origin in origins:
+        train = merged[merged["Year"] <= origin]
+        model = cached_fit_within(
+            train, "EVs_per_1000", ["Outlets_per_100k", "Year_trend"], unit_col="State"
+        )
+
+        state_base = train[train["Year"] == origin].set_index("State")[["Outlets_per_100k", "EVs_per_1000"]]
+        pct_growth = state_base["Outlets_per_100k"] / outlets_first - 1.0
+        avg_pct_growth = pct_growth.replace([np.inf, -np.inf], np.nan).dropna().mean()
+
+        years = list(range(origin + 1, min(origin + horizon, last_year) + 1))
+        fc = scenario_forecast(model, state_base, years, first_year,
+                               growth=avg_pct_growth, value_col="forecast")
+        fc["origin"] = origin
+        frames.append(fc[["State", "origin", "Year", "forecast"]])
+
+    out = pd.concat(frames, ignore_index=True)
+    out["horizon"] = out["Year"] - out["origin"]
+    return out
+
+
+# =========================================================================================================
+# ARIMA folds (worker processes)
+# =========================================================================================================
+def _fit_warm(train: np.ndarray, order, timeout: float, start_params):
+    """
+    Fit from `start_params` when given, falling back to the default start.
+    Returns (res, warm). Only AIC and point forecasts are used, so the
+    parameter covariance is skipped.
+    """
+    if start_params is not None:
+        try:
+            res = _fit_with_timeout(train, order, timeout, start_params=start_params, cov_type="none")
+            return res, True
+        except Exception:
+            pass  # a bad warm start; retry from scratch
+    return _fit_with_timeout(train, order, timeout, cov_type="none"), False
+
+
+def backtest_state(task: tuple) -> dict:
+    """
+    Every origin for one state, in order, warm-starting each order from the
+    previous origin's fit.
+
+    `task` is (state, years, values, origins, horizon, last_year, orders,
+    timeout, reselect_orders, min_obs). Returns a dict with state, rows
+    (origin, Year, horizon, forecast, order), errors, fits and warm_fits.
+    """
+    state, years, values, origins, horizon, last_year, orders, timeout, reselect, min_obs = task
+    warm = {}
+    chosen = None
+    rows, errors = [], []
+    fits = warm_fits = 0
+
+    for origin in origins:
+        train = values[years <= origin]
+        if len(train) < min_obs:
+            continue
+        search = orders if (reselect or chosen is None) else [chosen]
+
+        best = None
+        failed = []
+        for order in search:
+            try:
+                res, was_warm = _fit_warm(train, order, timeout, warm.get(order))
+            except Exception as exc:
+                failed.append(f"{order}: {type(exc).__name__}: {exc}")
+                continue
+            fits += 1
+            warm_fits += was_warm
+            if not np.isfinite(res.aic):
+                failed.append(f"{order}: non-finite AIC")
+                continue
+            warm[order] = res.params
+            if best is None or res.aic < best[1]:
+                best = (order, res.aic, res)
+
+        if best is None:
+            errors.append(f"origin {origin}: " + ("; ".join(failed) or "no orders tried"))
+            continue
+        chosen, _, res = best
+        steps = min(horizon, last_year - origin)
+        for h, value in enumerate(np.asarray(res.forecast(steps=steps), dtype=float), start=1):
+            rows.append((origin, origin + h, h, value, str(chosen)))
+
+    return {"state": state, "rows": rows, "errors": errors, "fits": fits, "warm_fits": warm_fits}
+
+
+def arima_backtest(
+    merged: pd.DataFrame,
+    origins: list[int],
+    horizon: int,
+    orders=DEFAULT_ORDERS,
+    timeout: float = 30.0,
+    reselect_orders: bool = True,
+    min_obs: int = 3,
+    max_workers: int = None,
+) -> tuple[pd.DataFrame, list[str]]:
+    """
+    ARIMA forecasts from every origin for every state, states in parallel.
+    Returns (forecasts with State, origin, Year, horizon, forecast, order; error messages).
+    """
+    last_year = int(merged["Year"].max())
+    tasks = []
+    for state, g in merged.sort_values(["State", "Year"]).groupby("State", observed=True, sort=True):
+        tasks.append((
+            state, g["Year"].to_numpy(dtype=int), g["EVs_per_1000"].to_numpy(dtype=float),
+            origins, horizon, last_year, list(orders), timeout, reselect_orders, min_obs,
+        ))
+
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1 or len(tasks) <= 1:
+        results = [backtest_state(t) for t in tasks]
+    else:
+        chunksize = max(1, len(tasks) // (max_workers * 4))
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(backtest_state, tasks, chunksize=chunksize))
+
+    rows, errors = [], []
+    fits = warm_fits = 0
+    for res in results:
+        rows.extend((res["state"], *row) for row in res["rows"])
+        errors.extend(f"{res['state']}: {msg}" for msg in res["errors"])
+        fits += res["fits"]
+        warm_fits += res["warm_fits"]
+    record(arima_fits=fits, warm_starts=warm_fits)
+    print(f"ARIMA backtest: {fits} fits, {warm_fits} warm-started")
+
+    forecasts = pd.DataFrame(rows, columns=["State", "origin", "Year", "horizon", "forecast", "order"])
+    return forecasts, errors
+
+
+# =========================================================================================================
+# Scoring
+# =========================================================================================================
+def score(forecasts: pd.DataFrame, actual: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Join forecasts (method, State, origin, Year, horizon, forecast) to the
+    actual EVs_per_1000. Returns (scored rows, MAE/MAPE per method, state and horizon).
+    """
+    actual = actual[["State", "Year", "EVs_per_1000"]].rename(columns={"EVs_per_1000": "actual"})
+    scored = forecasts.merge(actual, on=["State", "Year"], how="inner")
+    scored["abs_error"] = (scored["forecast"] - scored["actual"]).abs()
+    # APE in percent; undefined where the actual value is zero
+    scored["ape"] = scored["abs_error"] / scored["actual"].where(scored["actual"] != 0) * 100.0
+
+    metrics = (
+        scored.groupby(["method", "State", "horizon"], observed=True)
+        .agg(n=("abs_error", "size"), MAE=("abs_error", "mean"), MAPE=("ape", "mean"))
+        .reset_index()
+    )
+    return scored, metrics
+
+
+def summary_lines(scored: pd.DataFrame, metrics: pd.DataFrame, origins: list[int],
+                  errors: list[str], elapsed: float) -> list[str]:
+    overall = (
+        scored.groupby(["horizon", "method"])
+        .agg(MAE=("abs_error", "mean"), MAPE=("ape", "mean"))
+        .unstack("method")
+    )
+
+    lines = []
+    lines.append("Rolling-origin backtest: panel FE vs per-state ARIMA\n")
+    lines.append("----------------------------------------------------\n\n")
+    lines.append(
+        f"Origins: {origins[0]}–{origins[-1]} ({len(origins)} folds, expanding window); "
+        f"targets are EVs per 1,000 residents in the held-out years.\n"
+    )
+    lines.append(f"States scored: {scored['State'].nunique()}, forecasts scored: {len(scored)}\n\n")
+
+    lines.append("Mean error across states and origins, by horizon (years ahead):\n")
+    lines.append(f"  {'h':>2}  {'MAE panel':>10} {'MAE ARIMA':>10}  {'MAPE panel':>10} {'MAPE ARIMA':>10}\n")
+    for h, row in overall.iterrows():
+        lines.append(
+            f"  {h:>2}  {row.get(('MAE', 'panel'), np.nan):10.3f} {row.get(('MAE', 'arima'), np.nan):10.3f}"
+            f"  {row.get(('MAPE', 'panel'), np.nan):9.1f}% {row.get(('MAPE', 'arima'), np.nan):9.1f}%\n"
+        )
+
+    one_step = metrics[metrics["horizon"] == 1].pivot(index="State", columns="method", values="MAE").dropna()
+    if {"panel", "arima"} <= set(one_step.columns):
+        wins = int((one_step["panel"] < one_step["arima"]).sum())
+        lines.append(f"\nStates where the panel model has the lower 1-year MAE: {wins} of {len(one_step)}\n")
+
+    if errors:
+        lines.append(f"\nARIMA folds not fitted ({len(errors)}):\n")
+        for msg in errors:
+            lines.append(f"  {msg}\n")
+    lines.append(f"\nBacktest run time: {elapsed:.1f}s\n")
+    return lines
+
+
+def main(horizon: int = 5, min_train: int = 3, reselect_orders: bool = True, max_workers: int = None):
+    start = time.perf_counter()
+    panel = read_table(PANEL_FILE, columns=["state", "year", "ev_per_1000", "ports_per_100k"])
+    merged = panel.rename(columns={
+        "state": "State", "year": "Year",
+        "ev_per_1000": "EVs_per_1000", "ports_per_100k": "Outlets_per_100k",
+    }).dropna()
+    merged["State"] = merged["State"].cat.remove_unused_categories()
+    # Trend from the first observed year, as in the full-sample fit
+    merged["Year_trend"] = merged["Year"] - merged["Year"].min()
+
+    origins = origin_years(merged["Year"], min_train)
+    if not origins:
+        raise ValueError(f"Need more than {min_train} years of data to backtest")
+
+    panel_fc = panel_backtest(merged, origins, horizon)
+    panel_fc["method"] = "panel"
+    arima_fc, errors = arima_backtest(merged, origins, horizon, reselect_orders=reselect_orders,
+                                      max_workers=max_workers)
+    arima_fc["method"] = "arima"
+
+    forecasts = pd.concat([panel_fc, arima_fc], ignore_index=True)
+    scored, metrics = score(forecasts, merged)
+    elapsed = time.perf_counter() - start
+
+    scored = scored[["method", "State", "origin", "Year", "horizon", "order",
+                     "forecast", "actual", "abs_error", "ape"]]
+    scored.sort_values(["method", "State", "origin", "horizon"]).to_csv(BACKTEST_FORECASTS_FILE, index=False)
+    metrics.to_csv(BACKTEST_METRICS_FILE, index=False)
+    record(rows_out=len(scored) + len(metrics))
+
+    lines = summary_lines(scored, metrics, origins, errors, elapsed)
+    with BACKTEST_SUMMARY_FILE.open("w") as f:
+        f.writelines(lines)
+    print("".join(lines))
+
+    print(f"Saved backtest forecasts to {BACKTEST_FORECASTS_FILE}")
+    print(f"Saved backtest metrics to {BACKTEST_METRICS_FILE}")
+    print(f"Saved backtest summary to {BACKTEST_SUMMARY_FILE}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest of panel FE vs ARIMA forecasts.")
+    parser.add_argument("--horizon", type=int, default=5, help="years ahead scored from each origin")
+    parser.add_argument("--min-train", type=int, default=3, help="years of history at the first origin")
+    parser.add_argument("--no-reselect", action="store_true",
+                        help="pick ARIMA orders at the first origin only, then refit that order")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    main(args.horizon, args.min_train, not args.no_reselect, args.workers)
@@ -0,0 +1,191 @@
+"""
+Closed-form collinearity diagnostics for FE regressions.
+
+statsmodels' variance_inflation_factor runs one auxiliary OLS per regressor.
+Here all VIFs come from a single cross-product of the design: with R the
+regressor correlation matrix, VIF_j = [R^-1]_jj. The constant's (uncentered)
+VIF, as the notebook reported it, is 1 + z' R^-1 z with z the column means
+over their standard deviations. The same pass gives the correlation matrix
+and two condition numbers:
+
+- cond: sqrt(max/min eigenvalue) of R, i.e. the condition number of the
+  standardized regressors;
+- cond_scaled: the Belsley condition number of [1, X] with unit-length
+  columns, which also flags near-constant regressors.
+
+Every diagnostic is computed on the raw design and on the within (state
+demeaned) design that the FE estimator actually uses. `diagnose` costs
+O(n k^2), so logspec and state_gas run it before every fit.
+
+Usage (from the DSC190/ folder):
+    python -m src.analysis.collinearity    # the notebook's main/reverse causal specs
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from src.config import PANEL_FILE, CAUSAL_DIR
+from src.storage import read_table
+from src.lags import add_lags
+from src.analysis.fixed_effects import demean
+
+# Above this a VIF or condition number is flagged in summaries
+VIF_WARN = 10.0
+COND_WARN = 30.0
+
+
+@dataclass
+class DesignStats:
+    vif: pd.Series  # includes "const"
+    corr: pd.DataFrame
+    cond: float
+    cond_scaled: float
+    singular_values: np.ndarray  # of the standardized regressors, largest first
+
+
+@dataclass
+class CollinearityReport:
+    variables: list
+    nobs: int
+    raw: DesignStats
+    within: DesignStats
+
+    def vif_table(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            "variable": self.raw.vif.index,
+            "VIF_raw": self.raw.vif.to_numpy(),
+            "VIF_within": self.within.vif.to_numpy(),
+        })
+
+    def condition_table(self) -> pd.DataFrame:
+        """stat, raw, within (as the notebook's condition_*.csv, for both designs)."""
+        stats = ["cond_num", "cond_scaled"]
+        raw = [self.raw.cond, self.raw.cond_scaled]
+        within = [self.within.cond, self.within.cond_scaled]
+        for i, (a, b) in enumerate(zip(self.raw.singular_values, self.within.singular_values)):
+            stats.append(f"sv{i + 1}")
+            raw.append(a)
+            within.append(b)
+        return pd.DataFrame({"stat": stats, "raw": raw, "within": within})
+
+    def summary_text(self) -> str:
+        lines = [f"Collinearity diagnostics ({self.nobs} obs)"]
+        lines.append(f"  {'variable':<24} {'VIF raw':>10} {'VIF within':>11}")
+        for var in self.variables:
+            lines.append(f"  {var:<24} {self.raw.vif[var]:10.2f} {self.within.vif[var]:11.2f}")
+        lines.append(
+            f"  Condition number: {self.raw.cond:.1f} raw, {self.within.cond:.1f} within "
+            f"(scaled with constant: {self.raw.cond_scaled:.1f})"
+        )
+        warnings = self.warnings()
+        for msg in warnings:
+            lines.append(f"  Warning: {msg}")
+        return "\n".join(lines) + "\n"
+
+    def warnings(self) -> list[str]:
+        out = []
+        for design, s in (("raw", self.raw), ("within", self.within)):
+            for var in self.variables:
+                if not np.isfinite(s.vif[var]) or s.vif[var] > VIF_WARN:
+                    out.append(f"VIF of {var} ({design}) is {s.vif[var]:.1f}")
+            if not np.isfinite(s.cond) or s.cond > COND_WARN:
+                out.append(f"{design} condition number is {s.cond:.1f}")
+        return out
+
+
+def design_stats(X: np.ndarray, names: list[str]) -> DesignStats:
+    """VIFs, correlation matrix and condition numbers of X (n, k) from one cross-product."""
+    n, k = X.shape
+    mean = X.mean(axis=0)
+    G = X.T @ X
+    cov = G / n - np.outer(mean, mean)
+    sd = np.sqrt(np.clip(np.diag(cov), 0.0, None))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        R = cov / np.outer(sd, sd)
+    varying = sd > 1e-12 * np.maximum(np.abs(mean), 1.0)
+    R[~varying, :] = np.nan
+    R[:, ~varying] = np.nan
+    np.fill_diagonal(R, np.where(varying, 1.0, np.nan))
+
+    vif = np.full(k, np.inf)
+    const_vif = np.inf
+    eig = np.full(k, np.nan)
+    if varying.all():
+        eig = np.linalg.eigvalsh(R)[::-1]
+        if eig[-1] > 1e-12:
+            Rinv = np.linalg.inv(R)
+            vif = np.diag(Rinv).copy()
+            z = mean / sd
+            const_vif = 1.0 + z @ Rinv @ z
+    cond = float(np.sqrt(eig[0] / eig[-1])) if eig[-1] > 0 else np.inf
+
+    # Belsley scaling: [1, X] with every column scaled to unit length
+    Z = np.empty((k + 1, k + 1))
+    Z[0, 0], Z[0, 1:], Z[1:, 0], Z[1:, 1:] = n, n * mean, n * mean, G
+    norms = np.sqrt(np.diag(Z))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scaled = np.linalg.eigvalsh(Z / np.outer(norms, norms)) if (norms > 0).all() else np.array([0.0, 1.0])
+    cond_scaled = float(np.sqrt(scaled[-1] / scaled[0])) if scaled[0] > 1e-15 else np.inf
+
+    return DesignStats(
+        vif=pd.Series(np.r_[const_vif, vif], index=["const", *names], name="VIF"),
+        corr=pd.DataFrame(R, index=names, columns=names),
+        cond=cond,
+        cond_scaled=cond_scaled,
+        singular_values=np.sqrt(np.clip(eig * n, 0.0, None)),
+    )
+
+
+def diagnose(df: pd.DataFrame, x: list[str], unit_col: str) -> CollinearityReport:
+    """Raw and within-unit diagnostics for regressors `x` (rows with missing values dropped)."""
+    data = df[[*x, unit_col]].dropna()
+    codes, units = pd.factorize(data[unit_col], sort=True)
+    X = data[x].to_numpy(dtype=float)
+    Xd = demean(X, codes, len(units))
+    return CollinearityReport(
+        variables=list(x),
+        nobs=len(data),
+        raw=design_stats(X, list(x)),
+        within=design_stats(Xd, list(x)),
+    )
+
+
+def save_report(report: CollinearityReport, name: str, out_dir=CAUSAL_DIR) -> list:
+    """vif_<name>_raw.csv, vif_<name>_within.csv and condition_<name>.csv, as the notebook wrote them."""
+    paths = []
+    for design, s in (("raw", report.raw), ("within", report.within)):
+        path = out_dir / f"vif_{name}_{design}.csv"
+        pd.DataFrame({"variable": s.vif.index, "VIF": s.vif.to_numpy()}).to_csv(path, index=False)
+        paths.append(path)
+    path = out_dir / f"condition_{name}.csv"
+    report.condition_table().to_csv(path, index=False)
+    paths.append(path)
+    return paths
+
+
+def main():
+    """The notebook's diagnostics for the main (lagged outlets -> EVs) and reverse specs."""
+    panel = read_table(PANEL_FILE, columns=[
+        "state", "state_fips", "year", "ev_per_1000", "ports_per_100k", "population",
+    ])
+    panel = add_lags(panel, ["ports_per_100k", "ev_per_1000"], lags=(1,))
+    panel["log_Lag1_Outlets"] = np.log1p(panel["Lag1_ports_per_100k"])
+    panel["log_Lag1_EVs"] = np.log1p(panel["Lag1_ev_per_1000"])
+
+    # Regressor sets of vif_main_raw.csv / vif_rev_raw.csv (the notebook's merged table had no gas column)
+    specs = {
+        "main": ["log_Lag1_Outlets", "population"],
+        "rev": ["log_Lag1_EVs", "population"],
+    }
+    for name, x in specs.items():
+        report = diagnose(panel, x, unit_col="state")
+        print(f"=== {name} ===")
+        print(report.summary_text())
+        for path in save_report(report, name):
+            print(f"Saved {path.name} to {path.parent}")
+
+
+if __name__ == "__main__":
+    main()
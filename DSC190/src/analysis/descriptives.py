@@ -1,8 +1,8 @@
-import pandas as pd
 from src.config import PANEL_FILE
+from src.storage import read_table
 
 def main():
-    panel = pd.read_csv(PANEL_FILE)
+    panel = read_table(PANEL_FILE)
 
     print("Panel shape:", panel.shape)
     print("\nColumns:\n", panel.columns.tolist())
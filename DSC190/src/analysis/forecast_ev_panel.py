@@ -1,177 +1,212 @@
-import pandas as pd
+import argparse
 import numpy as np
-import statsmodels.api as sm
-import statsmodels.formula.api as smf
-from statsmodels.tsa.arima.model import ARIMA
 import warnings
 warnings.filterwarnings('ignore')
 
-from src.config import PANEL_FILE, FORECAST_DIR
-
-
-# =========================================================================================================
-# 1. Load panel
-# =========================================================================================================
-panel = pd.read_csv(PANEL_FILE)
-col_map = {
-    "state": "State",
-    "year": "Year",
-    "ev_per_1000": "EVs_per_1000",
-    "ports_per_100k": "Outlets_per_100k",
-}
-panel = panel.rename(columns=col_map)
-
-required = ["State", "Year", "EVs_per_1000", "Outlets_per_100k"]
-missing = [c for c in required if c not in panel.columns]
-if missing:
-    raise ValueError(f"Panel is missing columns: {missing}")
-
-# Use only the years
-merged = panel[required].dropna().copy()
-
-
-# ===========================================================================================================
-# 2. Panel regression with FE
-# ===========================================================================================================
-merged["Year_trend"] = merged["Year"] - merged["Year"].min()
-
-panel_formula = "EVs_per_1000 ~ Outlets_per_100k + Year_trend + C(State)"
-panel_model = smf.ols(
-    panel_formula,
-    data=merged
-).fit(cov_type="cluster", cov_kwds={"groups": merged["State"]})
-
-print("=== Panel regression summary ===")
-print(panel_model.summary())
-
-
-# ===========================================================================================================
-# 3. Panel forecasts: baseline & accelerated
-# ===========================================================================================================
-
-last_year = merged["Year"].max()
-first_year = merged["Year"].min()
-forecast_years = list(range(last_year + 1, last_year + 6))  # 5 years ahead
-
-# Average percentage growth in outlets per 100k from first year to last year
-outlets_last = merged[merged["Year"] == last_year].set_index("State")["Outlets_per_100k"]
-outlets_first = merged[merged["Year"] == first_year].set_index("State")["Outlets_per_100k"]
-
-pct_growth = outlets_last / outlets_first - 1.0
-avg_pct_growth = pct_growth.replace([np.inf, -np.inf], np.nan).dropna().mean()
-
-print(f"\nAverage annualized outlet growth (first→last year): {avg_pct_growth:.3f}")
-
-# State baseline at last observed year
-state_base = (
-    merged[merged["Year"] == last_year]
-    .set_index("State")[["Outlets_per_100k", "EVs_per_1000"]]
+from src.config import PERIOD_PANEL_FILES, FORECAST_DIR, SCENARIO_CUBE_FILE
+from src.periods import (
+    ANNUAL,
+    add_freq_argument,
+    time_column,
+    trend_years,
+    future_periods,
+    per_period_rate,
+    period_labels,
 )
-
-# --- Scenario 1: Baseline outlet growth ---
-forecast_rows = []
-for state, row in state_base.iterrows():
-    outlets0 = row["Outlets_per_100k"]
-    for i, y in enumerate(forecast_years, start=1):
-        outlets_proj = outlets0 * ((1 + avg_pct_growth) ** i)
-        year_trend = y - first_year
-        pred_df = pd.DataFrame(
-            {
-                "Outlets_per_100k": [outlets_proj],
-                "Year_trend": [year_trend],
-                "State": [state],
-            }
-        )
-        pred = float(panel_model.predict(pred_df)[0])
-        forecast_rows.append(
-            {
-                "State": state,
-                "Year": y,
-                "EVs_per_1000_forecast_panel_baseline": pred,
-                "Outlets_per_100k_proj": outlets_proj,
-            }
-        )
-
-forecast_panel = pd.DataFrame(forecast_rows)
-print("\n=== Panel forecasts (baseline) – mean EVs_per_1000 by year ===")
-print(forecast_panel.groupby("Year")["EVs_per_1000_forecast_panel_baseline"].mean())
-
-# --- Scenario 2: Accelerated outlet rollout (+10 percentage points) ---
-acc = 0.10  # extra 10% growth per year
-forecast_rows_acc = []
-for state, row in state_base.iterrows():
-    outlets0 = row["Outlets_per_100k"]
-    for i, y in enumerate(forecast_years, start=1):
-        outlets_proj = outlets0 * ((1 + avg_pct_growth + acc) ** i)
-        year_trend = y - first_year
-        pred_df = pd.DataFrame(
-            {
-                "Outlets_per_100k": [outlets_proj],
-                "Year_trend": [year_trend],
-                "State": [state],
-            }
-        )
-        pred = float(panel_model.predict(pred_df)[0])
-        forecast_rows_acc.append(
-            {
-                "State": state,
-                "Year": y,
-                "EVs_per_1000_forecast_panel_acc": pred,
-                "Outlets_per_100k_proj": outlets_proj,
-            }
-        )
-
-forecast_panel_acc = pd.DataFrame(forecast_rows_acc)
-print("\n=== Panel forecasts (accelerated) – mean EVs_per_1000 by year ===")
-print(forecast_panel_acc.groupby("Year")["EVs_per_1000_forecast_panel_acc"].mean())
-
-
-# =====================================================================================================
-# 4. Per-state ARIMA time-series EVs
-# =====================================================================================================
-
-arima_forecasts = []
-for state, g in merged.groupby("State"):
-    g_sorted = g.sort_values("Year")
-    if len(g_sorted) >= 3:
-        ts = g_sorted.set_index("Year")["EVs_per_1000"]
-        try:
-            model = ARIMA(ts, order=(1, 1, 0)).fit()
-            fc = model.get_forecast(steps=len(forecast_years))
-            mean_fc = fc.predicted_mean
-            for i, y in enumerate(forecast_years):
-                arima_forecasts.append(
-                    {
-                        "State": state,
-                        "Year": y,
-                        "EVs_per_1000_arima": float(mean_fc.iloc[i]),
-                    }
-                )
-        except Exception:
-            continue
-
-arima_df = pd.DataFrame(arima_forecasts)
-
-print("\n=== ARIMA forecasts – mean EVs_per_1000 by year (across states) ===")
-if not arima_df.empty:
-    print(arima_df.groupby("Year")["EVs_per_1000_arima"].mean())
-else:
-    print("Not enough data for ARIMA forecasts.")
-
-
-# =========================================================================================================
-# 5. Save to CSV 
-# =========================================================================================================
-
-out_baseline = FORECAST_DIR / "forecast_panel_baseline.csv"
-out_acc = FORECAST_DIR / "forecast_panel_accelerated.csv"
-out_arima = FORECAST_DIR / "forecast_arima.csv"
-
-forecast_panel.to_csv(out_baseline, index=False)
-forecast_panel_acc.to_csv(out_acc, index=False)
-arima_df.to_csv(out_arima, index=False)
-
-print("\nSaved forecast CSVs:")
-print(" -", out_baseline)
-print(" -", out_acc)
-print(" -", out_arima)
+from src.storage import read_table
+from src.analysis.model_cache import cached_fit_within
+from src.analysis.panel_forecast import build_growth_grid, predict_batch
+from src.analysis.scenarios import evaluate_scenarios, save_cube
+from src.analysis.arima_pool import run_arima_pool
+
+# Uniform outlet-growth sweep saved alongside the named scenarios
+SWEEP_RATES = np.round(np.arange(0.0, 0.505, 0.01), 2)
+
+
+def scenario_forecast(panel_model, state_base, forecast_years, first_year, growth, value_col,
+                      time_col="Year", freq=ANNUAL):
+    """
+    Forecast every state x year under compound outlet growth in one batched
+    prediction. Returns State, <time_col>, <value_col>, Outlets_per_100k_proj.
+    """
+    grid = build_growth_grid(
+        state_base["Outlets_per_100k"], forecast_years, first_year, growth,
+        time_col=time_col, freq=freq,
+    )
+    grid[value_col] = predict_batch(panel_model, grid, unit_col="State")
+    grid = grid.rename(columns={"Outlets_per_100k": "Outlets_per_100k_proj"})
+    return grid[["State", time_col, value_col, "Outlets_per_100k_proj"]]
+
+
+def fit_panel_model(freq=ANNUAL):
+    """
+    Load the panel for `freq` and fit EVs_per_1000 ~ Outlets_per_100k +
+    Year_trend + state FE (through the model cache). Returns (panel, model).
+    """
+    time_col = "Year" if freq == ANNUAL else "Period"
+
+    panel_key = time_column(freq)
+    panel = read_table(
+        PERIOD_PANEL_FILES[freq], columns=["state", panel_key, "ev_per_1000", "ports_per_100k"]
+    )
+    col_map = {
+        "state": "State",
+        panel_key: time_col,
+        "ev_per_1000": "EVs_per_1000",
+        "ports_per_100k": "Outlets_per_100k",
+    }
+    panel = panel.rename(columns=col_map)
+
+    required = ["State", time_col, "EVs_per_1000", "Outlets_per_100k"]
+    missing = [c for c in required if c not in panel.columns]
+    if missing:
+        raise ValueError(f"Panel is missing columns: {missing}")
+
+    # Use only the years
+    merged = panel[required].dropna().copy()
+    merged["State"] = merged["State"].cat.remove_unused_categories()
+    merged["Year_trend"] = trend_years(merged[time_col], merged[time_col].min(), freq)
+
+    # State FE absorbed by the within transformation (same estimates as C(State) dummies)
+    panel_model = cached_fit_within(
+        merged, "EVs_per_1000", ["Outlets_per_100k", "Year_trend"], unit_col="State",
+        name="forecast_panel" if freq == ANNUAL else f"forecast_panel_{freq}",
+    )
+    return merged, panel_model
+
+
+def main(freq=ANNUAL):
+    """
+    Fit and forecast on the annual panel, or on the quarterly/monthly panel
+    for freq='Q'/'M' (period keys; trends and growth rates stay per year).
+    """
+    # Annual keys keep the "Year" name; quarterly/monthly use "Period"
+    time_col = "Year" if freq == ANNUAL else "Period"
+    suffix = "" if freq == ANNUAL else f"_{freq}"
+
+    # =========================================================================================================
+    # 1-2. Load panel and fit the panel regression with FE
+    # =========================================================================================================
+    merged, panel_model = fit_panel_model(freq)
+
+    print("=== Panel regression summary ===")
+    print(panel_model.summary_text())
+
+
+    # ===========================================================================================================
+    # 3. Panel forecasts: baseline & accelerated
+    # ===========================================================================================================
+
+    last_year = int(merged[time_col].max())
+    first_year = int(merged[time_col].min())
+    forecast_years = future_periods(last_year, 5, freq)  # 5 years ahead
+
+    # Average percentage growth in outlets per 100k from first year to last year
+    outlets_last = merged[merged[time_col] == last_year].set_index("State")["Outlets_per_100k"]
+    outlets_first = merged[merged[time_col] == first_year].set_index("State")["Outlets_per_100k"]
+
+    pct_growth = outlets_last / outlets_first - 1.0
+    avg_pct_growth = pct_growth.replace([np.inf, -np.inf], np.nan).dropna().mean()
+
+    print(f"\nAverage annualized outlet growth (first→last year): {avg_pct_growth:.3f}")
+
+    # State baseline at last observed year
+    state_base = (
+        merged[merged[time_col] == last_year]
+        .set_index("State")[["Outlets_per_100k", "EVs_per_1000"]]
+    )
+
+    # --- Scenario 1: Baseline outlet growth ---
+    forecast_panel = scenario_forecast(
+        panel_model, state_base, forecast_years, first_year,
+        growth=per_period_rate(avg_pct_growth, freq),
+        value_col="EVs_per_1000_forecast_panel_baseline",
+        time_col=time_col, freq=freq,
+    )
+    print("\n=== Panel forecasts (baseline) – mean EVs_per_1000 by year ===")
+    print(forecast_panel.groupby(time_col)["EVs_per_1000_forecast_panel_baseline"].mean())
+
+    # --- Scenario 2: Accelerated outlet rollout (+10 percentage points) ---
+    acc = 0.10  # extra 10% growth per year
+    forecast_panel_acc = scenario_forecast(
+        panel_model, state_base, forecast_years, first_year,
+        growth=per_period_rate(avg_pct_growth + acc, freq),
+        value_col="EVs_per_1000_forecast_panel_acc",
+        time_col=time_col, freq=freq,
+    )
+    print("\n=== Panel forecasts (accelerated) – mean EVs_per_1000 by year ===")
+    print(forecast_panel_acc.groupby(time_col)["EVs_per_1000_forecast_panel_acc"].mean())
+
+    # --- Scenario grid: named scenarios + growth-rate sweep in one pass ---
+    scenario_names = ["baseline", "accelerated"] + [f"rate_{r:.2f}" for r in SWEEP_RATES]
+    scenario_rates = np.concatenate([[avg_pct_growth, avg_pct_growth + acc], SWEEP_RATES])
+    cube = evaluate_scenarios(
+        panel_model,
+        state_base["Outlets_per_100k"],
+        forecast_years,
+        first_year,
+        per_period_rate(scenario_rates, freq),
+        freq=freq,
+    )
+    print(f"\nScenario cube: {cube.shape[0]} scenarios x {cube.shape[1]} states x {cube.shape[2]} years")
+
+
+    # =====================================================================================================
+    # 4. Per-state ARIMA time-series EVs (process pool, order chosen by AIC)
+    # =====================================================================================================
+
+    arima_df, arima_fits = run_arima_pool(merged, forecast_years, time_col=time_col)
+
+    status = arima_fits["status"]
+    partial = arima_fits[status == "partial"]
+    failed = arima_fits[~status.isin(["ok", "partial"])]
+    print(
+        f"\nARIMA fits: {(status == 'ok').sum()} ok, {len(partial)} with some orders failed, "
+        f"{len(failed)} not fitted"
+    )
+    for _, row in arima_fits[status != "ok"].iterrows():
+        print(f"  {row['State']}: {row['status']} – {row['error']}")
+
+    print("\n=== ARIMA forecasts – mean EVs_per_1000 by year (across states) ===")
+    if not arima_df.empty:
+        print(arima_df.groupby(time_col)["EVs_per_1000_arima"].mean())
+    else:
+        print("Not enough data for ARIMA forecasts.")
+
+
+    # =========================================================================================================
+    # 5. Save to CSV 
+    # =========================================================================================================
+
+    out_baseline = FORECAST_DIR / f"forecast_panel_baseline{suffix}.csv"
+    out_acc = FORECAST_DIR / f"forecast_panel_accelerated{suffix}.csv"
+    out_arima = FORECAST_DIR / f"forecast_arima{suffix}.csv"
+    out_arima_fits = FORECAST_DIR / f"arima_fits{suffix}.csv"
+    out_cube = SCENARIO_CUBE_FILE.with_name(f"{SCENARIO_CUBE_FILE.stem}{suffix}.npy")
+
+    if freq != ANNUAL:
+        # Readable period labels next to the integer keys
+        for df in (forecast_panel, forecast_panel_acc, arima_df):
+            df.insert(2, "Period_label", period_labels(df[time_col], freq))
+
+    forecast_panel.to_csv(out_baseline, index=False)
+    forecast_panel_acc.to_csv(out_acc, index=False)
+    arima_df.to_csv(out_arima, index=False)
+    arima_fits.to_csv(out_arima_fits, index=False)
+    save_cube(
+        out_cube, cube, scenario_names, state_base.index, forecast_years,
+        rates=scenario_rates,
+    )
+
+    print("\nSaved forecast CSVs:")
+    print(" -", out_baseline)
+    print(" -", out_acc)
+    print(" -", out_arima)
+    print(" -", out_arima_fits)
+    print(" -", out_cube)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Panel FE + ARIMA EV forecasts.")
+    add_freq_argument(parser)
+    main(parser.parse_args().freq)
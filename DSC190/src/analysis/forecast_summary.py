@@ -1,6 +1,9 @@
 import pandas as pd
 
-from src.config import PROCESSED_DIR, TEXT_SUMMARIES_DIR
+from src.config import PROCESSED_DIR, TEXT_SUMMARIES_DIR, SCENARIO_CUBE_FILE
+from src.analysis.scenarios import cube_axes, load_cube_slice
+from src.analysis.model_cache import load_named
+from src.analysis.forecast_ev_panel import fit_panel_model
 
 # Folder name with a space, matching your repo
 FORECAST_DIR = PROCESSED_DIR / "forecast output"
@@ -66,9 +69,23 @@ def _pick_ev_col(df: pd.DataFrame, filename: str) -> str:
 
 def _load_forecast(kind: str) -> tuple[pd.DataFrame, str, str]:
     """
-    Load a forecast file for 'baseline' or 'accelerated' and
-    return (yearly_mean_df, year_col, ev_col).
+    Load the forecasts for a scenario (e.g. 'baseline', 'accelerated' or a
+    sweep entry such as 'rate_0.20') and return (yearly_mean_df, year_col, ev_col).
+
+    Reads just that scenario's slice of the scenario cube when it exists,
+    otherwise the per-scenario CSV.
     """
+    if SCENARIO_CUBE_FILE.exists() and kind in cube_axes(SCENARIO_CUBE_FILE)["scenario"]:
+        df = load_cube_slice(SCENARIO_CUBE_FILE, scenarios=kind)
+        year_col, ev_col = "Year", "EVs_per_1000_forecast"
+        yearly = (
+            df.groupby(year_col)[ev_col]
+            .mean()
+            .reset_index()
+            .sort_values(year_col)
+        )
+        return yearly, year_col, ev_col
+
     kind = kind.lower()
     pattern = f"forecast_panel_{kind}.csv"
     path = FORECAST_DIR / pattern
@@ -92,19 +109,20 @@ def _load_forecast(kind: str) -> tuple[pd.DataFrame, str, str]:
     return yearly, year_col, ev_col
 
 
-def run_forecast_summary():
+def run_forecast_summary(baseline: str = "baseline", accelerated: str = "accelerated"):
     """
     RQ3 summary: short-run EV adoption forecasts (2020–2023-based)
     using panel-based baseline and accelerated scenarios.
 
-    Expects in `data/processed/forecast output/`:
+    Expects in `data/processed/forecast output/` either the scenario cube
+    (scenario_cube.npy/.json), from which any two scenarios can be compared, or:
       - forecast_panel_baseline.csv
       - forecast_panel_accelerated.csv
     """
 
     # ---- Load baseline & accelerated forecasts ----
-    base_yearly, year_col_base, base_col = _load_forecast("baseline")
-    accel_yearly, year_col_accel, accel_col = _load_forecast("accelerated")
+    base_yearly, year_col_base, base_col = _load_forecast(baseline)
+    accel_yearly, year_col_accel, accel_col = _load_forecast(accelerated)
 
     # keep only forecast years (> 2023)
     base_fore = base_yearly[base_yearly[year_col_base] > 2023].copy()
@@ -160,6 +178,8 @@ def run_forecast_summary():
         "  (2) an accelerated charging-growth scenario.\n\n"
     )
 
+    if (baseline, accelerated) != ("baseline", "accelerated"):
+        lines.append(f"Scenarios compared: {baseline} (baseline) vs {accelerated} (accelerated)\n")
     lines.append(f"Forecast horizon: {start_year}–{end_year}\n\n")
     lines.append("Final-year national EV adoption (EVs per 1,000 residents):\n")
     lines.append(f"  Baseline scenario    : {base_final:.2f}\n")
@@ -174,6 +194,19 @@ def run_forecast_summary():
     lines.append(f"  Baseline CAGR   : {base_cagr * 100:.1f}% per year\n")
     lines.append(f"  Accelerated CAGR: {accel_cagr * 100:.1f}% per year\n")
 
+    # The fitted panel model itself, from the model cache (refit if it was evicted)
+    model = load_named("forecast_panel")
+    if model is None:
+        _, model = fit_panel_model()
+    lines.append("\nPanel model behind the forecasts:\n")
+    lines.append(f"  {model.formula} ({model.nobs} obs, {model.n_units} states)\n")
+    for term in model.params.index:
+        lines.append(
+            f"  {term:<18}: {model.params[term]:.4f} "
+            f"(clustered SE {model.bse[term]:.4f})\n"
+        )
+    lines.append(f"  Within R-squared: {model.rsquared_within:.3f}\n")
+
     lines.append(
         "\nInterpretation (informal):\n"
         f"- Over {start_year}–{end_year}, both scenarios imply continued growth "
@@ -1,16 +1,16 @@
-import pandas as pd
 import numpy as np
 import statsmodels.formula.api as smf
 
 from src.config import PANEL_FILE, GAS_CLEAN_FILE, TEXT_SUMMARIES_DIR
+from src.storage import read_table
 
 
 def main():
     # ===========================================================================================================
     # 1. Load panel + gas data
     # ===========================================================================================================
-    panel = pd.read_csv(PANEL_FILE)
-    gas = pd.read_csv(GAS_CLEAN_FILE)
+    panel = read_table(PANEL_FILE, columns=["year", "ev_count", "population"])
+    gas = read_table(GAS_CLEAN_FILE)
 
     # Aggregate to national totals by year
     national = (
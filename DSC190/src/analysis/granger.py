@@ -0,0 +1,187 @@
+"""
+Per-unit Granger causality tests, batched across units.
+
+For every unit and every lag p = 1..maxlag, the test compares
+
+    restricted:   effect_t ~ 1 + effect_{t-1..t-p}
+    unrestricted: effect_t ~ 1 + effect_{t-1..t-p} + cause_{t-1..t-p}
+
+with the SSR-based F-test, the `ssr_ftest` of statsmodels'
+grangercausalitytests, which the notebook ran state by state. Each lag uses
+its own sample (the first p observations are dropped).
+
+Units are grouped by series length. Within a group the lagged design
+matrices for all units are built as one (units, rows, columns) array, and
+both regressions are solved for every unit at once with a batched SVD,
+which also handles rank-deficient designs such as a constant series. So
+thousands of counties cost a few array operations per lag instead of one
+statsmodels call per unit.
+
+Usage (from the DSC190/ folder):
+    python -m src.analysis.granger            # both directions, lags 1-2
+    python -m src.analysis.granger --maxlag 3
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from src.config import PANEL_FILE, CAUSAL_DIR, TEXT_SUMMARIES_DIR
+from src.storage import read_table
+from src.instrument import record
+
+GRANGER_FILE = CAUSAL_DIR / "granger_results_by_state.csv"
+
+# (name, cause, effect) pairs tested by main()
+DIRECTIONS = [
+    ("outlets->evs", "Outlets_per_100k", "EVs_per_1000"),
+    ("evs->outlets", "EVs_per_1000", "Outlets_per_100k"),
+]
+
+
+# =========================================================================================================
+# Batched least squares
+# =========================================================================================================
+def lag_stack(a: np.ndarray, p: int) -> np.ndarray:
+    """(units, T) -> (units, T - p, p) with column j holding lag j + 1."""
+    T = a.shape[1]
+    return np.stack([a[:, p - j:T - j] for j in range(1, p + 1)], axis=-1)
+
+
+def batched_ssr(X: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    SSR and rank of the least-squares fit of y (units, n) on X (units, n, k),
+    one regression per unit.
+    """
+    U, s, _ = np.linalg.svd(X, full_matrices=False)
+    tol = s.max(axis=-1, keepdims=True) * max(X.shape[1:]) * np.finfo(float).eps
+    keep = s > tol
+    # Projection of y onto the column space: only singular vectors above tolerance
+    coef = np.einsum("unk,un->uk", U, y) * keep
+    ssr = np.einsum("un,un->u", y, y) - np.einsum("uk,uk->u", coef, coef)
+    return np.maximum(ssr, 0.0), keep.sum(axis=-1)
+
+
+def granger_batch(effect: np.ndarray, cause: np.ndarray, maxlag: int) -> dict:
+    """
+    F statistics and p-values for lags 1..maxlag for equal-length series
+    (units, T). Returns {lag: (F, pvalue, df_denom)} with arrays per unit;
+    NaN where a lag leaves no residual degrees of freedom.
+    """
+    n_units, T = effect.shape
+    out = {}
+    for p in range(1, maxlag + 1):
+        n = T - p
+        if n <= 0:
+            nan = np.full(n_units, np.nan)
+            out[p] = (nan, nan, np.zeros(n_units, dtype=int))
+            continue
+        y = effect[:, p:]
+        const = np.ones((n_units, n, 1))
+        restricted = np.concatenate([const, lag_stack(effect, p)], axis=-1)
+        unrestricted = np.concatenate([restricted, lag_stack(cause, p)], axis=-1)
+
+        ssr_r, _ = batched_ssr(restricted, y)
+        ssr_u, rank_u = batched_ssr(unrestricted, y)
+        df_denom = n - rank_u
+        with np.errstate(divide="ignore", invalid="ignore"):
+            F = (ssr_r - ssr_u) / p / (ssr_u / df_denom)
+        F = np.where(df_denom > 0, F, np.nan)
+        pvalue = stats.f.sf(F, p, np.where(df_denom > 0, df_denom, 1))
+        out[p] = (F, np.where(np.isfinite(F), pvalue, np.nan), df_denom)
+    return out
+
+
+# =========================================================================================================
+# Panel interface
+# =========================================================================================================
+def granger_by_unit(
+    df: pd.DataFrame,
+    cause: str,
+    effect: str,
+    unit_col: str = "State",
+    time_col: str = "Year",
+    maxlag: int = 2,
+    min_obs: int = None,
+) -> pd.DataFrame:
+    """
+    Does `cause` Granger-cause `effect` in each unit? Rows missing either
+    series are dropped, as in the notebook. Units with fewer than `min_obs`
+    (default maxlag + 2) observations are left out.
+
+    Returns unit_col, n_obs, pval_lag1..pval_lag<maxlag>, F_lag1.., significant_any.
+    """
+    min_obs = maxlag + 2 if min_obs is None else min_obs
+    data = df[[unit_col, time_col, effect, cause]].dropna().sort_values([unit_col, time_col])
+    lengths = data.groupby(unit_col, observed=True).size()
+    lengths = lengths[lengths >= min_obs]
+    data = data[data[unit_col].isin(lengths.index)]
+
+    frames = []
+    # One batch per series length (a balanced panel is a single batch)
+    for T, units in lengths.groupby(lengths):
+        rows = data[data[unit_col].isin(units.index)]
+        effect_arr = rows[effect].to_numpy(dtype=float).reshape(-1, T)
+        cause_arr = rows[cause].to_numpy(dtype=float).reshape(-1, T)
+        names = rows[unit_col].to_numpy()[::T]
+
+        res = granger_batch(effect_arr, cause_arr, maxlag)
+        frame = pd.DataFrame({unit_col: names, "n_obs": T})
+        for p, (F, pvalue, _) in res.items():
+            frame[f"pval_lag{p}"] = pvalue
+        for p, (F, pvalue, _) in res.items():
+            frame[f"F_lag{p}"] = F
+        frames.append(frame)
+
+    pval_cols = [f"pval_lag{p}" for p in range(1, maxlag + 1)]
+    if not frames:
+        return pd.DataFrame(columns=[unit_col, "n_obs", *pval_cols, "significant_any"])
+    out = pd.concat(frames, ignore_index=True)
+    out["significant_any"] = out[pval_cols].min(axis=1) < 0.05
+    record(rows_in=len(data))
+    return out.sort_values(unit_col).reset_index(drop=True)
+
+
+def main(maxlag: int = 2):
+    panel = read_table(PANEL_FILE, columns=["state", "year", "ev_per_1000", "ports_per_100k"])
+    panel = panel.rename(columns={
+        "state": "State", "year": "Year",
+        "ev_per_1000": "EVs_per_1000", "ports_per_100k": "Outlets_per_100k",
+    })
+    panel["State"] = panel["State"].astype(str)
+
+    frames = []
+    lines = [f"Per-state Granger causality tests (SSR F-test, lags 1-{maxlag})\n"]
+    lines.append("------------------------------------------------------\n\n")
+    for name, cause, effect in DIRECTIONS:
+        res = granger_by_unit(panel, cause, effect, maxlag=maxlag)
+        res.insert(0, "direction", name)
+        frames.append(res)
+        lines.append(
+            f"{cause} -> {effect}: significant at p<0.05 for any lag in "
+            f"{int(res['significant_any'].sum())} of {len(res)} states\n"
+        )
+        for p in range(1, maxlag + 1):
+            col = f"pval_lag{p}"
+            lines.append(
+                f"  lag {p}: {int((res[col] < 0.05).sum())} states at p<0.05, "
+                f"median p = {res[col].median():.3f}\n"
+            )
+
+    results = pd.concat(frames, ignore_index=True)
+    results.to_csv(GRANGER_FILE, index=False)
+    record(rows_out=len(results))
+    print(f"Saved Granger results to {GRANGER_FILE}")
+
+    out_path = TEXT_SUMMARIES_DIR / "granger_summary.txt"
+    with out_path.open("w") as f:
+        f.writelines(lines)
+    print("".join(lines))
+    print(f"Saved Granger summary to {out_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batched per-state Granger causality tests.")
+    parser.add_argument("--maxlag", type=int, default=2)
+    main(parser.parse_args().maxlag)
@@ -0,0 +1,427 @@
+"""
+High-dimensional fixed effects absorbed by alternating projections.
+
+`fit_hdfe` fits y ~ x while absorbing any number of fixed-effect terms, in
+the style of Stata's reghdfe:
+
+    "State"                 one effect per state
+    "Year"                  one effect per period
+    "State#Year"            one effect per combination; county-within-state
+                            is "County" when county codes are unique, else
+                            "State#County"
+    "State#c.Year_trend"    state-specific slopes on a variable (no intercept)
+    "State##c.Year_trend"   state-specific intercepts and slopes ("State"
+                            next to "State#c.Year_trend" is merged into this)
+
+y and every column of X are residualized against all terms together by the
+method of alternating projections. Each sweep projects out one term after
+another, using group means through a sparse indicator matrix or per-group
+slopes, and sweeps repeat until no column moves by more than `tol`. Each
+sweep is accelerated with a Gearhart-Koshy line search, and a fit that
+reaches `maxiter` sweeps warns. By Frisch-Waugh-
+Lovell, OLS of the residualized y on the residualized X gives the slopes of
+the full dummy regression, and its residuals are the full model's
+residuals. No dummy matrix is ever built, so memory is O(n k) for any
+number of levels.
+
+Singleton groups are dropped first, as reghdfe does: they are fitted
+exactly and only distort the degrees of freedom. The absorbed degrees of
+freedom are the levels of every term minus redundant ones. The count is
+exact for the first two categorical terms, through the connected components
+of their bipartite graph, with one per further categorical term and one
+per slope term whose variable another term already spans (unit trends
+next to period FE). This is the rank a dummy regression would find for
+unit/period designs.
+
+Standard errors are clustered on one or more variables (default: the first
+absorbed term). With several, the Cameron-Gelbach-Miller estimator sums the
+CRV1 covariance of every intersection of cluster variables with alternating
+signs, each with its own G/(G-1) correction. Negative eigenvalues are
+clipped when the sum is not positive semi-definite.
+"""
+import itertools
+import warnings
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy import stats
+from scipy.sparse.csgraph import connected_components
+
+from src.analysis.fixed_effects import cluster_cov
+
+DEFAULT_TOL = 1e-10
+DEFAULT_MAXITER = 10_000
+
+
+# =========================================================================================================
+# Absorbed terms
+# =========================================================================================================
+def split_term(spec: str) -> tuple[list[str], str, bool]:
+    """"A#B##c.t" -> (["A", "B"], "t", True): group columns, slope column, intercept."""
+    slope_col, intercept = None, True
+    groups = spec
+    if "#c." in spec:
+        intercept = "##c." in spec
+        groups, slope_col = spec.replace("##c.", "#c.").split("#c.")
+    return groups.split("#"), slope_col, intercept
+
+
+def term_columns(specs: list[str]) -> list[str]:
+    """Every column used by the absorbed terms, in order of appearance."""
+    cols = []
+    for spec in specs:
+        group_cols, slope_col, _ = split_term(spec)
+        cols.extend([*group_cols, *([slope_col] if slope_col else [])])
+    return list(dict.fromkeys(cols))
+
+
+def merge_slope_terms(specs: list[str]) -> list[str]:
+    """
+    "A" next to "A#c.t" -> "A##c.t", in the place of "A". The merged term
+    projects out within-group centered slopes. Raw slopes on a variable far
+    from zero (Year ~ 2010) are nearly collinear with the group intercepts,
+    and alternating between the two then converges very slowly.
+    """
+    out = list(specs)
+    for spec in specs:
+        group_cols, slope_col, intercept = split_term(spec)
+        groups = "#".join(group_cols)
+        if slope_col is None or intercept or groups not in out:
+            continue
+        out[out.index(groups)] = f"{groups}##c.{slope_col}"
+        out.remove(spec)
+    return out
+
+
+def group_codes(df: pd.DataFrame, cols: list[str]) -> tuple[np.ndarray, int]:
+    """Compact integer codes for the combinations of `cols` present in `df`."""
+    codes = np.zeros(len(df), dtype=np.int64)
+    for col in cols:
+        c, uniques = pd.factorize(df[col], sort=True)
+        codes = codes * len(uniques) + c
+    codes, n = pd.factorize(codes, sort=True)
+    return codes.astype(np.int64), len(n)
+
+
+@dataclass
+class AbsorbedTerm:
+    """One fixed-effect term, with its group indicator matrix built once."""
+    name: str
+    group_cols: list
+    codes: np.ndarray
+    n_groups: int
+    slope: np.ndarray = None  # variable of a "#c." term
+    intercept: bool = True
+    D: sp.csr_matrix = field(default=None, repr=False)
+    counts: np.ndarray = field(default=None, repr=False)
+    t_centered: np.ndarray = field(default=None, repr=False)
+    t_ss: np.ndarray = field(default=None, repr=False)
+
+    @classmethod
+    def parse(cls, spec: str, df: pd.DataFrame) -> "AbsorbedTerm":
+        group_cols, slope_col, intercept = split_term(spec)
+        missing = [c for c in [*group_cols, slope_col] if c and c not in df.columns]
+        if missing:
+            raise ValueError(f"Absorbed term {spec!r} uses missing columns: {missing}")
+        codes, n_groups = group_codes(df, group_cols)
+        slope = None if slope_col is None else df[slope_col].to_numpy(dtype=float)
+        return cls(spec, group_cols, codes, n_groups, slope, intercept)
+
+    def prepare(self) -> None:
+        n = len(self.codes)
+        self.D = sp.csr_matrix((np.ones(n), (np.arange(n), self.codes)), shape=(n, self.n_groups))
+        self.counts = np.bincount(self.codes, minlength=self.n_groups).astype(float)
+        if self.slope is not None:
+            t = self.slope
+            if self.intercept:
+                # Centered within group, so intercept and slope project separately
+                t = t - (self.D.T @ t / self.counts)[self.codes]
+            self.t_centered = t
+            self.t_ss = self.D.T @ (t * t)
+
+    def project_out(self, V: np.ndarray) -> np.ndarray:
+        """V (n, m) minus its projection on this term's dummies (and slopes)."""
+        out = V
+        if self.intercept:
+            out = out - (self.D @ ((self.D.T @ V) / self.counts[:, None]))
+        if self.slope is not None:
+            t = self.t_centered
+            with np.errstate(divide="ignore", invalid="ignore"):
+                coef = np.where(self.t_ss[:, None] > 0, (self.D.T @ (t[:, None] * V)) / self.t_ss[:, None], 0.0)
+            out = out - t[:, None] * (self.D @ coef)
+        return out
+
+    @property
+    def levels(self) -> int:
+        """Parameters this term absorbs (intercepts and slopes)."""
+        n = self.n_groups if self.intercept else 0
+        if self.slope is not None:
+            n += int((self.t_ss > 1e-12).sum())
+        return n
+
+
+def drop_singletons(df: pd.DataFrame, specs: list[str]) -> pd.DataFrame:
+    """Repeatedly drop rows that are alone in a group of any absorbed term."""
+    group_sets = [split_term(spec)[0] for spec in specs]
+    while True:
+        keep = np.ones(len(df), dtype=bool)
+        for cols in group_sets:
+            codes, n = group_codes(df, cols)
+            keep &= np.bincount(codes, minlength=n)[codes] > 1
+        if keep.all():
+            return df
+        df = df[keep]
+
+
+def absorbed_dof(terms: list[AbsorbedTerm]) -> int:
+    """Levels absorbed by all terms, net of redundancies between categorical terms."""
+    dof = sum(t.levels for t in terms)
+    categorical = [t for t in terms if t.intercept]
+    if len(categorical) >= 2:
+        a, b = categorical[:2]
+        # Effects of two categorical terms are identified up to one constant per connected component
+        graph = sp.coo_matrix(
+            (np.ones(len(a.codes)), (a.codes, a.n_groups + b.codes)),
+            shape=(a.n_groups + b.n_groups,) * 2,
+        )
+        n_components, _ = connected_components(graph, directed=False)
+        dof -= n_components
+        dof -= len(categorical) - 2
+    # Group slopes on a variable that another categorical term already spans
+    # (State#c.Year next to Year FE) add up to that variable: one more redundancy
+    for term in terms:
+        if term.slope is None or not (term.t_ss > 1e-12).all():
+            continue
+        for other in categorical:
+            if other is not term and np.allclose(
+                term.slope, (other.D.T @ term.slope / other.counts)[other.codes], rtol=0, atol=1e-9
+            ):
+                dof -= 1
+                break
+    return dof
+
+
+# =========================================================================================================
+# Alternating projections
+# =========================================================================================================
+def _sweep(terms: list[AbsorbedTerm], V: np.ndarray) -> np.ndarray:
+    for term in terms:
+        V = term.project_out(V)
+    return V
+
+
+def residualize(terms: list[AbsorbedTerm], V: np.ndarray, tol: float = DEFAULT_TOL,
+                maxiter: int = DEFAULT_MAXITER) -> tuple[np.ndarray, int, bool]:
+    """
+    Residualize the columns of V against every term. Returns (residuals,
+    sweeps, converged).
+    """
+    if len(terms) == 1 and terms[0].slope is None:
+        return terms[0].project_out(V), 1, True
+
+    scale = np.maximum(np.linalg.norm(V, axis=0), 1e-300)
+    for it in range(1, maxiter + 1):
+        T = _sweep(terms, V)
+        d = V - T
+        dd = np.einsum("ij,ij->j", d, d)
+        change = np.sqrt(dd) / scale
+        if change.max() <= tol:
+            return T, it, True
+        # Gearhart-Koshy: step further along the sweep direction, per column.
+        # Converged columns take plain steps; there d is rounding noise.
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = np.where(change > tol, np.einsum("ij,ij->j", V, d) / dd, 1.0)
+        V = V - np.clip(t, 1.0, None) * d
+    return V, maxiter, False
+
+
+# =========================================================================================================
+# Covariance
+# =========================================================================================================
+def multiway_cluster_cov(Xd: np.ndarray, resid: np.ndarray, clusters: list[np.ndarray], k_full: int) -> np.ndarray:
+    """Cameron-Gelbach-Miller covariance: CRV1 over every intersection, alternating signs."""
+    k = Xd.shape[1]
+    cov = np.zeros((k, k))
+    for r in range(1, len(clusters) + 1):
+        for combo in itertools.combinations(clusters, r):
+            codes = np.zeros(len(resid), dtype=np.int64)
+            for c in combo:
+                c_codes, uniques = pd.factorize(c)
+                codes = codes * len(uniques) + c_codes
+            cov += (-1) ** (r + 1) * cluster_cov(Xd, resid, codes, k_full)
+
+    if len(clusters) > 1:
+        eigval, eigvec = np.linalg.eigh(cov)
+        if eigval.min() < 0:
+            cov = eigvec @ np.diag(np.clip(eigval, 0.0, None)) @ eigvec.T
+    return cov
+
+
+# =========================================================================================================
+# Estimator
+# =========================================================================================================
+@dataclass
+class HDFEResults:
+    formula: str
+    absorb: list
+    cluster: list
+    params: pd.Series
+    cov: pd.DataFrame
+    fittedvalues: pd.Series
+    resid: pd.Series
+    nobs: int
+    n_singletons: int
+    absorbed_levels: dict
+    df_absorbed: int
+    df_resid: int
+    n_clusters: dict
+    iterations: int
+    converged: bool
+    omitted: list
+    rsquared: float
+    rsquared_within: float
+
+    @property
+    def bse(self) -> pd.Series:
+        return pd.Series(np.sqrt(np.diag(self.cov)), index=self.params.index)
+
+    @property
+    def tvalues(self) -> pd.Series:
+        return self.params / self.bse
+
+    @property
+    def pvalues(self) -> pd.Series:
+        # Clustered covariance -> normal reference distribution, as in fit_within
+        return pd.Series(2 * stats.norm.sf(np.abs(self.tvalues)), index=self.params.index)
+
+    def conf_int(self, alpha: float = 0.05) -> pd.DataFrame:
+        z = stats.norm.ppf(1 - alpha / 2)
+        return pd.DataFrame({0: self.params - z * self.bse, 1: self.params + z * self.bse},
+                            index=self.params.index)
+
+    def summary_text(self) -> str:
+        ci = self.conf_int()
+        width = max([len(n) for n in self.params.index] + [8]) + 2
+        clusters = ", ".join(f"{c} ({n})" for c, n in self.n_clusters.items())
+        lines = [
+            "High-dimensional fixed effects regression (alternating projections)",
+            "=" * 78,
+            f"Model:              {self.formula}",
+            f"No. Observations:   {self.nobs} ({self.n_singletons} singletons dropped)",
+            f"Df Residuals:       {self.df_resid} ({self.df_absorbed} absorbed)",
+            f"R-squared:          {self.rsquared:.4f}",
+            f"R-squared (within): {self.rsquared_within:.4f}",
+            f"Covariance Type:    cluster by {clusters}",
+            f"Converged:          {self.converged} after {self.iterations} sweeps",
+            "-" * 78,
+            "Absorbed:",
+        ]
+        for term, levels in self.absorbed_levels.items():
+            lines.append(f"  {term:<28}{levels:>10} levels")
+        lines += [
+            "=" * 78,
+            f"{'':<{width}}{'coef':>10}{'std err':>11}{'z':>9}{'P>|z|':>9}{'[0.025':>10}{'0.975]':>10}",
+            "-" * 78,
+        ]
+        for name in self.params.index:
+            lines.append(
+                f"{name:<{width}}{self.params[name]:>10.4f}{self.bse[name]:>11.4f}"
+                f"{self.tvalues[name]:>9.3f}{self.pvalues[name]:>9.3f}"
+                f"{ci.loc[name, 0]:>10.3f}{ci.loc[name, 1]:>10.3f}"
+            )
+        lines.append("=" * 78)
+        for name in self.omitted:
+            lines.append(f"{name} omitted (absorbed by the fixed effects)")
+        if len(self.n_clusters) > 1:
+            lines.append("Standard errors are multiway clustered (Cameron-Gelbach-Miller, CRV1).")
+        else:
+            lines.append("Standard errors are robust to cluster correlation (CRV1).")
+        return "\n".join(lines) + "\n"
+
+
+def fit_hdfe(
+    df: pd.DataFrame,
+    y: str,
+    x: list[str],
+    absorb: list[str],
+    cluster: list[str] = None,
+    tol: float = DEFAULT_TOL,
+    maxiter: int = DEFAULT_MAXITER,
+    singletons: bool = False,
+) -> HDFEResults:
+    """
+    Fit `y ~ x` absorbing the `absorb` terms (see the module docstring),
+    with SEs clustered on the `cluster` columns (default: the first
+    absorbed term's grouping columns). Rows with missing values and, unless
+    `singletons`, singleton groups are dropped.
+    """
+    absorb = [absorb] if isinstance(absorb, str) else list(absorb)
+    if cluster is None:
+        cluster = split_term(absorb[0])[0]
+    cluster = [cluster] if isinstance(cluster, str) else list(cluster)
+    absorb = merge_slope_terms(absorb)
+
+    cols = list(dict.fromkeys([y, *x, *term_columns(absorb), *cluster]))
+    data = df[cols].dropna()
+    n_before = len(data)
+    if not singletons:
+        data = drop_singletons(data, absorb)
+    n_singletons = n_before - len(data)
+
+    terms = [AbsorbedTerm.parse(spec, data) for spec in absorb]
+    for term in terms:
+        term.prepare()
+
+    V = data[[y, *x]].to_numpy(dtype=float)
+    Vd, iterations, converged = residualize(terms, V, tol, maxiter)
+    if not converged:
+        warnings.warn(
+            f"fit_hdfe: absorbing {' + '.join(absorb)} did not converge in {maxiter} sweeps; "
+            "the slopes are approximate",
+            RuntimeWarning,
+            stacklevel=2,
+        )
+    yd, Xd = Vd[:, 0], Vd[:, 1:]
+
+    # Regressors with (almost) nothing left after absorption are omitted
+    x_norm = np.linalg.norm(V[:, 1:] - V[:, 1:].mean(axis=0), axis=0)
+    kept = np.linalg.norm(Xd, axis=0) > 1e-9 * np.maximum(x_norm, 1e-300)
+    omitted = [name for name, k in zip(x, kept) if not k]
+    x_kept = [name for name, k in zip(x, kept) if k]
+    Xd = Xd[:, kept]
+
+    beta, *_ = np.linalg.lstsq(Xd, yd, rcond=None)
+    resid = yd - Xd @ beta
+
+    nobs = len(yd)
+    df_absorbed = absorbed_dof(terms)
+    k_full = len(x_kept) + df_absorbed
+    cov = multiway_cluster_cov(Xd, resid, [data[c].to_numpy() for c in cluster], k_full)
+
+    ssr = float(resid @ resid)
+    yv = V[:, 0]
+    tss = float(((yv - yv.mean()) ** 2).sum())
+    tss_within = float(yd @ yd)
+
+    return HDFEResults(
+        formula=f"{y} ~ {' + '.join(x)} | {' + '.join(absorb)}",
+        absorb=absorb,
+        cluster=cluster,
+        params=pd.Series(beta, index=x_kept),
+        cov=pd.DataFrame(cov, index=x_kept, columns=x_kept),
+        fittedvalues=pd.Series(yv - resid, index=data.index),
+        resid=pd.Series(resid, index=data.index),
+        nobs=nobs,
+        n_singletons=n_singletons,
+        absorbed_levels={t.name: t.levels for t in terms},
+        df_absorbed=df_absorbed,
+        df_resid=nobs - k_full,
+        n_clusters={c: int(data[c].nunique()) for c in cluster},
+        iterations=iterations,
+        converged=converged,
+        omitted=omitted,
+        rsquared=1.0 - ssr / tss if tss > 0 else np.nan,
+        rsquared_within=1.0 - ssr / tss_within if tss_within > 0 else np.nan,
+    )
@@ -1,18 +1,28 @@
-import pandas as pd
+import argparse
 import numpy as np
-import statsmodels.formula.api as smf
+from src.config import PERIOD_PANEL_FILES, TEXT_SUMMARIES_DIR
+from src.storage import read_table
+from src.periods import ANNUAL, add_freq_argument, time_column, trend_years
+from src.analysis.model_cache import cached_fit_within
+from src.analysis.bootstrap import DEFAULT_REPS, fe_bootstrap, bootstrap_summary_text
+from src.analysis.collinearity import diagnose
 
-from src.config import PANEL_FILE, TEXT_SUMMARIES_DIR
 
+def main(freq=ANNUAL):
+    """Log-log FE regression on the annual panel, or the quarterly/monthly one for freq='Q'/'M'."""
+    suffix = "" if freq == ANNUAL else f"_{freq}"
 
-def main():
     # ===========================================================================================================
     # 1. Load panel and prepare log variables
     # ===========================================================================================================
-    panel = pd.read_csv(PANEL_FILE).copy()
+    panel_key = time_column(freq)
+    panel = read_table(
+        PERIOD_PANEL_FILES[freq], columns=["state", panel_key, "ev_per_1000", "ports_per_100k"]
+    )
 
-    # Drop rows with missing key variables
+    # Drop rows with missing key variables (and the states that leaves empty)
     panel = panel.dropna(subset=["ev_per_1000", "ports_per_100k"])
+    panel["state"] = panel["state"].cat.remove_unused_categories()
 
     # Avoid log(0) by clipping at a small positive number
     eps = 1e-3
@@ -22,24 +32,31 @@ def main():
     panel["log_ev_per_1000"] = np.log(panel["ev_per_1000_adj"])
     panel["log_ports_per_100k"] = np.log(panel["ports_per_100k_adj"])
 
-    # Rename 
-    df = panel.rename(columns={"state": "State", "year": "Year"})
-    df["Year_trend"] = df["Year"] - df["Year"].min()
+    # Rename (annual keys keep the "Year" name; quarterly/monthly use "Period")
+    time_col = "Year" if freq == ANNUAL else "Period"
+    df = panel.rename(columns={"state": "State", panel_key: time_col})
+    # Trend stays in years, so its coefficient reads the same at every frequency
+    df["Year_trend"] = trend_years(df[time_col], df[time_col].min(), freq)
 
-    print("Years in panel:", sorted(df["Year"].unique()))
+    print(f"{time_col}s in panel:", sorted(df[time_col].unique()))
     print("Number of states:", df["State"].nunique())
 
 
     # ===========================================================================================================
     # 2. Log–log fixed-effects regression with clustered SEs
     # ===========================================================================================================
-    formula = "log_ev_per_1000 ~ log_ports_per_100k + Year_trend + C(State)"
-    ols_model = smf.ols(formula, data=df)
-    fe_log = ols_model.fit(cov_type="cluster", cov_kwds={"groups": df["State"]})
+    diagnostics = diagnose(df, ["log_ports_per_100k", "Year_trend"], unit_col="State")
+    print(diagnostics.summary_text())
+
+    fe_log = cached_fit_within(
+        df, "log_ev_per_1000", ["log_ports_per_100k", "Year_trend"], unit_col="State",
+        name=f"logspec{suffix}",
+    )
+    formula = fe_log.formula
 
     print("\n=== Robustness: log–log FE model ===")
     print("Formula:", formula)
-    print(fe_log.summary())
+    print(fe_log.summary_text())
 
     # Extract elasticity and 95% CI for log_ports_per_100k
     coef_name = "log_ports_per_100k"
@@ -56,20 +73,29 @@ def main():
             f"  95% CI for elasticity: [{ci_low:.3f}, {ci_high:.3f}] "
             "(clustered by state)"
         )
+
+        boot = fe_bootstrap(
+            df, "log_ev_per_1000", ["log_ports_per_100k", "Year_trend"], unit_col="State",
+            reps=DEFAULT_REPS,
+        )
+        boot_text = bootstrap_summary_text(boot, coef_name, DEFAULT_REPS)
+        print(boot_text, end="")
     else:
         beta = np.nan
         ci_low = ci_high = np.nan
+        boot_text = ""
         print("\nWarning: log_ports_per_100k coefficient not found in the model.")
 
 
     # ===========================================================================================================
     # 3. Save to txt
     # ===========================================================================================================
-    out_path = TEXT_SUMMARIES_DIR / "logspec_summary.txt"
+    out_path = TEXT_SUMMARIES_DIR / f"logspec_summary{suffix}.txt"
     with open(out_path, "w") as f:
         f.write("=== Robustness: log–log FE regression ===\n\n")
         f.write(f"Formula: {formula}\n\n")
-        f.write(fe_log.summary().as_text())
+        f.write(fe_log.summary_text())
+        f.write("\n" + diagnostics.summary_text())
 
         f.write("\n\nKey elasticity result:\n")
         if not np.isnan(beta):
@@ -80,6 +106,7 @@ def main():
             f.write(
                 f"  95% CI (clustered by state): [{ci_low:.3f}, {ci_high:.3f}]\n"
             )
+            f.write(boot_text)
         else:
             f.write("  Coefficient for log_ports_per_100k not found.\n")
 
@@ -87,4 +114,6 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Log-log FE robustness regression.")
+    add_freq_argument(parser)
+    main(parser.parse_args().freq)
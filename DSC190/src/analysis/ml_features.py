@@ -0,0 +1,278 @@
+"""
+Historical features for the ML models that predict a state's EV count.
+
+charging_stations.ipynb (check_multicollinearity, create_reduced_features)
+and final.ipynb (prepare_model_data) built these with one loop iteration
+per state. Each iteration filtered the frame, sorted it and read the last
+three pre-target rows. Here every (state, target year) row gets its features
+at once. The registrations are sorted by (state, year) a single time. A
+row's history is the rows before it in the same state, so lag k is the row
+k positions back, and the 3-year mean is taken over the three lag arrays.
+Nothing loops over states or years.
+
+As in the notebooks, lags are positional ("the last known value"): EV_lag1
+is the latest year before the target that is in the data, even after a gap.
+Ratios add 1 to the denominator as the notebooks did:
+
+    EV_growth_rate   = EV_lag1 / (EV_lag2 + 1) - 1
+    EV_3yr_growth    = EV_lag1 / (EV_lag3 + 1) - 1
+    EV_share         = EV_lag1 / (EV_lag1 + PHEV_lag1 + HEV_lag1 + 1)
+    EV_acceleration  = (EV_lag1 - EV_lag2) - (EV_lag2 - EV_lag3)
+    EV_avg_3yr       = mean of the last three EV counts
+
+`features_for_year` is the notebook's frame for one target year. It is
+cached in the model cache, keyed by the target year, a fingerprint of the
+registrations and this file's source. `temporal_split` stacks earlier
+target years for training and holds out a later one, from the same single
+pass. Both return plain frames, so `X, y = xy(frame)` goes straight into scikit-learn.
+
+Usage (from the DSC190/ folder):
+    python -m src.analysis.ml_features                  # target year 2023
+    python -m src.analysis.ml_features --target-year 2022
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from src.config import EV_REG_CLEAN_FILE, FORECAST_DIR, TEXT_SUMMARIES_DIR, USE_MODEL_CACHE
+from src.storage import read_table
+from src.geography import geo_kind
+from src.instrument import record
+from src.analysis import model_cache
+
+try:
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.linear_model import LinearRegression
+    from sklearn.metrics import mean_absolute_error, r2_score
+    from sklearn.model_selection import LeaveOneOut, cross_val_predict
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+except ImportError:  # pragma: no cover - optional dependency
+    LinearRegression = None
+
+# Notebook column -> cleaned registrations column
+FUELS = {"EV": "ev_count", "PHEV": "phev_count", "HEV": "hev_count"}
+
+# check_multicollinearity's full set, and the reduced set the regression kept
+FEATURES = [
+    "EV_lag1", "EV_lag2", "EV_lag3", "PHEV_lag1", "PHEV_lag2", "HEV_lag1", "HEV_lag2",
+    "EV_growth_rate", "PHEV_growth_rate", "EV_3yr_growth", "EV_share",
+    "EV_acceleration", "EV_avg_3yr", "Total_alt_fuel_lag1",
+]
+REDUCED_FEATURES = [
+    "EV_lag1", "EV_lag2", "EV_lag3", "PHEV_lag1", "HEV_lag1",
+    "EV_growth_rate", "PHEV_growth_rate", "EV_3yr_growth", "EV_share",
+]
+TARGET = "Target_EV"
+
+# The notebooks required three years of history before the target year
+MIN_HISTORY = 3
+
+
+# =========================================================================================================
+# Feature construction
+# =========================================================================================================
+def load_registrations() -> pd.DataFrame:
+    """State, state_fips, Year and the EV/PHEV/HEV counts for every state-level row (no national total)."""
+    reg = read_table(EV_REG_CLEAN_FILE, columns=["state", "state_fips", "year", *FUELS.values()])
+    reg = reg[geo_kind(reg["state_fips"].to_numpy()) != "nation"]
+    reg = reg.rename(columns={"state": "State", "year": "Year", **{v: k for k, v in FUELS.items()}})
+    reg["State"] = reg["State"].astype(str)
+    return reg.reset_index(drop=True)
+
+
+def history_features(df: pd.DataFrame, unit_col: str = "State", time_col: str = "Year",
+                     min_history: int = MIN_HISTORY) -> pd.DataFrame:
+    """
+    FEATURES and TARGET for every row of `df` with at least `min_history`
+    earlier rows in its unit, all target years at once. Returns unit_col,
+    "Target_Year", "n_history", FEATURES and TARGET, sorted by target year
+    and unit.
+    """
+    order = np.lexsort((df[time_col].to_numpy(), df[unit_col].to_numpy()))
+    data = df.iloc[order]
+    units = data[unit_col].to_numpy()
+    n = len(data)
+
+    # Position of every row within its unit's history
+    starts = np.flatnonzero(np.r_[True, units[1:] != units[:-1]]) if n else np.array([], dtype=int)
+    sizes = np.diff(np.r_[starts, n])
+    pos = np.arange(n) - np.repeat(starts, sizes)
+
+    values = {fuel: data[fuel].to_numpy(dtype=float, na_value=np.nan) for fuel in FUELS}
+    rows = np.arange(n)
+
+    def lag(fuel: str, k: int) -> np.ndarray:
+        return np.where(pos >= k, values[fuel][np.maximum(rows - k, 0)], np.nan)
+
+    ev1, ev2, ev3 = lag("EV", 1), lag("EV", 2), lag("EV", 3)
+    phev1, phev2 = lag("PHEV", 1), lag("PHEV", 2)
+    hev1, hev2 = lag("HEV", 1), lag("HEV", 2)
+    total1 = ev1 + phev1 + hev1
+
+    # Mean of the last three EV counts, skipping missing ones like tail(3).mean()
+    last3 = np.stack([ev1, ev2, ev3])
+    n_known = (~np.isnan(last3)).sum(axis=0)
+    with np.errstate(invalid="ignore"):
+        ev_avg3 = np.where(n_known > 0, np.nansum(last3, axis=0) / n_known, np.nan)
+
+    out = pd.DataFrame({
+        unit_col: units,
+        "Target_Year": data[time_col].to_numpy(),
+        "n_history": pos,
+        "EV_lag1": ev1,
+        "EV_lag2": ev2,
+        "EV_lag3": ev3,
+        "PHEV_lag1": phev1,
+        "PHEV_lag2": phev2,
+        "HEV_lag1": hev1,
+        "HEV_lag2": hev2,
+        "EV_growth_rate": ev1 / (ev2 + 1) - 1,
+        "PHEV_growth_rate": phev1 / (phev2 + 1) - 1,
+        "EV_3yr_growth": ev1 / (ev3 + 1) - 1,
+        "EV_share": ev1 / (total1 + 1),
+        "EV_acceleration": (ev1 - ev2) - (ev2 - ev3),
+        "EV_avg_3yr": ev_avg3,
+        "Total_alt_fuel_lag1": total1,
+        TARGET: values["EV"],
+    })
+    out = out[pos >= min_history]
+    record(rows_in=n, rows_out=len(out))
+    return out.sort_values(["Target_Year", unit_col], kind="stable").reset_index(drop=True)
+
+
+def features_for_year(df: pd.DataFrame, target_year: int, min_history: int = MIN_HISTORY,
+                      use_cache: bool = USE_MODEL_CACHE) -> pd.DataFrame:
+    """The notebooks' one-row-per-state frame for `target_year`, cached per target year."""
+    def build():
+        # Later years never enter a row's history, so they are dropped first
+        frame = history_features(df[df["Year"] <= target_year], min_history=min_history)
+        return frame[frame["Target_Year"] == target_year].reset_index(drop=True)
+
+    if not use_cache:
+        return build()
+
+    key = model_cache.model_key(
+        "history_features", f"target_year={target_year}", {"min_history": min_history},
+        model_cache.data_fingerprint(df, ["State", "Year", *FUELS]),
+        model_cache.code_digest(__file__),
+    )
+    frame = model_cache.load(key)
+    if frame is not None:
+        print(f"Reused cached features for target year {target_year} ({key[:12]})")
+        record(cache_hits=1)
+        return frame
+
+    frame = build()
+    model_cache.store(key, frame)
+    record(cache_misses=1)
+    return frame
+
+
+def temporal_split(df: pd.DataFrame, test_year: int,
+                   min_history: int = MIN_HISTORY) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """(train, test): every target year before `test_year` stacked for training, `test_year` held out."""
+    frame = history_features(df[df["Year"] <= test_year], min_history=min_history)
+    is_test = frame["Target_Year"] == test_year
+    return frame[~is_test].reset_index(drop=True), frame[is_test].reset_index(drop=True)
+
+
+def xy(frame: pd.DataFrame, features: list[str] = REDUCED_FEATURES) -> tuple[pd.DataFrame, pd.Series]:
+    """Feature matrix and target, ready for scikit-learn."""
+    return frame[features], frame[TARGET]
+
+
+# =========================================================================================================
+# Models
+# =========================================================================================================
+def _metrics(actual, predicted) -> dict:
+    actual, predicted = np.asarray(actual, dtype=float), np.asarray(predicted, dtype=float)
+    err = actual - predicted
+    return {
+        "r2": r2_score(actual, predicted),
+        "rmse": float(np.sqrt(np.mean(err ** 2))),
+        "mae": mean_absolute_error(actual, predicted),
+        "mape": float(np.mean(np.abs(err) / (actual + 1) * 100)),
+    }
+
+
+def loo_linear(frame: pd.DataFrame, features: list[str] = REDUCED_FEATURES) -> tuple[pd.DataFrame, dict]:
+    """The notebook's leave-one-state-out linear regression (scaler refit per fold)."""
+    X, y = xy(frame, features)
+    model = make_pipeline(StandardScaler(), LinearRegression())
+    predicted = cross_val_predict(model, X, y, cv=LeaveOneOut())
+    errors = pd.DataFrame({"State": frame["State"], "Actual": y, "Predicted": predicted})
+    errors["Residual"] = errors["Actual"] - errors["Predicted"]
+    errors["Absolute_Error"] = errors["Residual"].abs()
+    errors["Percent_Error"] = errors["Absolute_Error"] / (errors["Actual"] + 1) * 100
+    errors = errors.sort_values("Absolute_Error", ascending=False).reset_index(drop=True)
+    return errors, _metrics(y, predicted)
+
+
+def temporal_forest(train: pd.DataFrame, test: pd.DataFrame, features: list[str] = FEATURES,
+                    seed: int = 42) -> tuple[dict, pd.Series]:
+    """Random forest trained on earlier target years, scored on the held-out year."""
+    X_train, y_train = xy(train, features)
+    X_test, y_test = xy(test, features)
+    model = RandomForestRegressor(n_estimators=300, random_state=seed, n_jobs=-1)
+    model.fit(X_train, y_train)
+    importance = pd.Series(model.feature_importances_, index=features).sort_values(ascending=False)
+    return _metrics(y_test, model.predict(X_test)), importance
+
+
+def main(target_year: int = 2023):
+    reg = load_registrations()
+    frame = features_for_year(reg, target_year)
+    print(f"Built {len(FEATURES)} historical features for {len(frame)} states (target year {target_year})")
+
+    out_path = FORECAST_DIR / f"ml_features_{target_year}.csv"
+    frame.to_csv(out_path, index=False)
+    print(f"Saved ML features to {out_path}")
+
+    if LinearRegression is None:
+        print("scikit-learn is not installed; skipping the prediction models")
+        return
+
+    lines = [f"EV count prediction from registration history (target year {target_year})\n"]
+    lines.append("------------------------------------------------------\n\n")
+
+    errors, loo = loo_linear(frame)
+    lines.append(f"Linear regression, {len(REDUCED_FEATURES)} features, leave-one-state-out ({len(frame)} states):\n")
+    lines.append(
+        f"  R2 {loo['r2']:.4f}  RMSE {loo['rmse']:,.0f}  MAE {loo['mae']:,.0f}  MAPE {loo['mape']:.1f}%\n"
+    )
+    lines.append("  Largest errors:\n")
+    for row in errors.head(5).itertuples():
+        lines.append(
+            f"    {row.State:<20} actual {row.Actual:>10,.0f}  predicted {row.Predicted:>10,.0f}  "
+            f"({row.Percent_Error:.1f}%)\n"
+        )
+
+    train, test = temporal_split(reg, target_year)
+    if len(train) and len(test):
+        forest, importance = temporal_forest(train, test)
+        train_years = sorted(train["Target_Year"].unique())
+        lines.append(
+            f"\nRandom forest, {len(FEATURES)} features, trained on target years "
+            f"{train_years[0]}-{train_years[-1]} ({len(train)} rows), tested on {target_year}:\n"
+        )
+        lines.append(
+            f"  R2 {forest['r2']:.4f}  RMSE {forest['rmse']:,.0f}  MAE {forest['mae']:,.0f}  "
+            f"MAPE {forest['mape']:.1f}%\n"
+        )
+        lines.append("  Top features: " + ", ".join(
+            f"{name} ({share:.2f})" for name, share in importance.head(5).items()
+        ) + "\n")
+
+    out_path = TEXT_SUMMARIES_DIR / "ml_prediction_summary.txt"
+    with out_path.open("w") as f:
+        f.writelines(lines)
+    print("".join(lines))
+    print(f"Saved ML prediction summary to {out_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Historical features and ML models for EV counts.")
+    parser.add_argument("--target-year", type=int, default=2023)
+    main(parser.parse_args().target_year)
@@ -0,0 +1,221 @@
+"""
+Persistent cache of fitted models.
+
+A fit is stored under a key built from the estimator, the formula, the
+covariance options, a fingerprint of the input rows (values and index of
+exactly the columns the model uses) and the estimator's source code. The
+whole results object goes to MODEL_CACHE_DIR: coefficients, clustered
+covariance, unit effects, fit statistics, fitted values and residuals. So
+logspec, state_gas, forecast_ev_panel, the atlas and the causal specs only
+refit when their data or the estimator changes.
+
+A fit can also be saved under a name (e.g. "forecast_panel"). Downstream
+steps such as forecast_summary then load that model with `load_named`
+instead of reconstructing it from CSVs.
+
+The cache is bounded by MODEL_CACHE_MAX_MB. A hit refreshes the entry's
+mtime, and the least recently used entries are evicted first.
+"""
+import hashlib
+import json
+import os
+import pickle
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+from src.config import MODEL_CACHE_DIR, MODEL_CACHE_MAX_MB, USE_MODEL_CACHE
+from src.instrument import record
+from src.analysis.fixed_effects import fit_within
+from src.analysis.hdfe import fit_hdfe, term_columns
+
+NAMES_FILE = MODEL_CACHE_DIR / "names.json"
+
+_code_digests = {}
+_lock = threading.Lock()
+
+
+def code_digest(path) -> str:
+    path = str(path)
+    if path not in _code_digests:
+        _code_digests[path] = hashlib.sha256(Path(path).read_bytes()).hexdigest()
+    return _code_digests[path]
+
+
+def data_fingerprint(df: pd.DataFrame, cols: list[str]) -> str:
+    """Hash of the values and index of `cols` (row order matters)."""
+    h = hashlib.sha256(json.dumps([str(c) for c in cols]).encode())
+    h.update(pd.util.hash_pandas_object(df[cols], index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def model_key(estimator: str, formula: str, options: dict, fingerprint: str, code: str) -> str:
+    blob = json.dumps(
+        {"estimator": estimator, "formula": formula, "options": options,
+         "data": fingerprint, "code": code},
+        sort_keys=True,
+    )
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def _entry_path(key: str) -> Path:
+    return MODEL_CACHE_DIR / f"{key}.pkl"
+
+
+# =========================================================================================================
+# Store / load / evict
+# =========================================================================================================
+def load(key: str):
+    """Cached model for `key`, or None. A hit marks the entry as recently used."""
+    path = _entry_path(key)
+    try:
+        with path.open("rb") as f:
+            model = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None  # unreadable entry: refit and overwrite it
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return model
+
+
+def store(key: str, model, name: str = None, max_mb: float = MODEL_CACHE_MAX_MB) -> None:
+    MODEL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    path = _entry_path(key)
+    tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with tmp.open("wb") as f:
+        pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+    if name:
+        set_name(name, key)
+    evict(max_mb, keep=key)
+
+
+def evict(max_mb: float = MODEL_CACHE_MAX_MB, keep: str = None) -> int:
+    """Remove least recently used entries until the cache fits in `max_mb`. Returns the count removed."""
+    entries = []
+    for p in MODEL_CACHE_DIR.glob("*.pkl"):
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, p))
+    total = sum(size for _, size, _ in entries)
+    limit = max_mb * 2**20
+
+    removed = 0
+    for _, size, p in sorted(entries):
+        if total <= limit:
+            break
+        if p.stem == keep:
+            continue
+        p.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+    return removed
+
+
+def clear() -> None:
+    for p in MODEL_CACHE_DIR.glob("*.pkl"):
+        p.unlink()
+    NAMES_FILE.unlink(missing_ok=True)
+
+
+def set_name(name: str, key: str) -> None:
+    with _lock:
+        names = {}
+        if NAMES_FILE.exists():
+            with NAMES_FILE.open() as f:
+                names = json.load(f)
+        names[name] = key
+        tmp = NAMES_FILE.with_suffix(f".{os.getpid()}.tmp")
+        with tmp.open("w") as f:
+            json.dump(names, f, indent=2, sort_keys=True)
+        os.replace(tmp, NAMES_FILE)
+
+
+def load_named(name: str):
+    """The model last saved under `name`, or None if there is none (or it was evicted)."""
+    if not NAMES_FILE.exists():
+        return None
+    with NAMES_FILE.open() as f:
+        key = json.load(f).get(name)
+    return load(key) if key else None
+
+
+# =========================================================================================================
+# Cached estimators
+# =========================================================================================================
+def _cached_fit(estimator, formula: str, options: dict, df: pd.DataFrame, cols: list[str],
+                name: str, fit):
+    key = model_key(
+        estimator.__name__, formula, options,
+        data_fingerprint(df, cols),
+        code_digest(estimator.__code__.co_filename),
+    )
+
+    model = load(key)
+    if model is not None:
+        print(f"Reused cached fit of {model.formula} ({key[:12]})")
+        record(cache_hits=1)
+        if name:
+            set_name(name, key)
+        return model
+
+    model = fit()
+    store(key, model, name=name)
+    record(cache_misses=1)
+    return model
+
+
+def cached_fit_within(
+    df: pd.DataFrame,
+    y: str,
+    x: list[str],
+    unit_col: str,
+    cluster_col: str = None,
+    name: str = None,
+    use_cache: bool = USE_MODEL_CACHE,
+):
+    """`fit_within` with the results cached on disk (same arguments and return value)."""
+    if not use_cache:
+        return fit_within(df, y, x, unit_col, cluster_col)
+
+    cols = list(dict.fromkeys([y, *x, unit_col, cluster_col or unit_col]))
+    return _cached_fit(
+        fit_within,
+        f"{y} ~ {' + '.join(x)} + C({unit_col})",
+        {"cov_type": "cluster", "cluster_col": cluster_col or unit_col},
+        df, cols, name,
+        lambda: fit_within(df, y, x, unit_col, cluster_col),
+    )
+
+
+def cached_fit_hdfe(
+    df: pd.DataFrame,
+    y: str,
+    x: list[str],
+    absorb: list[str],
+    cluster: list[str] = None,
+    name: str = None,
+    use_cache: bool = USE_MODEL_CACHE,
+    **kwargs,
+):
+    """`fit_hdfe` with the results cached on disk (same arguments and return value)."""
+    if not use_cache:
+        return fit_hdfe(df, y, x, absorb, cluster, **kwargs)
+
+    absorb = [absorb] if isinstance(absorb, str) else list(absorb)
+    cluster = [cluster] if isinstance(cluster, str) else cluster
+    cols = list(dict.fromkeys([y, *x, *term_columns(absorb), *(cluster or [])]))
+    return _cached_fit(
+        fit_hdfe,
+        f"{y} ~ {' + '.join(x)} | {' + '.join(absorb)}",
+        {"cov_type": "cluster", "cluster": cluster, **kwargs},
+        df, cols, name,
+        lambda: fit_hdfe(df, y, x, absorb, cluster, **kwargs),
+    )
@@ -0,0 +1,109 @@
+"""
+Batched prediction for the state fixed-effects panel model.
+
+Instead of building a one-row DataFrame (and a patsy design matrix) per
+state-year, the forecast grid for every unit x horizon is built once as a
+numeric matrix and evaluated with a single matrix product against the fitted
+slopes, plus a vectorized lookup of each unit's fixed effect.
+
+Accepts either a `WithinResults` from src.analysis.fixed_effects or statsmodels
+results from a `... + C(unit)` formula.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+from src.analysis.fixed_effects import WithinResults
+from src.periods import ANNUAL, trend_years
+
+
+def unit_effects(results, unit_col: str) -> pd.Series:
+    """
+    Fixed effect (intercept included) for every unit seen in the fit.
+
+    For statsmodels results from a `... + C(unit_col)` formula, the reference
+    unit's effect is the Intercept and the others are
+    Intercept + C(unit_col)[T.<unit>].
+    """
+    if isinstance(results, WithinResults):
+        return results.unit_effects
+
+    params = results.params
+    units = pd.unique(np.asarray(results.model.data.frame[unit_col]))
+
+    intercept = float(params.get("Intercept", 0.0))
+    effects = {}
+    for u in units:
+        effects[u] = intercept + float(params.get(f"C({unit_col})[T.{u}]", 0.0))
+    return pd.Series(effects, name="unit_effect")
+
+
+def slope_params(results, unit_col: str) -> pd.Series:
+    """Fitted coefficients other than the intercept and the unit dummies."""
+    if isinstance(results, WithinResults):
+        return results.params
+    pattern = re.compile(rf"^C\({re.escape(unit_col)}\)\[T\..*\]$")
+    keep = [
+        name for name in results.params.index
+        if name != "Intercept" and not pattern.match(name)
+    ]
+    return results.params[keep]
+
+
+def predict_batch(results, grid: pd.DataFrame, unit_col: str) -> np.ndarray:
+    """
+    Predict every row of `grid` in one pass.
+
+    `grid` needs `unit_col` plus one column per slope regressor of the model
+    (e.g. Outlets_per_100k and Year_trend).
+    """
+    slopes = slope_params(results, unit_col)
+    missing = [c for c in slopes.index if c not in grid.columns]
+    if missing:
+        raise ValueError(f"Forecast grid is missing regressor columns: {missing}")
+
+    effects = unit_effects(results, unit_col)
+    codes = effects.index.get_indexer(np.asarray(grid[unit_col]))
+    if (codes < 0).any():
+        unknown = sorted(set(np.asarray(grid[unit_col])[codes < 0]))
+        raise ValueError(f"No fitted fixed effect for units: {unknown}")
+
+    X = grid[slopes.index].to_numpy(dtype=float)
+    return X @ slopes.to_numpy() + effects.to_numpy()[codes]
+
+
+def build_growth_grid(
+    outlets0: pd.Series,
+    forecast_years,
+    first_year: int,
+    growth,
+    unit_col: str = "State",
+    outlet_col: str = "Outlets_per_100k",
+    time_col: str = "Year",
+    freq: str = ANNUAL,
+) -> pd.DataFrame:
+    """
+    Unit x horizon grid of projected outlets under compound growth.
+
+    `outlets0` is indexed by unit and holds the last observed outlets level.
+    `growth` is a scalar rate or one rate per unit (aligned with `outlets0`),
+    compounded once per step of `forecast_years`. For quarterly/monthly
+    period keys pass `freq` so Year_trend stays in years.
+    Rows are ordered unit-major, year-minor.
+    """
+    units = outlets0.index.to_numpy()
+    years = np.asarray(forecast_years)
+    steps = np.arange(1, len(years) + 1)
+
+    rate = np.broadcast_to(np.asarray(growth, dtype=float).reshape(-1, 1), (len(units), 1))
+    proj = outlets0.to_numpy(dtype=float)[:, None] * (1.0 + rate) ** steps[None, :]
+
+    return pd.DataFrame(
+        {
+            unit_col: np.repeat(units, len(years)),
+            time_col: np.tile(years, len(units)),
+            outlet_col: proj.ravel(),
+            "Year_trend": np.tile(trend_years(years, first_year, freq), len(units)),
+        }
+    )
@@ -0,0 +1,155 @@
+"""
+Scenario-grid engine for the panel forecasts.
+
+A scenario is an outlet-growth path: one rate per scenario, one rate per
+scenario x state, or a full scenario x state x year path. All scenarios are
+evaluated against the fitted FE model in a single vectorized pass into a
+scenario x state x year cube, which is saved as a .npy array with a JSON
+sidecar holding the axis labels. Readers memory-map the array and pull only
+the slice they ask for.
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.analysis.panel_forecast import slope_params, unit_effects
+from src.periods import ANNUAL, trend_years
+
+
+def growth_multipliers(rates, n_units: int, horizon: int) -> np.ndarray:
+    """
+    Cumulative outlet multipliers of shape (scenario, unit, year).
+
+    `rates` may be shaped (S,), (S, n_units) or (S, n_units, horizon); lower
+    ranks are broadcast across units and years.
+    """
+    rates = np.asarray(rates, dtype=float)
+    if rates.ndim == 1:
+        rates = rates[:, None, None]
+    elif rates.ndim == 2:
+        rates = rates[:, :, None]
+    elif rates.ndim != 3:
+        raise ValueError(f"Growth rates must be 1-3 dimensional, got shape {rates.shape}")
+
+    rates = np.broadcast_to(rates, (rates.shape[0], n_units, horizon))
+    return np.cumprod(1.0 + rates, axis=2)
+
+
+def evaluate_scenarios(
+    results,
+    outlets0: pd.Series,
+    forecast_years,
+    first_year: int,
+    rates,
+    unit_col: str = "State",
+    outlet_col: str = "Outlets_per_100k",
+    freq: str = ANNUAL,
+) -> np.ndarray:
+    """
+    Forecast cube (scenario, unit, year) for every growth path in `rates`.
+
+    `outlets0` is indexed by unit and holds the last observed outlets level;
+    the model's slopes must be `outlet_col` and `Year_trend`. With
+    quarterly/monthly `freq`, `forecast_years` holds period keys and `rates`
+    are per period.
+    """
+    slopes = slope_params(results, unit_col)
+    unexpected = sorted(set(slopes.index) - {outlet_col, "Year_trend"})
+    if unexpected:
+        raise ValueError(f"Scenario engine cannot project regressors: {unexpected}")
+
+    effects = unit_effects(results, unit_col).reindex(outlets0.index)
+    if effects.isna().any():
+        raise ValueError(f"No fitted fixed effect for units: {effects[effects.isna()].index.tolist()}")
+
+    years = np.asarray(forecast_years)
+    trend = np.asarray(trend_years(years, first_year, freq), dtype=float)
+    mult = growth_multipliers(rates, len(outlets0), len(years))
+
+    outlets = outlets0.to_numpy(dtype=float)[None, :, None] * mult
+    cube = (
+        effects.to_numpy()[None, :, None]
+        + slopes.get(outlet_col, 0.0) * outlets
+        + slopes.get("Year_trend", 0.0) * trend[None, None, :]
+    )
+    return cube.astype(np.float32)
+
+
+def _meta_path(path: Path) -> Path:
+    return Path(path).with_suffix(".json")
+
+
+def save_cube(path: Path, cube: np.ndarray, scenarios, units, years, rates=None) -> None:
+    """Save a forecast cube plus its axis labels (and optional scenario rates)."""
+    path = Path(path)
+    scenarios, units, years = list(scenarios), list(units), list(years)
+    if cube.shape != (len(scenarios), len(units), len(years)):
+        raise ValueError(
+            f"Cube shape {cube.shape} does not match axes "
+            f"({len(scenarios)}, {len(units)}, {len(years)})"
+        )
+
+    np.save(path, cube)
+    meta = {
+        "dims": ["scenario", "unit", "year"],
+        "scenario": scenarios,
+        "unit": [str(u) for u in units],
+        "year": [int(y) for y in years],
+    }
+    if rates is not None:
+        meta["rates"] = np.asarray(rates, dtype=float).tolist()
+    with _meta_path(path).open("w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def cube_axes(path: Path) -> dict:
+    with _meta_path(path).open() as f:
+        return json.load(f)
+
+
+def _positions(labels: list, wanted, axis: str) -> np.ndarray:
+    if wanted is None:
+        return np.arange(len(labels))
+    if np.isscalar(wanted):
+        wanted = [wanted]
+    index = {label: i for i, label in enumerate(labels)}
+    missing = [w for w in wanted if w not in index]
+    if missing:
+        raise KeyError(f"{axis} not in forecast cube: {missing}")
+    return np.array([index[w] for w in wanted])
+
+
+def load_cube_slice(
+    path: Path,
+    scenarios=None,
+    units=None,
+    years=None,
+    unit_col: str = "State",
+    value_col: str = "EVs_per_1000_forecast",
+) -> pd.DataFrame:
+    """
+    Long (scenario, unit, Year, value) frame for the requested slice only.
+
+    The array is memory-mapped, so only the selected cells are read.
+    """
+    axes = cube_axes(path)
+    s = _positions(axes["scenario"], scenarios, "scenario")
+    u = _positions(axes["unit"], units, "unit")
+    if years is not None:
+        years = [int(v) for v in np.atleast_1d(years)]
+    y = _positions(axes["year"], years, "year")
+
+    cube = np.load(path, mmap_mode="r")
+    block = np.asarray(cube[np.ix_(s, u, y)])
+
+    n_s, n_u, n_y = block.shape
+    return pd.DataFrame(
+        {
+            "scenario": np.repeat(np.array(axes["scenario"])[s], n_u * n_y),
+            unit_col: np.tile(np.repeat(np.array(axes["unit"])[u], n_y), n_s),
+            "Year": np.tile(np.array(axes["year"])[y], n_s * n_u),
+            value_col: block.ravel(),
+        }
+    )
@@ -1,43 +1,56 @@
+import argparse
 import numpy as np
-import pandas as pd
 import statsmodels.api as sm
-import statsmodels.formula.api as smf
 import matplotlib.pyplot as plt
 import seaborn as sns
-from src.config import PANEL_FILE, TEXT_SUMMARIES_DIR, FIGURES_DIR
+from src.config import PERIOD_PANEL_FILES, TEXT_SUMMARIES_DIR, FIGURES_DIR
+from src.storage import read_table
+from src.periods import ANNUAL, add_freq_argument, time_column, trend_years
+from src.analysis.model_cache import cached_fit_within
+from src.analysis.bootstrap import DEFAULT_REPS, fe_bootstrap, bootstrap_summary_text
+from src.analysis.collinearity import diagnose
 
-def run_state_gas_fe():
+def run_state_gas_fe(freq=ANNUAL):
     """
     State-level panel regression of EV adoption on gas prices (2016-2023)
     Model: log(ev_per_1000) ~ log(gas_real_2023) + year_centered + state FE
-    Generates diagnostic plots for the Final Report.
+    Generates diagnostic plots for the Final Report. freq='Q'/'M' runs it on
+    the quarterly/monthly panel (year_centered stays in years).
     """
+    suffix = "" if freq == ANNUAL else f"_{freq}"
+    panel_key = time_column(freq)
+
     # 1. Load and Prep Data
-    panel = pd.read_csv(PANEL_FILE)
-    df = panel.copy()
+    cols = ["state", "year", "ev_per_1000", "gas_real_2023"]
+    if panel_key != "year":
+        cols.insert(1, panel_key)
+    df = read_table(PERIOD_PANEL_FILES[freq], columns=cols)
 
     # Filter for the years 2016-2023
     df = df[(df["year"] >= 2016) & (df["year"] <= 2023)]
 
     # Keep needed columns and drop missing
-    cols = ["state", "year", "ev_per_1000", "gas_real_2023"]
     df = df[cols].dropna()
 
     # Require strictly positive values for logs
     df = df[(df["ev_per_1000"] > 0) & (df["gas_real_2023"] > 0)].copy()
+    df["state"] = df["state"].cat.remove_unused_categories()
 
     # Logs + centered year
     df["log_ev_per_1000"] = np.log(df["ev_per_1000"])
     df["log_gas_real_2023"] = np.log(df["gas_real_2023"])
-    df["year_centered"] = df["year"] - df["year"].mean()
+    trend = trend_years(df[panel_key], df[panel_key].min(), freq)
+    df["year_centered"] = trend - trend.mean()
 
     # 2. Run Regression (Clustered SEs)
-    formula = "log_ev_per_1000 ~ log_gas_real_2023 + year_centered + C(state)"
-    model = smf.ols(formula, data=df)
-    results = model.fit(
-        cov_type="cluster",
-        cov_kwds={"groups": df["state"]},
+    diagnostics = diagnose(df, ["log_gas_real_2023", "year_centered"], unit_col="state")
+    print(diagnostics.summary_text())
+
+    results = cached_fit_within(
+        df, "log_ev_per_1000", ["log_gas_real_2023", "year_centered"], unit_col="state",
+        name=f"state_gas{suffix}",
     )
+    formula = results.formula
 
     # 3. Save Text Summary
     coef = results.params["log_gas_real_2023"]
@@ -45,17 +58,24 @@ def run_state_gas_fe():
     ci_low = coef - 1.96 * se
     ci_high = coef + 1.96 * se
 
+    boot = fe_bootstrap(
+        df, "log_ev_per_1000", ["log_gas_real_2023", "year_centered"], unit_col="state",
+        reps=DEFAULT_REPS,
+    )
+
     lines = []
     lines.append("=== State-level FE regression (2016-2023) ===\n")
     lines.append(f"Formula: {formula}\n\n")
-    lines.append(results.summary().as_text())
+    lines.append(results.summary_text())
+    lines.append("\n" + diagnostics.summary_text())
     lines.append("\n\nElasticity interpretation (log-log):\n")
     lines.append(
         f"  coef(log_gas_real_2023) = {coef:.3f}\n"
         f"  95% CI = [{ci_low:.3f}, {ci_high:.3f}]\n"
     )
+    lines.append(bootstrap_summary_text(boot, "log_gas_real_2023", DEFAULT_REPS))
     
-    out_path = TEXT_SUMMARIES_DIR / "state_gas_summary.txt"
+    out_path = TEXT_SUMMARIES_DIR / f"state_gas_summary{suffix}.txt"
     with out_path.open("w") as f:
         for line in lines:
             f.write(line)
@@ -92,10 +112,12 @@ def run_state_gas_fe():
     axes[1, 1].set_ylabel("Residuals")
 
     plt.tight_layout()
-    plot_path = FIGURES_DIR / "state_gas_diagnostics.png"
+    plot_path = FIGURES_DIR / f"state_gas_diagnostics{suffix}.png"
     plt.savefig(plot_path, dpi=150)
     print(f"Diagnostic plots saved to {plot_path}")
     plt.close()
 
 if __name__ == "__main__":
-    run_state_gas_fe()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="State FE regression of EV adoption on gas prices.")
+    add_freq_argument(parser)
+    run_state_gas_fe(parser.parse_args().freq)
\ No newline at end of file
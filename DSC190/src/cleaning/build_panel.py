@@ -1,4 +1,3 @@
-import pandas as pd
 from src.config import (
     PORTS_CLEAN_FILE,
     POP_CLEAN_FILE,
@@ -6,27 +5,42 @@ from src.config import (
     EV_REG_CLEAN_FILE,
     PANEL_FILE,
 )
+from src.storage import read_table, write_table
+from src.geography import canonical_names
+from src.cleaning.geo_panel import build_geo_panel, build_aggregated_panel, county_to_state
 
-def main():
-    ports = pd.read_csv(PORTS_CLEAN_FILE)
-    pop = pd.read_csv(POP_CLEAN_FILE)
-    gas = pd.read_csv(GAS_CLEAN_FILE)
-    ev = pd.read_csv(EV_REG_CLEAN_FILE)
+PANEL_COLUMNS = [
+    "state", "year", "ev_count", "ports_total", "state_fips", "population",
+    "gas_real_2023", "ev_per_1000", "ports_per_100k",
+]
+
+def merge_panel(ev, ports, pop, gas):
+    """
+    Join the cleaned tables on FIPS + year and add per-capita metrics.
 
-    # Merge ports + population + EVs on state + year
-    panel = (
-        ev.merge(ports, on=["state", "year"], how="left")
-          .merge(pop,  on=["state", "year"], how="left")
-    )
+    When the EV, ports and population tables all carry county_fips the panel
+    is built per county in chunks, each summed into states as it is built;
+    otherwise (the state-level sources shipped here) it is built per state.
+    """
+    # Every cleaned table carries the canonical integer FIPS from parse time,
+    # so the joins are integer-keyed sorted lookups (no string merges)
+    if all("county_fips" in t.columns for t in (ev, ports, pop)):
+        panel = build_aggregated_panel(ev, ports, pop, gas, code_col="county_fips",
+                                       parent_of=county_to_state)
+        panel["state"] = canonical_names(panel["state_fips"])
+    else:
+        panel = build_geo_panel(ev, ports, pop, gas, code_col="state_fips")
+    return panel[PANEL_COLUMNS]
 
-    # Merge gas price on year only
-    panel = panel.merge(gas, on="year", how="left")
+def main():
+    ports = read_table(PORTS_CLEAN_FILE)
+    pop = read_table(POP_CLEAN_FILE)
+    gas = read_table(GAS_CLEAN_FILE)
+    ev = read_table(EV_REG_CLEAN_FILE)
 
-    # Per-capita metrics
-    panel["ev_per_1000"] = panel["ev_count"] / panel["population"] * 1000
-    panel["ports_per_100k"] = panel["ports_total"] / panel["population"] * 100_000
+    panel = merge_panel(ev, ports, pop, gas)
 
-    panel.to_csv(PANEL_FILE, index=False)
+    write_table(panel, PANEL_FILE)
     print(f"Saved panel dataset to {PANEL_FILE}")
 
 if __name__ == "__main__":
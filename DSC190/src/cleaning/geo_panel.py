@@ -0,0 +1,183 @@
+"""
+Geography-generic panel builder (state, county or ZIP by year or period).
+
+Every table is keyed by an integer geography code (state FIPS, 5-digit
+county FIPS, ZIP) plus a time key (the year, or a quarterly/monthly period
+key from src/periods.py), packed into one int64 key. The lookup tables
+(ports, population, gas) are sorted once and joined with np.searchsorted,
+and the driving table (EV counts) is processed in fixed-size row chunks, so
+peak memory is bounded by the chunk size plus the sorted lookup columns
+rather than by pandas merge intermediates.
+
+Coarser panels are aggregations of finer ones: `build_aggregated_panel` sums
+each chunk of e.g. the county panel into its state (county_fips // 1000) as
+it is built, so only (state, year) partial sums are held, and recomputes the
+per-capita metrics. `aggregate_panel` does the same for a panel in memory.
+"""
+import numpy as np
+import pandas as pd
+
+# key = code * TIME_SPAN + time (monthly period keys are ~24,300 for 2023)
+TIME_SPAN = 100_000
+
+DEFAULT_CHUNK_ROWS = 1_000_000
+
+# Columns taken from each lookup table
+PORT_COLS = ["ports_total"]
+POP_COLS = ["population"]
+GAS_COLS = ["gas_real_2023"]
+
+def geo_time_key(codes, times) -> np.ndarray:
+    return np.asarray(codes, dtype=np.int64) * TIME_SPAN + np.asarray(times, dtype=np.int64)
+
+
+def sorted_index(keys: np.ndarray, df: pd.DataFrame, cols: list[str], name: str) -> dict:
+    """Sort a lookup table by key once; duplicate keys are an error."""
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    dup = keys[1:] == keys[:-1]
+    if dup.any():
+        bad = keys[1:][dup][:5]
+        raise ValueError(
+            f"{name}: duplicate (code, time) keys, e.g. "
+            f"{[(int(k // TIME_SPAN), int(k % TIME_SPAN)) for k in bad]}"
+        )
+    return {
+        "keys": keys,
+        "values": {c: df[c].to_numpy(dtype=float)[order] for c in cols},
+    }
+
+
+def lookup(index: dict, keys: np.ndarray) -> dict:
+    """Values for `keys` from a sorted index; NaN where the key is absent (left join)."""
+    sorted_keys = index["keys"]
+    pos = np.searchsorted(sorted_keys, keys)
+    found = np.zeros(len(keys), dtype=bool)
+    inside = pos < len(sorted_keys)
+    found[inside] = sorted_keys[pos[inside]] == keys[inside]
+
+    out = {}
+    for col, values in index["values"].items():
+        col_out = np.full(len(keys), np.nan)
+        col_out[found] = values[pos[found]]
+        out[col] = col_out
+    return out
+
+
+def add_rates(panel: pd.DataFrame) -> pd.DataFrame:
+    panel["ev_per_1000"] = panel["ev_count"] / panel["population"] * 1000
+    panel["ports_per_100k"] = panel["ports_total"] / panel["population"] * 100_000
+    return panel
+
+
+def iter_geo_panel(ev, ports, pop, gas, code_col: str, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                   time_col: str = "year"):
+    """
+    Yield panel chunks in the row order of `ev`.
+
+    `ev`, `ports` and `pop` need `code_col` (integer) and `time_col`; `gas`
+    is keyed by `time_col` only. Any other `ev` columns (names, fuel type,
+    ...) are carried through unchanged.
+    """
+    ports_idx = sorted_index(geo_time_key(ports[code_col], ports[time_col]), ports, PORT_COLS, "ports")
+    pop_idx = sorted_index(geo_time_key(pop[code_col], pop[time_col]), pop, POP_COLS, "population")
+    gas_idx = sorted_index(gas[time_col].to_numpy(dtype=np.int64), gas, GAS_COLS, "gas")
+
+    for start in range(0, len(ev), chunk_rows):
+        chunk = ev.iloc[start:start + chunk_rows].copy()
+        keys = geo_time_key(chunk[code_col], chunk[time_col])
+        for col, values in lookup(ports_idx, keys).items():
+            chunk[col] = values
+        for col, values in lookup(pop_idx, keys).items():
+            chunk[col] = values
+        for col, values in lookup(gas_idx, chunk[time_col].to_numpy(dtype=np.int64)).items():
+            chunk[col] = values
+        yield add_rates(chunk)
+
+
+def build_geo_panel(ev, ports, pop, gas, code_col: str, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                    time_col: str = "year") -> pd.DataFrame:
+    """
+    Whole panel in memory. For the state and period panels, which are the
+    outputs themselves; finer panels go through `build_aggregated_panel`.
+    """
+    chunks = list(iter_geo_panel(ev, ports, pop, gas, code_col, chunk_rows, time_col))
+    if not chunks:
+        return add_rates(ev.assign(**{c: np.nan for c in PORT_COLS + POP_COLS + GAS_COLS}))
+    return pd.concat(chunks, ignore_index=True)
+
+
+# =========================================================================================================
+# Aggregation to a coarser geography
+# =========================================================================================================
+def county_to_state(county_fips) -> np.ndarray:
+    """5-digit county FIPS -> 2-digit state FIPS."""
+    return np.asarray(county_fips, dtype=np.int64) // 1000
+
+
+AGG_COLS = ["ev_count", "ports_total", "population"]
+
+
+def _partial_sums(panel: pd.DataFrame, parent_codes, time_col: str) -> pd.DataFrame:
+    """Per (parent, time) key: sum and non-missing count of each AGG_COLS column."""
+    keys = geo_time_key(parent_codes, panel[time_col])
+    group, uniques = pd.factorize(keys, sort=True)
+    n = len(uniques)
+
+    out = {"key": uniques}
+    for col in AGG_COLS:
+        values = panel[col].to_numpy(dtype=float)
+        present = ~np.isnan(values)
+        out[col] = np.bincount(group[present], weights=values[present], minlength=n)
+        out[f"{col}_n"] = np.bincount(group[present], minlength=n)
+    return pd.DataFrame(out)
+
+
+def _finish_aggregate(sums: pd.DataFrame, gas: pd.Series, parent_col: str,
+                      time_col: str) -> pd.DataFrame:
+    """Parent panel from combined partial sums (all-missing stays NaN) and gas by time."""
+    keys = sums["key"].to_numpy(dtype=np.int64)
+    out = pd.DataFrame({
+        parent_col: keys // TIME_SPAN,
+        time_col: keys % TIME_SPAN,
+    })
+    for col in AGG_COLS:
+        out[col] = np.where(sums[f"{col}_n"].to_numpy() > 0, sums[col].to_numpy(dtype=float), np.nan)
+    out["gas_real_2023"] = out[time_col].map(gas).to_numpy(dtype=float)
+    return add_rates(out)
+
+
+def aggregate_panel(panel: pd.DataFrame, parent_codes, parent_col: str = "state_fips",
+                    time_col: str = "year") -> pd.DataFrame:
+    """
+    Sum a finer panel into parent geographies by `time_col`.
+
+    `parent_codes` is one integer parent code per panel row (e.g.
+    county_to_state(panel["county_fips"]) or a ZIP -> state crosswalk).
+    Counts and population are summed (all-missing stays NaN), gas is taken
+    per period, and the per-capita metrics are recomputed from the sums.
+    """
+    gas = panel.groupby(time_col, sort=True)["gas_real_2023"].first()
+    return _finish_aggregate(_partial_sums(panel, parent_codes, time_col), gas, parent_col, time_col)
+
+
+def build_aggregated_panel(ev, ports, pop, gas, code_col: str, parent_of,
+                           parent_col: str = "state_fips", chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                           time_col: str = "year") -> pd.DataFrame:
+    """
+    Build the `code_col` panel chunk by chunk and sum each chunk into parent
+    geographies (`parent_of` maps codes to parent codes, e.g. county_to_state).
+
+    Only the per-chunk partial sums are kept, so the finer panel is never
+    materialized; the result equals aggregate_panel on the whole panel.
+    """
+    partials = [
+        _partial_sums(chunk, parent_of(chunk[code_col]), time_col)
+        for chunk in iter_geo_panel(ev, ports, pop, gas, code_col, chunk_rows, time_col)
+    ]
+    if partials:
+        sums = pd.concat(partials, ignore_index=True).groupby("key", sort=True).sum().reset_index()
+    else:
+        sums = _partial_sums(ev.assign(**{c: np.nan for c in AGG_COLS}), parent_of(ev[code_col]), time_col)
+    gas_by_time = gas.groupby(time_col, sort=True)["gas_real_2023"].first()
+    return _finish_aggregate(sums, gas_by_time, parent_col, time_col)
@@ -0,0 +1,213 @@
+"""
+Incremental ingestion of new or changed data years.
+
+Compares the discovered yearly raw files (<year>_ports.csv,
+ev_registrations_<year>.csv) against the digests recorded on the last ingest,
+parses only the years that are new or changed, and upserts those year
+partitions into the cleaned tables and the panel. Other years are never
+reparsed.
+
+The gas price workbook and the two population vintages cover every year,
+so they are fingerprinted too. When one of them changes it is reingested in
+full, and the panel is rebuilt for all years.
+
+Usage (from the DSC190/ folder):
+    python -m src.cleaning.ingest_year               # detect new/changed years
+    python -m src.cleaning.ingest_year --year 2024   # force specific years
+"""
+import argparse
+import json
+
+import pandas as pd
+
+from src.config import (
+    PROCESSED_DIR,
+    PORT_FILES,
+    EV_REG_FILES,
+    PORTS_CLEAN_FILE,
+    STATION_COUNTS_CLEAN_FILE,
+    POP_CLEAN_FILE,
+    GAS_CLEAN_FILE,
+    EV_REG_CLEAN_FILE,
+    PANEL_FILE,
+    GAS_FILE,
+    DATA_YEARS,
+)
+from src.storage import read_table, write_table, stored_path
+from src.pipeline import file_digest, mark_current
+from src.instrument import stage
+from src.parsing.parse_ports import parse_station_counts, electric_outlets, drop_non_states
+from src.parsing.parse_ev_registrations import parse_ev_file
+from src.parsing.raw_loader import load_year_files
+from src.parsing.parse_gas_prices import load_gas_prices
+from src.cleaning.population_states import population_for_years, OLD_FILE as POP_OLD_FILE, NEW_FILE as POP_NEW_FILE
+from src.cleaning.build_panel import merge_panel
+
+MANIFEST_FILE = PROCESSED_DIR / ".ingest_manifest.json"
+
+SOURCES = {
+    "ports": PORT_FILES,
+    "ev_registrations": EV_REG_FILES,
+}
+
+# Sources that cover every year: a change means a full reingest
+WHOLE_SOURCES = {
+    "gas": [GAS_FILE],
+    "population": [POP_OLD_FILE, POP_NEW_FILE],
+}
+
+# Stages whose outputs an ingest brings up to date, and the sources each reads
+INGEST_STAGES = {
+    "parse_ports": ["ports"],
+    "parse_ev_registrations": ["ev_registrations"],
+    "parse_gas_prices": ["gas"],
+    "population_states": ["population"],
+    "build_panel": ["ports", "ev_registrations", "gas", "population"],
+}
+
+
+def load_manifest() -> dict:
+    if MANIFEST_FILE.exists():
+        with MANIFEST_FILE.open() as f:
+            return json.load(f)
+    return {}
+
+
+def save_manifest(manifest: dict) -> None:
+    with MANIFEST_FILE.open("w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def current_digests() -> dict:
+    digests = {
+        source: {str(year): file_digest(path) for year, path in files.items()}
+        for source, files in SOURCES.items()
+    }
+    for source, paths in WHOLE_SOURCES.items():
+        digests[source] = {path.name: file_digest(path) for path in paths}
+    return digests
+
+
+def changed_sources(manifest: dict, digests: dict) -> set[str]:
+    """Sources with any file that is new or changed since the last ingest."""
+    return {source for source, files in digests.items() if manifest.get(source, {}) != files}
+
+
+def changed_years(manifest: dict, digests: dict) -> list[int]:
+    """Years whose raw file is new or has different contents than last ingest."""
+    years = set()
+    for source, files in digests.items():
+        if source in WHOLE_SOURCES:
+            continue
+        seen = manifest.get(source, {})
+        for year, digest in files.items():
+            if seen.get(year) != digest:
+                years.add(int(year))
+    return sorted(years)
+
+
+def upsert_years(csv_path, new_rows: pd.DataFrame, years, sort_by) -> pd.DataFrame:
+    """Replace the rows for `years` in a cleaned table with `new_rows`."""
+    if stored_path(csv_path).exists():
+        existing = read_table(csv_path)
+        existing = existing[~existing["year"].isin(years)]
+        # Plain strings on both sides so the concat doesn't mix categories
+        for col in existing.select_dtypes("category").columns:
+            existing[col] = existing[col].astype(str)
+        combined = pd.concat([existing, new_rows], ignore_index=True)
+    else:
+        combined = new_rows
+    combined = combined.sort_values(sort_by, kind="stable")
+    return write_table(combined, csv_path)
+
+
+def ingest_years(years, full_sources=()) -> None:
+    """Upsert `years` of the yearly sources; reingest every year of `full_sources` (see WHOLE_SOURCES)."""
+    years = sorted(int(y) for y in years)
+    print(f"Ingesting years: {years}")
+    if full_sources:
+        print(f"Reingesting in full: {sorted(full_sources)}")
+
+    ports_years = [y for y in years if y in PORT_FILES]
+    ev_years = [y for y in years if y in EV_REG_FILES]
+
+    # Parse only the affected raw files
+    if ports_years:
+        counts = pd.concat(
+            load_year_files({y: PORT_FILES[y] for y in ports_years}, parse_station_counts).values(),
+            ignore_index=True,
+        )
+        upsert_years(STATION_COUNTS_CLEAN_FILE, counts, ports_years, sort_by="year")
+        ports = drop_non_states(electric_outlets(counts))
+        upsert_years(PORTS_CLEAN_FILE, ports, ports_years, sort_by="year")
+    if ev_years:
+        ev = pd.concat(
+            load_year_files({y: EV_REG_FILES[y] for y in ev_years}, parse_ev_file).values(),
+            ignore_index=True,
+        )
+        upsert_years(EV_REG_CLEAN_FILE, ev, ev_years, sort_by="year")
+
+    if "population" in full_sources:
+        write_table(population_for_years(DATA_YEARS), POP_CLEAN_FILE)
+    else:
+        upsert_years(POP_CLEAN_FILE, population_for_years(years), years, sort_by=["state_fips", "year"])
+    if "gas" in full_sources:
+        write_table(load_gas_prices(DATA_YEARS), GAS_CLEAN_FILE)
+    else:
+        upsert_years(GAS_CLEAN_FILE, load_gas_prices(years), years, sort_by="year")
+
+    # Rebuild only the panel partitions for these years (all years after a full reingest)
+    if full_sources:
+        years = sorted(set(years) | set(DATA_YEARS))
+
+    def year_slice(path):
+        df = read_table(path)
+        return df[df["year"].isin(years)]
+
+    panel_rows = merge_panel(
+        year_slice(EV_REG_CLEAN_FILE),
+        year_slice(PORTS_CLEAN_FILE),
+        year_slice(POP_CLEAN_FILE),
+        year_slice(GAS_CLEAN_FILE),
+    )
+    upsert_years(PANEL_FILE, panel_rows, years, sort_by="year")
+    print(f"Updated {len(panel_rows)} panel rows in {PANEL_FILE}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse and merge only new or changed data years.")
+    parser.add_argument("--year", type=int, nargs="+", help="years to (re)ingest")
+    args = parser.parse_args()
+
+    manifest = load_manifest()
+    digests = current_digests()
+    years = args.year or changed_years(manifest, digests)
+    full_sources = sorted(changed_sources(manifest, digests) & set(WHOLE_SOURCES))
+
+    if not years and not full_sources:
+        print("No new or changed source files; nothing to ingest.")
+        return
+
+    with stage("ingest_year", years=years):
+        ingest_years(years, full_sources)
+
+    # Record digests only for the years actually ingested
+    for source, files in digests.items():
+        if source in WHOLE_SOURCES:
+            continue
+        seen = manifest.setdefault(source, {})
+        for year in years:
+            if str(year) in files:
+                seen[str(year)] = files[str(year)]
+    for source in full_sources:
+        manifest[source] = digests[source]
+    save_manifest(manifest)
+
+    # A stage whose sources are all ingested matches a full rebuild, so the
+    # pipeline can skip it; stages reading a source with pending years rerun
+    stale = changed_sources(manifest, digests)
+    mark_current([name for name, sources in INGEST_STAGES.items() if not stale & set(sources)])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Quarterly / monthly state panel from dated snapshots.
+
+EV registration and AFDC station-count snapshots are parsed with the same
+parsers as the yearly files, collapsed to one value per state and period
+(latest snapshot in the period), and joined on integer (state_fips, period)
+keys with the geo panel builder. Annual population estimates are linearly
+interpolated to the middle of each period and annual gas prices are repeated
+across the periods of their year. Every step is array-at-a-time, so the
+12x larger monthly panel costs the same number of passes as the annual one.
+
+Snapshots live in SNAPSHOT_DIR as <YYYY>-<MM>_ports.csv and
+ev_registrations_<YYYY>-<MM>.csv (dated at the end of that month).
+
+Usage (from the DSC190/ folder):
+    python -m src.cleaning.period_panel --freq M
+"""
+import argparse
+import re
+
+import pandas as pd
+
+from src.config import SNAPSHOT_DIR, POP_CLEAN_FILE, GAS_CLEAN_FILE, PERIOD_PANEL_FILES
+from src.storage import read_table, write_table
+from src.geography import canonical_names
+from src.periods import (
+    ANNUAL,
+    MONTHLY,
+    snapshots_to_periods,
+    interpolate_annual,
+    expand_annual,
+)
+from src.parsing.raw_loader import load_year_files
+from src.parsing.parse_ports import parse_station_counts, electric_outlets, drop_non_states
+from src.parsing.parse_ev_registrations import parse_ev_file
+from src.cleaning.geo_panel import build_geo_panel
+
+PERIOD_PANEL_COLUMNS = [
+    "state", "state_fips", "period", "year", "ev_count", "ports_total", "population",
+    "gas_real_2023", "ev_per_1000", "ports_per_100k",
+]
+
+EV_SNAPSHOT_PATTERN = r"ev_registrations_(\d{4})-(\d{2})\.csv"
+PORTS_SNAPSHOT_PATTERN = r"(\d{4})-(\d{2})_ports\.csv"
+
+
+def discover_snapshot_files(pattern: str, folder=SNAPSHOT_DIR) -> dict:
+    """
+    Map snapshot date (month end) -> path for files matching `pattern`, a regex
+    with groups for the 4-digit year and 2-digit month.
+    """
+    if not folder.exists():
+        return {}
+    regex = re.compile(pattern)
+    found = {}
+    for path in folder.iterdir():
+        m = regex.fullmatch(path.name)
+        if m:
+            date = pd.Timestamp(int(m.group(1)), int(m.group(2)), 1) + pd.offsets.MonthEnd(0)
+            found[date] = path
+    return dict(sorted(found.items()))
+
+
+def parse_ports_snapshot(path, date):
+    ports = drop_non_states(electric_outlets(parse_station_counts(path, date.year)))
+    return ports.assign(date=date)
+
+
+def parse_ev_snapshot(path, date):
+    return parse_ev_file(path, date.year).assign(date=date)
+
+
+def build_period_panel(ev, ports, pop, gas, freq: str = MONTHLY) -> pd.DataFrame:
+    """
+    State x period panel.
+
+    `ev` (state_fips, date, ev_count) and `ports` (state_fips, date,
+    ports_total) are dated snapshots; `pop` (state_fips, year, population)
+    and `gas` (year, gas_real_2023) are annual.
+    """
+    ev_p = snapshots_to_periods(ev, "date", freq, ["state_fips"], ["ev_count"])
+    ports_p = snapshots_to_periods(ports, "date", freq, ["state_fips"], ["ports_total"])
+
+    # Population for exactly the (state, period) rows the panel needs
+    pop_p = ev_p[["state_fips", "period"]].copy()
+    pop_p["population"] = interpolate_annual(
+        pop, "state_fips", "population", pop_p["state_fips"], pop_p["period"], freq
+    )
+    gas_p = expand_annual(gas, ["gas_real_2023"], freq)
+
+    panel = build_geo_panel(ev_p, ports_p, pop_p, gas_p, code_col="state_fips", time_col="period")
+    panel["state"] = canonical_names(panel["state_fips"])
+    return panel[PERIOD_PANEL_COLUMNS]
+
+
+def main(freq: str = MONTHLY):
+    if freq == ANNUAL:
+        raise ValueError("The annual panel is built by src.cleaning.build_panel")
+
+    ev_files = discover_snapshot_files(EV_SNAPSHOT_PATTERN)
+    port_files = discover_snapshot_files(PORTS_SNAPSHOT_PATTERN)
+    if not ev_files or not port_files:
+        raise FileNotFoundError(
+            f"No registration/station snapshots found in {SNAPSHOT_DIR} "
+            "(expected ev_registrations_YYYY-MM.csv and YYYY-MM_ports.csv)"
+        )
+
+    ev = pd.concat(load_year_files(ev_files, parse_ev_snapshot).values(), ignore_index=True)
+    ports = pd.concat(load_year_files(port_files, parse_ports_snapshot).values(), ignore_index=True)
+
+    panel = build_period_panel(ev, ports, read_table(POP_CLEAN_FILE), read_table(GAS_CLEAN_FILE), freq)
+
+    out_path = PERIOD_PANEL_FILES[freq]
+    write_table(panel, out_path)
+    print(f"Saved {freq} panel ({len(panel)} rows) to {out_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a quarterly or monthly state panel.")
+    parser.add_argument("--freq", choices=["Q", "M"], default=MONTHLY)
+    main(parser.parse_args().freq)
@@ -1,36 +1,38 @@
 import pandas as pd
-from src.config import RAW_DIR, POP_CLEAN_FILE  
+from src.config import RAW_DIR, POP_CLEAN_FILE, DATA_YEARS
+from src.storage import write_table
+from src.geography import canonical_names
+from src.instrument import record
 
 # Raw files in Datasets/
 OLD_FILE = RAW_DIR / "nst-est2020-alldata.csv"      # 2010–2020
 NEW_FILE = RAW_DIR / "population_estimate.csv"      # 2020–2024
 
-def tidy_old():
-    df = pd.read_csv(OLD_FILE)
+
+def estimate_years(path):
+    """Years with a POPESTIMATE<year> column in a Census vintage file."""
+    header = pd.read_csv(path, nrows=0).columns
+    cols = header[header.str.fullmatch(r"POPESTIMATE\d{4}")]
+    return sorted(int(c[-4:]) for c in cols)
+
+
+def tidy_vintage(path, years):
+    """State-level population for `years` from one Census vintage, long format."""
+    years = sorted(years)
+    if not years:
+        return pd.DataFrame(columns=["STATE", "NAME", "population", "year"])
+
+    pop_cols = [f"POPESTIMATE{y}" for y in years]
+    df = pd.read_csv(path, usecols=["SUMLEV", "STATE", "NAME", *pop_cols])
+    record(rows_in=len(df))
 
     # state-level only
-    df = df[df["SUMLEV"] == 40].copy()
-
-    # keep FIPS + state name + 2016–2019
-    cols = [
-        "STATE",
-        "NAME",
-        "POPESTIMATE2016",
-        "POPESTIMATE2017",
-        "POPESTIMATE2018",
-        "POPESTIMATE2019",
-    ]
-    df = df[cols]
+    df = df[df["SUMLEV"] == 40].drop(columns="SUMLEV")
 
     # wide → long
     long = df.melt(
         id_vars=["STATE", "NAME"],
-        value_vars=[
-            "POPESTIMATE2016",
-            "POPESTIMATE2017",
-            "POPESTIMATE2018",
-            "POPESTIMATE2019",
-        ],
+        value_vars=pop_cols,
         var_name="estimate",
         value_name="population",
     )
@@ -40,52 +42,47 @@ def tidy_old():
     return long
 
 
-def tidy_new():
-    df = pd.read_csv(NEW_FILE)
+def split_vintages(years):
+    """Use the newer vintage wherever it has the year, the older one otherwise."""
+    in_new, in_old = set(estimate_years(NEW_FILE)), set(estimate_years(OLD_FILE))
+    new_years = [y for y in years if y in in_new]
+    old_years = [y for y in years if y not in in_new and y in in_old]
+    return old_years, new_years
 
-    # state-level only
-    df = df[df["SUMLEV"] == 40].copy()
-
-    cols = [
-        "STATE",
-        "NAME",
-        "POPESTIMATE2020",
-        "POPESTIMATE2021",
-        "POPESTIMATE2022",
-        "POPESTIMATE2023",
-    ]
-    df = df[cols]
 
-    long = df.melt(
-        id_vars=["STATE", "NAME"],
-        value_vars=[
-            "POPESTIMATE2020",
-            "POPESTIMATE2021",
-            "POPESTIMATE2022",
-            "POPESTIMATE2023",
-        ],
-        var_name="estimate",
-        value_name="population",
-    )
+def tidy_old(years=None):
+    old_years, _ = split_vintages(DATA_YEARS if years is None else years)
+    return tidy_vintage(OLD_FILE, old_years)
 
-    long["year"] = long["estimate"].str[-4:].astype(int)
-    long = long.drop(columns="estimate")
-    return long
 
+def tidy_new(years=None):
+    _, new_years = split_vintages(DATA_YEARS if years is None else years)
+    return tidy_vintage(NEW_FILE, new_years)
 
-def build_population_states():
-    old_long = tidy_old()
-    new_long = tidy_new()
 
-    combined = (
+def population_for_years(years):
+    """Tidy state population rows (state_fips, state, population, year) for `years`."""
+    old_long = tidy_old(years)
+    new_long = tidy_new(years)
+
+    pop = (
         pd.concat([old_long, new_long], ignore_index=True)
-        .query("2016 <= year <= 2023")
         .rename(columns={"NAME": "state", "STATE": "state_fips"})
         .sort_values(["state_fips", "year"])
     )
+    # STATE is already the FIPS code; use the index's spelling of the name
+    names = canonical_names(pop["state_fips"])
+    unknown = sorted(set(pop.loc[pd.isna(names), "state_fips"]))
+    if unknown:
+        raise ValueError(f"Population rows with FIPS codes missing from the geography index: {unknown}")
+    pop["state"] = names
+    return pop
+
+
+def build_population_states():
+    combined = population_for_years(DATA_YEARS)
 
-    POP_CLEAN_FILE.parent.mkdir(parents=True, exist_ok=True)
-    combined.to_csv(POP_CLEAN_FILE, index=False)
+    write_table(combined, POP_CLEAN_FILE)
     print(f"Saved {POP_CLEAN_FILE}")
 
 
@@ -1,3 +1,4 @@
+import re
 from pathlib import Path
 
 # Project root is the folder containing this src/ directory
@@ -13,21 +14,34 @@ CLEANED_DIR = PROCESSED_DIR / "cleaned table"
 FIGURES_DIR = PROCESSED_DIR / "figures"
 FORECAST_DIR = PROCESSED_DIR / "forecast output"
 TEXT_SUMMARIES_DIR = PROCESSED_DIR / "text summaries"
+CAUSAL_DIR = PROCESSED_DIR / "causal output"  # Granger tests, collinearity diagnostics
+ATLAS_DIR = FIGURES_DIR / "atlas"  # one PNG per state, see src/visualization/atlas.py
 
-for d in (CLEANED_DIR, FIGURES_DIR, FORECAST_DIR, TEXT_SUMMARIES_DIR):
+for d in (CLEANED_DIR, FIGURES_DIR, FORECAST_DIR, TEXT_SUMMARIES_DIR, CAUSAL_DIR):
     d.mkdir(parents=True, exist_ok=True)
 
-# Central place for raw file names
-PORT_FILES = {
-    2016: RAW_DIR / "2016_ports.csv",
-    2017: RAW_DIR / "2017_ports.csv",
-    2018: RAW_DIR / "2018_ports.csv",
-    2019: RAW_DIR / "2019_ports.csv",
-    2020: RAW_DIR / "2020_ports.csv",
-    2021: RAW_DIR / "2021_ports.csv",
-    2022: RAW_DIR / "2022_ports.csv",
-    2023: RAW_DIR / "2023_ports.csv",
-}
+
+def discover_year_files(pattern: str, folder: Path = RAW_DIR) -> dict:
+    """
+    Map year -> path for files in `folder` whose name matches `pattern`
+    (a regex with one group capturing the 4-digit year), sorted by year.
+    """
+    regex = re.compile(pattern)
+    found = {}
+    for path in folder.iterdir():
+        m = regex.fullmatch(path.name)
+        if m:
+            found[int(m.group(1))] = path
+    return dict(sorted(found.items()))
+
+
+# Central place for raw file names (yearly files are discovered, so adding
+# e.g. 2024_ports.csv / ev_registrations_2024.csv needs no code change)
+PORT_FILES = discover_year_files(r"(\d{4})_ports\.csv")
+EV_REG_FILES = discover_year_files(r"ev_registrations_(\d{4})\.csv")
+
+# Years covered by the panel
+DATA_YEARS = sorted(set(PORT_FILES) | set(EV_REG_FILES))
 
 POP_FILE = RAW_DIR / "population_estimate.csv"
 GAS_FILE = RAW_DIR / "10641_gasoline_prices_by_year_1-26-24.xlsx"
@@ -35,7 +49,61 @@ EV_REG_FILE = RAW_DIR / "ev_registrations.csv"
 
 # Output files 
 PORTS_CLEAN_FILE = CLEANED_DIR / "ports_clean.csv"
+STATION_COUNTS_CLEAN_FILE = CLEANED_DIR / "station_counts_clean.csv"
 POP_CLEAN_FILE = CLEANED_DIR / "population_states.csv"
 GAS_CLEAN_FILE = CLEANED_DIR / "gas_prices_clean.csv"
 EV_REG_CLEAN_FILE = CLEANED_DIR / "ev_registrations_clean.csv"
 PANEL_FILE = CLEANED_DIR / "panel.csv"
+
+# Panels by frequency (see src/periods.py); the quarterly/monthly ones are built
+# by src/cleaning/period_panel.py from dated snapshots in SNAPSHOT_DIR
+PERIOD_PANEL_FILES = {
+    "A": PANEL_FILE,
+    "Q": CLEANED_DIR / "panel_quarterly.csv",
+    "M": CLEANED_DIR / "panel_monthly.csv",
+}
+SNAPSHOT_DIR = RAW_DIR / "snapshots"
+
+# Scenario x state x year forecast cube (.npy + .json axis labels)
+SCENARIO_CUBE_FILE = FORECAST_DIR / "scenario_cube.npy"
+
+# Downloaded web pages (body + ETag/Last-Modified) for offline replay, see
+# src/datadownload/fetch.py. AFDC_BASE_URL can point at a local mirror.
+HTTP_CACHE_DIR = PROJECT_ROOT / "data" / "http_cache"
+AFDC_BASE_URL = "https://afdc.energy.gov"
+
+# Normalized per-file parse results, keyed by path/size/mtime (see src/parsing/raw_loader.py)
+PARSE_CACHE_DIR = PROCESSED_DIR / ".parse_cache"
+
+# Vehicle-level registration extracts (one row per vehicle) are aggregated in
+# chunks by src/parsing/parse_ev_records.py; a fuel value counts as an EV when
+# it matches one of EV_FUEL_TYPES (case-insensitive). Progress checkpoints for
+# resuming an interrupted run live in STREAM_CHECKPOINT_DIR.
+EV_FUEL_TYPES = [
+    "Electric",
+    "Electric (EV)",
+    "EV",
+    "BEV",
+    "Battery Electric",
+    "Battery Electric Vehicle (BEV)",
+]
+STREAM_CHECKPOINT_DIR = PROCESSED_DIR / ".stream_checkpoints"
+
+# CSV engine for the raw yearly files: "pyarrow" (multithreaded, needs pyarrow),
+# "c" (pandas default), or "auto" to use pyarrow when it is installed
+RAW_CSV_ENGINE = "auto"
+
+# Fitted FE models keyed by formula, covariance options and a data fingerprint,
+# evicted least-recently-used beyond MODEL_CACHE_MAX_MB (see src/analysis/model_cache.py)
+MODEL_CACHE_DIR = PROCESSED_DIR / ".model_cache"
+MODEL_CACHE_MAX_MB = 512
+USE_MODEL_CACHE = True
+
+# Per-stage wall/CPU time, peak RSS, row counts and cache hits (one JSON line per
+# stage, see src/instrument.py); cProfile/tracemalloc output goes to PROFILE_DIR
+RUN_LOG_FILE = PROCESSED_DIR / "run_log.jsonl"
+PROFILE_DIR = PROCESSED_DIR / "profiles"
+
+# Cleaned tables are stored as Parquet next to these CSV paths (see src/storage.py);
+# the CSV copies are kept for the report.
+WRITE_CSV_EXPORTS = True
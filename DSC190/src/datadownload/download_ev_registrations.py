@@ -1,7 +1,24 @@
+"""
+Download the AFDC vehicle registration tables and save one CSV per year.
+
+Pages are fetched concurrently through the response cache in
+src/datadownload/fetch.py, so reruns only revalidate (ETag/Last-Modified)
+and `--offline` rebuilds every CSV from the cached HTML without any request.
+
+Usage (from the DSC190/ folder):
+    python -m src.datadownload.download_ev_registrations
+    python -m src.datadownload.download_ev_registrations --offline
+    python -m src.datadownload.download_ev_registrations --years 2022 2023 \\
+        --base-url http://localhost:8000
+"""
+import argparse
+from io import StringIO
+
 import pandas as pd
-from src.config import RAW_DIR  # RAW_DIR = PROJECT_ROOT / "Datasets" in your config
+from src.config import RAW_DIR, AFDC_BASE_URL  # RAW_DIR = PROJECT_ROOT / "Datasets" in your config
+from src.datadownload.fetch import fetch_all, fetch_all_async, DEFAULT_CONCURRENCY
 
-YEARS = [2016, 2017, 2018, 2019]
+YEARS = [2016, 2017, 2018, 2019, 2020, 2021, 2022, 2023]
 
 EXPECTED_COLS = [
     "State",
@@ -20,36 +37,80 @@ EXPECTED_COLS = [
 ]
 
 
-def main():
-    print(f"Saving CSVs to: {RAW_DIR}\n")
+def registration_url(year, base_url=AFDC_BASE_URL):
+    return f"{base_url.rstrip('/')}/vehicle-registration?year={year}"
+
+
+def extract_table(html, year):
+    """Registration table from a page, with columns checked and ordered as EXPECTED_COLS."""
+    # read all HTML tables on the page
+    tables = pd.read_html(StringIO(html))
+
+    # pick the one that has the EV column
+    table = None
+    for t in tables:
+        if "Electric (EV)" in t.columns:
+            table = t
+            break
 
-    for year in YEARS:
-        url = f"https://afdc.energy.gov/vehicle-registration?year={year}"
-        print(f"Downloading {year} from {url} ...")
+    if table is None:
+        raise ValueError(f"Could not find registration table for {year}")
 
-        # read all HTML tables on the page
-        tables = pd.read_html(url)
+    # reorder & check columns
+    missing = [c for c in EXPECTED_COLS if c not in table.columns]
+    if missing:
+        raise ValueError(f"{year}: missing columns {missing}")
 
-        # pick the one that has the EV column
-        table = None
-        for t in tables:
-            if "Electric (EV)" in t.columns:
-                table = t
-                break
+    return table[EXPECTED_COLS]
 
-        if table is None:
-            raise ValueError(f"Could not find registration table for {year}")
 
-        # reorder & check columns
-        missing = [c for c in EXPECTED_COLS if c not in table.columns]
-        if missing:
-            raise ValueError(f"{year}: missing columns {missing}")
+def load_registration_tables(years=YEARS, offline=False, base_url=AFDC_BASE_URL,
+                             concurrency=DEFAULT_CONCURRENCY):
+    """
+    year -> registration table. With offline=True everything comes from the
+    local cache (no network), e.g. for notebooks after a kernel restart.
+    Works inside Jupyter's running event loop too (see `fetch_all`).
+    """
+    urls = {year: registration_url(year, base_url) for year in years}
+    pages = fetch_all(urls.values(), concurrency=concurrency, offline=offline)
+    return _tables_from_pages(urls, pages)
 
-        table = table[EXPECTED_COLS]
 
+async def load_registration_tables_async(years=YEARS, offline=False, base_url=AFDC_BASE_URL,
+                                         concurrency=DEFAULT_CONCURRENCY):
+    """`load_registration_tables` for async callers: `await` it in a notebook cell."""
+    urls = {year: registration_url(year, base_url) for year in years}
+    pages = await fetch_all_async(list(urls.values()), concurrency=concurrency, offline=offline)
+    return _tables_from_pages(urls, pages)
+
+
+def _tables_from_pages(urls: dict, pages: dict) -> dict:
+    tables = {}
+    for year, url in urls.items():
+        body, how = pages[url]
+        print(f"{year}: {how} ({url})")
+        tables[year] = extract_table(body.decode("utf-8", errors="replace"), year)
+    return tables
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download AFDC registration tables by year.")
+    parser.add_argument("--years", type=int, nargs="+", default=YEARS)
+    parser.add_argument("--offline", action="store_true",
+                        help="replay cached pages only, no network requests")
+    parser.add_argument("--base-url", default=AFDC_BASE_URL)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    args = parser.parse_args()
+
+    print(f"Saving CSVs to: {RAW_DIR}\n")
+    tables = load_registration_tables(
+        args.years, offline=args.offline, base_url=args.base_url, concurrency=args.concurrency
+    )
+
+    for year, table in tables.items():
         out_path = RAW_DIR / f"ev_registrations_{year}.csv"
         table.to_csv(out_path, index=False)
-        print(f"Saved {out_path}\n")
+        print(f"Saved {out_path}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,154 @@
+"""
+Async cached HTTP fetcher.
+
+Every response body is kept under HTTP_CACHE_DIR together with its ETag and
+Last-Modified headers. Later fetches revalidate with If-None-Match /
+If-Modified-Since, so an unchanged page costs a 304 instead of a download.
+Requests run on worker threads (stdlib urllib through asyncio.to_thread)
+with bounded concurrency and retries with exponential backoff.
+
+In offline mode nothing touches the network: bodies are replayed from the
+cache and a missing entry is an error.
+"""
+import asyncio
+import hashlib
+import json
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from src.config import HTTP_CACHE_DIR
+from src.instrument import record
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RETRIES = 3
+DEFAULT_TIMEOUT = 30.0
+BACKOFF_SECONDS = 1.0
+
+# Status codes worth retrying; anything else is returned/raised as is
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+USER_AGENT = "dsc190-ev-charging/1.0"
+
+
+class OfflineCacheMiss(Exception):
+    pass
+
+
+def cache_paths(url: str, cache_dir: Path = HTTP_CACHE_DIR):
+    """(body, metadata) paths of the cache entry for `url`."""
+    key = hashlib.sha256(url.encode()).hexdigest()[:32]
+    return cache_dir / f"{key}.body", cache_dir / f"{key}.json"
+
+
+def read_cached(url: str, cache_dir: Path = HTTP_CACHE_DIR):
+    """(body, meta) for a cached url, or (None, None) when it was never fetched."""
+    body_path, meta_path = cache_paths(url, cache_dir)
+    if not (body_path.exists() and meta_path.exists()):
+        return None, None
+    with meta_path.open() as f:
+        meta = json.load(f)
+    return body_path.read_bytes(), meta
+
+
+def write_cached(url: str, body: bytes, headers, cache_dir: Path = HTTP_CACHE_DIR) -> dict:
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    body_path, meta_path = cache_paths(url, cache_dir)
+    meta = {
+        "url": url,
+        "etag": headers.get("ETag"),
+        "last_modified": headers.get("Last-Modified"),
+        "fetched_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "bytes": len(body),
+    }
+    body_path.write_bytes(body)
+    with meta_path.open("w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def _request(url: str, meta: dict, timeout: float):
+    """One conditional GET. Returns (status, body, headers)."""
+    headers = {"User-Agent": USER_AGENT}
+    if meta:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    req = urllib.request.Request(url, headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, resp.read(), resp.headers
+    except urllib.error.HTTPError as exc:
+        # urllib raises for 304 too; it is a normal answer to a conditional GET
+        return exc.code, b"", exc.headers
+
+
+async def fetch(
+    url: str,
+    semaphore: asyncio.Semaphore,
+    offline: bool = False,
+    retries: int = DEFAULT_RETRIES,
+    timeout: float = DEFAULT_TIMEOUT,
+    cache_dir: Path = HTTP_CACHE_DIR,
+) -> tuple[bytes, str]:
+    """
+    Body of `url` plus how it was obtained: 'downloaded', 'not modified'
+    (revalidated cache) or 'offline' (replayed without a request).
+    """
+    body, meta = read_cached(url, cache_dir)
+    if offline:
+        if body is None:
+            raise OfflineCacheMiss(f"{url} is not in the cache ({cache_dir})")
+        return body, "offline"
+
+    async with semaphore:
+        for attempt in range(retries + 1):
+            try:
+                status, new_body, headers = await asyncio.to_thread(_request, url, meta, timeout)
+            except (urllib.error.URLError, TimeoutError, ConnectionError) as exc:
+                if attempt == retries:
+                    raise
+                error = exc
+            else:
+                if status == 304 and body is not None:
+                    return body, "not modified"
+                if 200 <= status < 300:
+                    write_cached(url, new_body, headers, cache_dir)
+                    return new_body, "downloaded"
+                if status not in RETRY_STATUS or attempt == retries:
+                    raise RuntimeError(f"{url}: HTTP {status}")
+                error = f"HTTP {status}"
+            delay = BACKOFF_SECONDS * 2 ** attempt
+            print(f"Retrying {url} in {delay:.0f}s ({error})")
+            await asyncio.sleep(delay)
+
+
+async def fetch_all_async(urls, concurrency=DEFAULT_CONCURRENCY, **kwargs) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    results = await asyncio.gather(*(fetch(u, semaphore, **kwargs) for u in urls))
+    return dict(zip(urls, results))
+
+
+def fetch_all(urls, concurrency: int = DEFAULT_CONCURRENCY, offline: bool = False, **kwargs) -> dict:
+    """
+    Fetch `urls` concurrently. Returns url -> (body, how) as in `fetch`.
+
+    Inside a running event loop (e.g. Jupyter) asyncio.run is not allowed,
+    so the fetch gets its own loop on a worker thread. Async callers can
+    await `fetch_all_async` directly.
+    """
+    coro = fetch_all_async(list(urls), concurrency=concurrency, offline=offline, **kwargs)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pages = asyncio.run(coro)
+    else:
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pages = pool.submit(asyncio.run, coro).result()
+    hits = sum(how != "downloaded" for _, how in pages.values())
+    record(cache_hits=hits, cache_misses=len(pages) - hits)
+    return pages
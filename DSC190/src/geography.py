@@ -0,0 +1,155 @@
+"""
+Canonical geography index: integer FIPS codes for every state-level name.
+
+Sources spell places differently ("District of Columbia", "Washington, D.C.",
+"DC", "U.S. Total", ...). Every parser maps its names to a FIPS code here,
+once, so the cleaned tables carry an integer `state_fips` and all joins run
+on it instead of on free text. Names that match nothing are reported (and
+dropped) at parse time rather than surfacing later as NaN rows.
+
+The nation uses code 0, as in the Census files.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+# (fips, usps, canonical name, kind)
+GEOGRAPHIES = [
+    (0, "US", "United States", "nation"),
+    (1, "AL", "Alabama", "state"),
+    (2, "AK", "Alaska", "state"),
+    (4, "AZ", "Arizona", "state"),
+    (5, "AR", "Arkansas", "state"),
+    (6, "CA", "California", "state"),
+    (8, "CO", "Colorado", "state"),
+    (9, "CT", "Connecticut", "state"),
+    (10, "DE", "Delaware", "state"),
+    (11, "DC", "District of Columbia", "district"),
+    (12, "FL", "Florida", "state"),
+    (13, "GA", "Georgia", "state"),
+    (15, "HI", "Hawaii", "state"),
+    (16, "ID", "Idaho", "state"),
+    (17, "IL", "Illinois", "state"),
+    (18, "IN", "Indiana", "state"),
+    (19, "IA", "Iowa", "state"),
+    (20, "KS", "Kansas", "state"),
+    (21, "KY", "Kentucky", "state"),
+    (22, "LA", "Louisiana", "state"),
+    (23, "ME", "Maine", "state"),
+    (24, "MD", "Maryland", "state"),
+    (25, "MA", "Massachusetts", "state"),
+    (26, "MI", "Michigan", "state"),
+    (27, "MN", "Minnesota", "state"),
+    (28, "MS", "Mississippi", "state"),
+    (29, "MO", "Missouri", "state"),
+    (30, "MT", "Montana", "state"),
+    (31, "NE", "Nebraska", "state"),
+    (32, "NV", "Nevada", "state"),
+    (33, "NH", "New Hampshire", "state"),
+    (34, "NJ", "New Jersey", "state"),
+    (35, "NM", "New Mexico", "state"),
+    (36, "NY", "New York", "state"),
+    (37, "NC", "North Carolina", "state"),
+    (38, "ND", "North Dakota", "state"),
+    (39, "OH", "Ohio", "state"),
+    (40, "OK", "Oklahoma", "state"),
+    (41, "OR", "Oregon", "state"),
+    (42, "PA", "Pennsylvania", "state"),
+    (44, "RI", "Rhode Island", "state"),
+    (45, "SC", "South Carolina", "state"),
+    (46, "SD", "South Dakota", "state"),
+    (47, "TN", "Tennessee", "state"),
+    (48, "TX", "Texas", "state"),
+    (49, "UT", "Utah", "state"),
+    (50, "VT", "Vermont", "state"),
+    (51, "VA", "Virginia", "state"),
+    (53, "WA", "Washington", "state"),
+    (54, "WV", "West Virginia", "state"),
+    (55, "WI", "Wisconsin", "state"),
+    (56, "WY", "Wyoming", "state"),
+    (60, "AS", "American Samoa", "territory"),
+    (66, "GU", "Guam", "territory"),
+    (69, "MP", "Northern Mariana Islands", "territory"),
+    (72, "PR", "Puerto Rico", "territory"),
+    (78, "VI", "U.S. Virgin Islands", "territory"),
+]
+
+# Spellings seen in (or likely from) AFDC, Census and EIA tables
+NAME_VARIANTS = {
+    "U.S.": 0,
+    "USA": 0,
+    "U.S. Total": 0,
+    "US Total": 0,
+    "Total": 0,
+    "Washington DC": 11,
+    "Washington, D.C.": 11,
+    "D.C.": 11,
+    "Dist. of Columbia": 11,
+    "Virgin Islands": 78,
+    "US Virgin Islands": 78,
+    "Commonwealth of the Northern Mariana Islands": 69,
+}
+
+GEO_INDEX = pd.DataFrame(GEOGRAPHIES, columns=["state_fips", "usps", "state", "kind"]).set_index("state_fips")
+
+
+def canonical_names(fips) -> np.ndarray:
+    return GEO_INDEX["state"].reindex(np.asarray(fips)).to_numpy()
+
+
+def geo_kind(fips) -> np.ndarray:
+    """'state' / 'district' / 'territory' / 'nation' per FIPS code."""
+    return GEO_INDEX["kind"].reindex(np.asarray(fips)).to_numpy()
+
+
+def normalize_name(name) -> str:
+    """Case/punctuation/whitespace-insensitive form of a place name."""
+    return re.sub(r"[^a-z0-9]+", " ", str(name).lower()).strip()
+
+
+def _build_lookup() -> dict:
+    lookup = {}
+    for fips, usps, name, _ in GEOGRAPHIES:
+        lookup[normalize_name(name)] = fips
+        lookup[normalize_name(usps)] = fips
+    for variant, fips in NAME_VARIANTS.items():
+        lookup[normalize_name(variant)] = fips
+    return lookup
+
+
+NAME_TO_FIPS = _build_lookup()
+
+
+def lookup_fips(names) -> pd.Series:
+    """
+    FIPS code per name (nullable Int16; <NA> when unmatched). Each distinct
+    name is normalized and looked up once.
+    """
+    names = pd.Series(names)
+    codes, uniques = pd.factorize(names)
+    mapped = np.array(
+        [NAME_TO_FIPS.get(normalize_name(u), -1) for u in uniques] + [-1], dtype=np.int64
+    )
+    # factorize marks missing names with -1, which indexes the trailing -1
+    fips = mapped[codes]
+    return pd.Series(fips, index=names.index).where(fips >= 0).astype("Int16")
+
+
+def attach_fips(df: pd.DataFrame, source: str, name_col: str = "state") -> pd.DataFrame:
+    """
+    Add `state_fips` and replace `name_col` with the canonical name.
+
+    Rows whose name matches nothing are dropped and listed, so a spelling
+    mismatch shows up here instead of as NaNs after a join.
+    """
+    fips = lookup_fips(df[name_col])
+    unmatched = fips.isna()
+    if unmatched.any():
+        names = sorted({str(n) for n in df.loc[unmatched, name_col]})
+        print(f"{source}: dropped {int(unmatched.sum())} rows with unmatched geography names: {names}")
+
+    out = df[~unmatched].copy()
+    out["state_fips"] = fips[~unmatched].astype("int16")
+    out[name_col] = canonical_names(out["state_fips"])
+    return out
@@ -0,0 +1,255 @@
+"""
+Per-stage timing, memory and row-count instrumentation.
+
+`stage(name)` wraps a unit of work (the pipeline wraps every stage in it)
+and appends one JSON line to RUN_LOG_FILE with:
+
+- wall time and CPU time (own and of joined worker processes);
+- peak RSS during the stage (the process high-water mark where the OS
+  cannot reset it);
+- rows read and written, and cache hits and misses;
+- the status and any error.
+
+Library code reports its counts with `record(...)`: read_table/write_table
+count rows in and out, and the raw-file and HTTP caches count hits and
+misses. Outside a stage `record` does nothing, so modules run on their own
+exactly as before.
+
+With profile=True the stage runs under cProfile: the stats are dumped to
+PROFILE_DIR and the top functions are printed. trace_memory=True records
+the top allocating lines with tracemalloc. From the pipeline:
+
+    python -m src.pipeline --profile build_panel --trace-memory forecast_ev_panel
+
+`python -m src.instrument` summarizes the latest logged run.
+"""
+import argparse
+import cProfile
+import datetime
+import io
+import json
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from src.config import RUN_LOG_FILE, PROFILE_DIR
+
+# One id per process, shared by every stage it runs (override to group several processes)
+RUN_ID = os.environ.get("DSC190_RUN_ID") or (
+    f"{datetime.datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}"
+)
+
+PROFILE_TOP_N = 25
+
+_stack = []
+_lock = threading.Lock()
+
+
+@dataclass
+class StageRecord:
+    stage: str
+    rows_in: int = 0
+    rows_out: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    counters: dict = field(default_factory=dict)
+    entry: dict = None  # the logged line, set when the stage ends
+
+
+def record(rows_in: int = 0, rows_out: int = 0, cache_hits: int = 0, cache_misses: int = 0,
+           **counters) -> None:
+    """Add counts to the innermost running stage (no-op outside a stage)."""
+    with _lock:
+        if not _stack:
+            return
+        rec = _stack[-1]
+        rec.rows_in += int(rows_in)
+        rec.rows_out += int(rows_out)
+        rec.cache_hits += int(cache_hits)
+        rec.cache_misses += int(cache_misses)
+        for key, n in counters.items():
+            rec.counters[key] = rec.counters.get(key, 0) + n
+
+
+# =========================================================================================================
+# Peak RSS
+# =========================================================================================================
+def reset_peak_rss() -> bool:
+    """Reset the process high-water mark (Linux only). True if it was reset."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> float:
+    """VmHWM from /proc when available, else ru_maxrss (KiB on Linux, bytes on macOS)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 2**20 if sys.platform == "darwin" else maxrss / 1024
+
+
+# =========================================================================================================
+# Stage context
+# =========================================================================================================
+def append_log(entry: dict, path=RUN_LOG_FILE) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _lock, path.open("a") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def _save_profile(profiler: cProfile.Profile, name: str) -> str:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    out_path = PROFILE_DIR / f"{name}-{RUN_ID}.prof"
+    profiler.dump_stats(out_path)
+
+    buf = io.StringIO()
+    pstats.Stats(profiler, stream=buf).sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+    print(buf.getvalue())
+    print(f"Saved profile to {out_path} (open with: python -m pstats {out_path})")
+    return str(out_path)
+
+
+def _save_memory_trace(snapshot: tracemalloc.Snapshot, name: str) -> str:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    out_path = PROFILE_DIR / f"{name}-{RUN_ID}-memory.txt"
+    top = snapshot.statistics("lineno")[:PROFILE_TOP_N]
+    with out_path.open("w") as f:
+        for stat in top:
+            f.write(f"{stat}\n")
+    print(f"Saved top {len(top)} allocation sites to {out_path}")
+    return str(out_path)
+
+
+@contextmanager
+def stage(name: str, profile: bool = False, trace_memory: bool = False, log_file=RUN_LOG_FILE,
+          **fields):
+    """
+    Measure the enclosed block as stage `name` and log it. Extra keyword
+    `fields` (e.g. module=...) are copied into the log entry.
+    """
+    rec = StageRecord(name)
+    with _lock:
+        _stack.append(rec)
+    peak_scope = "stage" if reset_peak_rss() else "process"
+
+    if trace_memory:
+        tracemalloc.start()
+    profiler = cProfile.Profile() if profile else None
+
+    started = datetime.datetime.now()
+    t0 = os.times()
+    wall0 = time.perf_counter()
+    status, error = "ok", None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield rec
+    except BaseException as exc:
+        status, error = "error", f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        wall = time.perf_counter() - wall0
+        t1 = os.times()
+        with _lock:
+            _stack.remove(rec)
+
+        entry = {
+            "run_id": RUN_ID,
+            "stage": name,
+            **fields,
+            "started": started.isoformat(timespec="seconds"),
+            "status": status,
+            "error": error,
+            "wall_s": round(wall, 4),
+            "cpu_s": round((t1.user - t0.user) + (t1.system - t0.system), 4),
+            "child_cpu_s": round(
+                (t1.children_user - t0.children_user) + (t1.children_system - t0.children_system), 4
+            ),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "peak_rss_scope": peak_scope,
+            "rows_in": rec.rows_in,
+            "rows_out": rec.rows_out,
+            "cache_hits": rec.cache_hits,
+            "cache_misses": rec.cache_misses,
+            **rec.counters,
+        }
+        if trace_memory:
+            entry["traced_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+            entry["memory_trace"] = _save_memory_trace(tracemalloc.take_snapshot(), name)
+            tracemalloc.stop()
+        if profiler is not None:
+            entry["profile"] = _save_profile(profiler, name)
+        rec.entry = entry
+        append_log(entry, log_file)
+
+
+def format_entry(entry: dict) -> str:
+    """One-line summary of a logged stage."""
+    if entry["status"] == "skipped":
+        return f"{entry['stage']:<24} skipped"
+    cpu = entry["cpu_s"] + entry.get("child_cpu_s", 0.0)
+    line = (
+        f"{entry['stage']:<24} {entry['status']:<6} {entry['wall_s']:8.2f}s wall "
+        f"{cpu:8.2f}s cpu {entry['peak_rss_mb']:8.0f} MB peak  "
+        f"rows {entry['rows_in']:,} in / {entry['rows_out']:,} out"
+    )
+    if entry["cache_hits"] or entry["cache_misses"]:
+        line += f"  cache {entry['cache_hits']}/{entry['cache_hits'] + entry['cache_misses']} hits"
+    return line
+
+
+# =========================================================================================================
+# Run log summary
+# =========================================================================================================
+def load_log(path=RUN_LOG_FILE) -> list[dict]:
+    if not path.exists():
+        return []
+    with path.open() as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a run from the stage log.")
+    parser.add_argument("--run-id", help="run to show (default: the latest)")
+    args = parser.parse_args()
+
+    entries = load_log()
+    if not entries:
+        print(f"No runs logged in {RUN_LOG_FILE}")
+        return
+    run_id = args.run_id or entries[-1]["run_id"]
+    run = [e for e in entries if e["run_id"] == run_id]
+    if not run:
+        print(f"No stages logged for run {run_id}")
+        return
+
+    print(f"Run {run_id} ({len(run)} stages)")
+    for entry in run:
+        print("  " + format_entry(entry))
+    ran = [e for e in run if e["status"] != "skipped"]
+    total = sum(e["wall_s"] for e in ran)
+    print(f"Total wall time: {total:.2f}s")
+    if ran:
+        slowest = max(ran, key=lambda e: e["wall_s"])
+        print(f"Slowest stage: {slowest['stage']} ({slowest['wall_s']:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Lags, leads and differences on an integer-keyed panel.
+
+Every row gets one int64 key, unit * stride + time. The time axis is padded
+by the largest offset, so a shifted key never lands in a neighbouring
+unit's range. A dense key -> row table then resolves every lag, lead and
+column with plain array indexing: no sort, no groupby and no hashing. The
+table holds one int64 per possible key, so sparse unit codes (e.g. FIPS) are
+compacted with pd.factorize first when their range is much larger than the
+panel.
+
+Unlike groupby().shift(), a lag is matched on time and not on row position,
+so a gap in a unit's series gives a missing lag instead of a stale one.
+Periods follow src/periods.py (consecutive keys differ by 1), so the same
+code lags annual, quarterly and monthly panels, in any row order.
+"""
+import numpy as np
+import pandas as pd
+
+
+def panel_keys(units, times, pad: int = 0) -> tuple[np.ndarray, int]:
+    """
+    One int64 key per row and the size of the key space; `pad` leaves room
+    for shifts up to +-pad periods.
+    """
+    units = np.asarray(units)
+    times = np.asarray(times, dtype=np.int64)
+    n = len(times)
+    t0 = times.min()
+    stride = int(times.max() - t0) + 1 + 2 * pad
+
+    if units.dtype.kind in "iu" and (int(units.max()) - int(units.min()) + 1) * stride <= 4 * n + 1024:
+        codes = units.astype(np.int64) - int(units.min())
+    else:
+        codes = pd.factorize(units, sort=True)[0].astype(np.int64)
+    return codes * stride + (times - t0 + pad), int(codes.max() + 1) * stride
+
+
+def shift_rows(units, times, offsets) -> np.ndarray:
+    """
+    Row index of (unit, time - offset) for every row and offset, -1 where
+    that period is not in the panel. Positive offsets are lags, negative
+    ones leads. Returns an (n, len(offsets)) array.
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    pad = int(np.abs(offsets).max()) if offsets.size else 0
+    keys, size = panel_keys(units, times, pad)
+
+    row_of = np.full(size, -1, dtype=np.int64)
+    row_of[keys] = np.arange(len(keys))
+    if len(keys) and not np.array_equal(row_of[keys], np.arange(len(keys))):
+        raise ValueError("Panel has duplicate (unit, time) rows")
+
+    # Padding keeps every target inside its own unit's block
+    return row_of[keys[:, None] - offsets[None, :]]
+
+
+def shifted_values(values: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """values (n,) or (n, c) gathered at `rows` (n, k); NaN where rows == -1."""
+    values = np.asarray(values, dtype=float)
+    out = values[np.maximum(rows, 0)]
+    out[rows < 0] = np.nan
+    return out
+
+
+def add_lags(
+    df: pd.DataFrame,
+    cols: list[str],
+    lags=(1,),
+    leads=(),
+    diffs=(),
+    unit_col: str = "state_fips",
+    time_col: str = "year",
+) -> pd.DataFrame:
+    """
+    Copy of `df` with Lag<k>_<col>, Lead<k>_<col> and Diff<k>_<col>
+    (col minus its k-period lag) for every column in `cols`, all built in one
+    pass. Missing periods give NaN.
+    """
+    lags, leads, diffs = list(lags), list(leads), list(diffs)
+    lag_offsets = sorted(set(lags) | set(diffs))
+    offsets = lag_offsets + [-k for k in leads]
+    rows = shift_rows(df[unit_col].to_numpy(), df[time_col].to_numpy(), offsets)
+
+    values = df[cols].to_numpy(dtype=float)
+    shifted = shifted_values(values, rows)  # (n, offsets, cols)
+
+    new = {}
+    for j, col in enumerate(cols):
+        for i, k in enumerate(lag_offsets):
+            if k in lags:
+                new[f"Lag{k}_{col}"] = shifted[:, i, j]
+            if k in diffs:
+                new[f"Diff{k}_{col}"] = values[:, j] - shifted[:, i, j]
+        for i, k in enumerate(leads, start=len(lag_offsets)):
+            new[f"Lead{k}_{col}"] = shifted[:, i, j]
+    return pd.concat([df, pd.DataFrame(new, index=df.index)], axis=1)
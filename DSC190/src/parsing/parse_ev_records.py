@@ -0,0 +1,251 @@
+"""
+Streaming aggregation of vehicle-level registration records.
+
+State DMV extracts have one row per vehicle (tens of millions of rows), so
+they are never loaded whole. The file is read in fixed-size byte blocks cut
+at record boundaries. Only the state, fuel (and optional date/year) columns
+of each block are parsed, and the block's EV counts are added to a running
+(state, year) total. Memory stays at one block plus one counter per state
+and year, whatever the file size.
+
+After every block the byte offset and running totals are checkpointed in
+STREAM_CHECKPOINT_DIR. If a run fails part-way (bad block, killed job), the
+next run on the same unchanged file resumes after the last completed block.
+
+The result has the same state, year, ev_count shape as the AFDC tables.
+`main` writes it as Datasets/ev_registrations_<year>.csv, so
+parse_ev_registrations and ingest_year pick it up like any other year.
+
+Usage (from the DSC190/ folder):
+    python -m src.parsing.parse_ev_records dmv/ca_2023.csv dmv/wa_2023.csv --year 2023 \\
+        --state-col "State" --fuel-col "Fuel Type"
+    python -m src.parsing.parse_ev_records dmv/all_records.csv --year-col "Registration Date"
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.config import RAW_DIR, EV_FUEL_TYPES, STREAM_CHECKPOINT_DIR
+from src.geography import attach_fips, normalize_name
+from src.instrument import record
+
+DEFAULT_BLOCK_BYTES = 64 * 2**20
+
+
+# =========================================================================================================
+# Block reader
+# =========================================================================================================
+def record_boundary(buf: bytes) -> int:
+    """
+    Length of the longest prefix of `buf` made of complete records: up to the
+    last newline that is not inside a quoted field. 0 if there is none.
+    """
+    cut = buf.rfind(b"\n")
+    while cut >= 0 and buf.count(b'"', 0, cut) % 2:
+        cut = buf.rfind(b"\n", 0, cut)
+    return cut + 1
+
+
+def iter_blocks(path, start: int = 0, block_bytes: int = DEFAULT_BLOCK_BYTES):
+    """
+    Yield (header, block, end_offset) for the records of a CSV file from byte
+    offset `start` (0 = first record). Every block holds whole records and
+    `end_offset` is where the next block starts.
+    """
+    with open(path, "rb") as f:
+        header = f.readline()
+        offset = max(start, f.tell())
+        f.seek(offset)
+        carry = b""
+        while True:
+            data = f.read(block_bytes)
+            if not data:
+                if carry.strip():
+                    yield header, carry, offset + len(carry)
+                return
+            buf = carry + data
+            cut = record_boundary(buf)
+            if cut == 0:
+                carry = buf  # a single record longer than the block: keep reading
+                continue
+            offset += cut
+            yield header, buf[:cut], offset
+            carry = buf[cut:]
+
+
+def record_years(values: pd.Series) -> pd.Series:
+    """Year from a column holding years or dates (e.g. '2023' or '2023-05-01')."""
+    years = pd.to_numeric(values, errors="coerce")
+    dates = years.isna() & values.notna()
+    if dates.any():
+        years[dates] = pd.to_datetime(values[dates], errors="coerce").dt.year
+    return years
+
+
+def count_block(header: bytes, block: bytes, state_col: str, fuel_col: str, fuels,
+                year=None, year_col: str = None) -> tuple[Counter, int]:
+    """EV count per (state, year) in one block, and the number of records read."""
+    usecols = [state_col, fuel_col] + ([year_col] if year_col else [])
+    # The C engine, not RAW_CSV_ENGINE: pyarrow rejects quoted fields with embedded newlines
+    df = pd.read_csv(io.BytesIO(header + block), usecols=usecols, dtype=str, engine="c")
+
+    # Match each distinct fuel label once rather than every row
+    fuel = df[fuel_col].astype("category")
+    wanted = {normalize_name(f) for f in fuels}
+    is_ev = np.array([normalize_name(c) in wanted for c in fuel.cat.categories] + [False])
+    # codes are -1 for missing fuel, which indexes the trailing False
+    ev = pd.Series(is_ev[fuel.cat.codes.to_numpy()], index=df.index)
+
+    years = record_years(df[year_col]) if year_col else pd.Series(year, index=df.index)
+    known = years.notna() & df[state_col].notna()
+    per_group = ev[known].groupby([df.loc[known, state_col], years[known].astype(int)]).sum()
+    return Counter({key: int(n) for key, n in per_group.items()}), len(df)
+
+
+# =========================================================================================================
+# Checkpoints
+# =========================================================================================================
+def checkpoint_path(path) -> Path:
+    name = hashlib.sha256(str(Path(path).resolve()).encode()).hexdigest()[:16]
+    return STREAM_CHECKPOINT_DIR / f"{name}.json"
+
+
+def run_signature(path, **settings) -> dict:
+    """Identifies the file contents and aggregation settings a checkpoint belongs to."""
+    st = Path(path).stat()
+    return {
+        "path": str(Path(path).resolve()),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        **settings,
+    }
+
+
+def load_checkpoint(path, signature: dict) -> tuple[int, int, Counter]:
+    """(offset, records read, counts) to resume from; a fresh start if none matches."""
+    ckpt = checkpoint_path(path)
+    if ckpt.exists():
+        with ckpt.open() as f:
+            saved = json.load(f)
+        if saved.get("signature") == signature:
+            counts = Counter({(state, year): n for state, year, n in saved["counts"]})
+            return saved["offset"], saved["records"], counts
+    return 0, 0, Counter()
+
+
+def save_checkpoint(path, signature: dict, offset: int, records: int, counts: Counter) -> None:
+    STREAM_CHECKPOINT_DIR.mkdir(parents=True, exist_ok=True)
+    ckpt = checkpoint_path(path)
+    tmp = ckpt.with_suffix(f".{os.getpid()}.tmp")
+    with tmp.open("w") as f:
+        json.dump({
+            "signature": signature,
+            "offset": offset,
+            "records": records,
+            "counts": [[state, year, n] for (state, year), n in counts.items()],
+        }, f)
+    os.replace(tmp, ckpt)
+
+
+# =========================================================================================================
+# Aggregation
+# =========================================================================================================
+def aggregate_vehicle_records(
+    path,
+    year: int = None,
+    state_col: str = "State",
+    fuel_col: str = "Fuel Type",
+    year_col: str = None,
+    fuels=EV_FUEL_TYPES,
+    block_bytes: int = DEFAULT_BLOCK_BYTES,
+    resume: bool = True,
+) -> pd.DataFrame:
+    """
+    EV registrations per state and year (state, year, ev_count, state_fips)
+    from a vehicle-level CSV. Give either `year` (the whole file is one year)
+    or `year_col` (a year or date per record).
+    """
+    if (year is None) == (year_col is None):
+        raise ValueError("Give exactly one of year= or year_col=")
+    path = Path(path)
+    signature = run_signature(
+        path, state_col=state_col, fuel_col=fuel_col, year=year, year_col=year_col,
+        fuels=sorted(fuels),
+    )
+
+    offset, records, counts = load_checkpoint(path, signature) if resume else (0, 0, Counter())
+    if offset:
+        print(f"{path.name}: resuming at byte {offset:,} ({records:,} records already counted)")
+
+    for header, block, end in iter_blocks(path, offset, block_bytes):
+        block_counts, n = count_block(header, block, state_col, fuel_col, fuels, year, year_col)
+        counts.update(block_counts)
+        records += n
+        record(rows_in=n)
+        save_checkpoint(path, signature, end, records, counts)
+        print(f"{path.name}: {end / 2**20:,.0f} MB, {records:,} records, {sum(counts.values()):,} EVs")
+
+    checkpoint_path(path).unlink(missing_ok=True)
+
+    out = pd.DataFrame(
+        [(state, yr, n) for (state, yr), n in counts.items()],
+        columns=["state", "year", "ev_count"],
+    )
+    out = attach_fips(out, path.name)
+    # Several spellings of one state (e.g. "CA" and "California") collapse here
+    out = out.groupby(["state_fips", "year"], as_index=False).agg(
+        state=("state", "first"), ev_count=("ev_count", "sum")
+    )
+    return out[["state", "year", "ev_count", "state_fips"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Aggregate vehicle-level registration records into ev_registrations_<year>.csv."
+    )
+    parser.add_argument("paths", nargs="+", type=Path)
+    parser.add_argument("--year", type=int, help="registration year of every record")
+    parser.add_argument("--year-col", help="column with each record's year or date")
+    parser.add_argument("--state-col", default="State")
+    parser.add_argument("--fuel-col", default="Fuel Type")
+    parser.add_argument("--fuels", nargs="+", default=EV_FUEL_TYPES,
+                        help="fuel values counted as EVs (case-insensitive)")
+    parser.add_argument("--block-mb", type=int, default=DEFAULT_BLOCK_BYTES // 2**20)
+    parser.add_argument("--restart", action="store_true", help="ignore saved checkpoints")
+    parser.add_argument("--out-dir", type=Path, default=RAW_DIR)
+    parser.add_argument("--overwrite", action="store_true",
+                        help="replace an existing ev_registrations_<year>.csv")
+    args = parser.parse_args()
+
+    frames = [
+        aggregate_vehicle_records(
+            path, args.year, args.state_col, args.fuel_col, args.year_col, args.fuels,
+            block_bytes=args.block_mb * 2**20, resume=not args.restart,
+        )
+        for path in args.paths
+    ]
+    # Per-state extracts of the same year add up
+    ev = (
+        pd.concat(frames, ignore_index=True)
+        .groupby(["state_fips", "year"], as_index=False)
+        .agg(state=("state", "first"), ev_count=("ev_count", "sum"))
+    )
+
+    for yr, rows in ev.groupby("year"):
+        out_path = args.out_dir / f"ev_registrations_{yr}.csv"
+        if out_path.exists() and not args.overwrite:
+            print(f"Skipped {yr}: {out_path} exists (use --overwrite to replace it)")
+            continue
+        rows[["state", "year", "ev_count"]].to_csv(out_path, index=False)
+        print(f"Saved {len(rows)} state rows to {out_path}")
+
+
+if __name__ == "__main__":
+    main()
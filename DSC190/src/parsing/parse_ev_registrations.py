@@ -1,20 +1,29 @@
 import pandas as pd
-from src.config import RAW_DIR, EV_REG_CLEAN_FILE
+from src.config import RAW_DIR, EV_REG_CLEAN_FILE, EV_REG_FILES
+from src.storage import write_table
+from src.parsing.raw_loader import read_raw_csv, load_year_files
+from src.geography import attach_fips
 
-YEAR_FILES = {
-    2016: "ev_registrations_2016.csv",
-    2017: "ev_registrations_2017.csv",
-    2018: "ev_registrations_2018.csv",
-    2019: "ev_registrations_2019.csv",
-    2020: "ev_registrations_2020.csv",
-    2021: "ev_registrations_2021.csv",
-    2022: "ev_registrations_2022.csv",
-    2023: "ev_registrations_2023.csv",
+# Discovered in config.py: ev_registrations_<year>.csv
+YEAR_FILES = {year: path.name for year, path in EV_REG_FILES.items()}
+
+# Other electrified fuels kept when the AFDC table has them (features in src/analysis/ml_features.py)
+EXTRA_COUNT_COLS = {
+    "Plug-In Hybrid Electric (PHEV)": "phev_count",
+    "Hybrid Electric (HEV)": "hev_count",
 }
 
+
+def clean_count(col: pd.Series) -> pd.Series:
+    """Counts such as "13,000" -> 13000."""
+    return col.astype(str).str.replace(",", "", regex=False).astype(int)
+
 def load_one_year(year, filename):
-    path = RAW_DIR / filename
-    df = pd.read_csv(path)
+    return parse_ev_file(RAW_DIR / filename, year)
+
+def parse_ev_file(path, year):
+    filename = path.name
+    df = read_raw_csv(path)
 
     # Print columns
     print(f"\n=== {year} columns in {filename} ===")
@@ -58,29 +67,22 @@ def load_one_year(year, filename):
         )
 
     # Clean the EV count: remove commas, convert to int
-    ev_series = (
-        df[ev_col]
-        .astype(str)
-        .str.replace(",", "", regex=False)
-        .astype(int)
-    )
-
     out = pd.DataFrame({
         "state": df["state"],
         "year": df["year"],
-        "ev_count": ev_series,
+        "ev_count": clean_count(df[ev_col]),
     })
+    for col, name in EXTRA_COUNT_COLS.items():
+        if col in df.columns:
+            out[name] = clean_count(df[col])
 
-    return out
+    return attach_fips(out, filename)
 
 def main():
-    frames = []
-    for year, fname in YEAR_FILES.items():
-        print(f"\nLoading EV registrations for {year} from {fname}...")
-        frames.append(load_one_year(year, fname))
-
-    ev_all = pd.concat(frames, ignore_index=True)
-    ev_all.to_csv(EV_REG_CLEAN_FILE, index=False)
+    # Yearly files are parsed concurrently; unchanged files come from the cache
+    frames = load_year_files(EV_REG_FILES, parse_ev_file)
+    ev_all = pd.concat(frames.values(), ignore_index=True)
+    write_table(ev_all, EV_REG_CLEAN_FILE)
     print(f"\nSaved combined EV registrations to {EV_REG_CLEAN_FILE}")
 
 if __name__ == "__main__":
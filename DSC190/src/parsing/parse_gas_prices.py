@@ -1,8 +1,12 @@
 import pandas as pd
-from src.config import GAS_FILE, GAS_CLEAN_FILE
+from src.config import GAS_FILE, GAS_CLEAN_FILE, DATA_YEARS
+from src.storage import write_table
+from src.instrument import record
 
-def main():
+def load_gas_prices(years=None):
+    """Real 2023 $/gal gas prices for `years` (default: the panel's year range)."""
     df = pd.read_excel(GAS_FILE, sheet_name="Gas Prices", header=2)
+    record(rows_in=len(df))
 
     print("Columns from gas price file:")
     print(df.columns.tolist())
@@ -42,9 +46,15 @@ def main():
         .astype(float)
     )
 
-    gas = gas[gas["year"].between(2016, 2023)]
+    if years is None:
+        gas = gas[gas["year"].between(min(DATA_YEARS), max(DATA_YEARS))]
+    else:
+        gas = gas[gas["year"].isin(list(years))]
+    return gas
 
-    gas.to_csv(GAS_CLEAN_FILE, index=False)
+def main():
+    gas = load_gas_prices()
+    write_table(gas, GAS_CLEAN_FILE)
     print(f"Saved clean gas price data to {GAS_CLEAN_FILE}")
 
 if __name__ == "__main__":
@@ -1,52 +1,152 @@
+import re
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
-from src.config import PORT_FILES, PORTS_CLEAN_FILE
-
-def extract_outlets(cell):
-    """Extract total charging outlets from 'stations | outlets' string."""
-    if isinstance(cell, str) and "|" in cell:
-        parts = [p.strip().replace(",", "") for p in cell.split("|")]
-        if len(parts) >= 2:
-            try:
-                return int(parts[1])
-            except ValueError:
-                return np.nan
-    return np.nan
+from src.config import PORT_FILES, PORTS_CLEAN_FILE, STATION_COUNTS_CLEAN_FILE
+from src.storage import write_table
+from src.parsing.raw_loader import read_raw_csv, load_year_files
+from src.geography import attach_fips, geo_kind
 
-def parse_ports_for_year(path, year):
-    df = pd.read_csv(path)
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+    pc = None
+
+# AFDC "Station Counts by State and Fuel Type" headers (footnote letters stripped)
+FUEL_NAMES = {
+    "Biodiesel": "biodiesel",
+    "CNG": "cng",
+    "E85": "e85",
+    "Electric": "electric",
+    "Hydrogen": "hydrogen",
+    "LNG": "lng",
+    "Propane": "propane",
+    "Renewable Diesel": "renewable_diesel",
+    "Total": "total",
+}
+
+def fuel_name(header):
+    """Normalized fuel name for a table header like 'Electrica' or 'CNG'."""
+    name = str(header).strip()
+    if name in FUEL_NAMES:
+        return FUEL_NAMES[name]
+    # Headers carry a footnote marker: Electrica, Hydrogenb, Propanec, Totald
+    if name[:-1] in FUEL_NAMES:
+        return FUEL_NAMES[name[:-1]]
+    return re.sub(r"\W+", "_", name.lower()).strip("_")
+
+def _count_parts_arrow(col: pd.Series):
+    """(n_parts, parts) for a string column using pyarrow compute kernels."""
+    arr = pa.array(col.astype("string"), from_pandas=True)
+    lists = pc.split_pattern(pc.replace_substring(arr, ",", ""), "|")
+    n_parts = pc.fill_null(pc.list_value_length(lists), 0).to_numpy(zero_copy_only=False)
+
+    flat = pc.utf8_trim_whitespace(pc.list_flatten(lists))
+    flat = pc.if_else(pc.utf8_is_digit(flat), flat, pa.scalar(None, pa.string()))
+    nums = pc.cast(flat, pa.float64()).to_numpy(zero_copy_only=False)
+
+    # Position of every flattened piece within its cell
+    row = pc.list_parent_indices(lists).to_numpy()
+    first = np.concatenate([[0], np.cumsum(n_parts)[:-1]])
+    pos = np.arange(len(nums)) - first[row]
+
+    parts = np.full((len(col), 3), np.nan)
+    keep = pos < 3
+    parts[row[keep], pos[keep]] = nums[keep]
+    return n_parts, parts
+
+def _count_parts_pandas(col: pd.Series):
+    """Same as _count_parts_arrow with pandas string methods (no pyarrow)."""
+    text = col.astype("string").str.replace(",", "", regex=False)
+    split = text.str.split("|", expand=True).reindex(columns=range(3))
+    parts = np.column_stack([
+        pd.to_numeric(split[i].str.strip(), errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+        for i in range(3)
+    ])
+    return split.notna().sum(axis=1).to_numpy(), parts
+
+def split_counts(col: pd.Series):
+    """
+    Split one fuel column into (stations, outlets) arrays without a per-cell
+    Python function.
 
-    # Rename columns
-    df = df.rename(columns={
-        "Station Counts by State and Fuel Type": "state",
-        "Unnamed: 4": "electric"
+    Cells come in three shapes:
+      'n'                  -> stations
+      'stations | outlets' -> electric
+      'a | b | total'      -> hydrogen (retail / non-retail) and propane
+                              (primary / secondary); stations = total
+    Outlets are only reported for electric, NaN elsewhere.
+    """
+    if pd.api.types.is_numeric_dtype(col):
+        return col.to_numpy(dtype=float), np.full(len(col), np.nan)
+
+    count_parts = _count_parts_arrow if pc is not None else _count_parts_pandas
+    n_parts, parts = count_parts(col)
+    stations = np.where(n_parts == 3, parts[:, 2], parts[:, 0])
+    outlets = np.where(n_parts == 2, parts[:, 1], np.nan)
+    return stations, outlets
+
+def parse_station_counts(path, year):
+    """
+    Long table of station and outlet counts for every fuel:
+    state, year, fuel, stations, outlets.
+    """
+    # Row 0 is the table title; row 1 holds the fuel headers
+    df = read_raw_csv(path, header=1)
+    df = df.rename(columns={df.columns[0]: "state"})
+
+    fuel_cols = [c for c in df.columns[1:] if fuel_name(c) != "total"]
+
+    # State rows have a name and at least one count; this drops the sub-header
+    # rows, the per-state Level 1/2/DC continuation rows and the footnotes
+    rows = df[df["state"].notna() & df[fuel_cols].notna().any(axis=1)]
+
+    # Columns are split one at a time, then interleaved state-major
+    split = [split_counts(rows[c]) for c in fuel_cols]
+    stations = np.column_stack([st for st, _ in split]).ravel()
+    outlets = np.column_stack([out for _, out in split]).ravel()
+
+    counts = pd.DataFrame({
+        "state": np.repeat(rows["state"].to_numpy(), len(fuel_cols)),
+        "year": year,
+        "fuel": np.tile([fuel_name(c) for c in fuel_cols], len(rows)),
+        "stations": stations,
+        "outlets": outlets,
+    })
+    return attach_fips(counts, Path(path).name)
+
+def electric_outlets(counts):
+    """Electric charging outlets per state from the long station-count table."""
+    electric = counts[counts["fuel"] == "electric"]
+    return pd.DataFrame({
+        "state": electric["state"].to_numpy(),
+        "state_fips": electric["state_fips"].to_numpy(),
+        "ports_total": electric["outlets"].to_numpy(),
+        "year": electric["year"].to_numpy(),
     })
 
-    # Keep only rows that actually have a state name
-    state_rows = df[df["state"].notna() & (df["state"] != "State")].copy()
+def parse_ports_for_year(path, year):
+    return electric_outlets(parse_station_counts(path, year))
 
-    # Extract total outlets from 'stations | outlets'
-    state_rows["ports_total"] = state_rows["electric"].apply(extract_outlets)
-    out = state_rows[["state", "ports_total"]].copy()
-    out["year"] = year
-    return out
+def drop_non_states(ports):
+    """Keep the 50 states (drops the national total, DC and territories)."""
+    return ports[geo_kind(ports["state_fips"]) == "state"]
 
 def main():
-    frames = []
-    for year, path in PORT_FILES.items():
-        print(f"Parsing ports for {year} from {path}...")
-        frames.append(parse_ports_for_year(path, year))
+    # Yearly files are parsed concurrently; unchanged files come from the cache
+    frames = load_year_files(PORT_FILES, parse_station_counts)
+    counts = pd.concat(frames.values(), ignore_index=True)
 
-    ports = pd.concat(frames, ignore_index=True)
+    write_table(counts, STATION_COUNTS_CLEAN_FILE)
+    print(f"Saved station counts for all fuels to {STATION_COUNTS_CLEAN_FILE}")
 
     # Drop rows that are regions, not states
-    bad_names = [
-        "United States", "U.S. Total", "District of Columbia",
-        "U.S. Territories", "Other"
-    ]
-    ports = ports[~ports["state"].isin(bad_names)]
+    ports = drop_non_states(electric_outlets(counts))
 
-    ports.to_csv(PORTS_CLEAN_FILE, index=False)
+    write_table(ports, PORTS_CLEAN_FILE)
     print(f"Saved clean ports data to {PORTS_CLEAN_FILE}")
 
 if __name__ == "__main__":
@@ -0,0 +1,137 @@
+"""
+Concurrent loading of the yearly raw files with a parsed-file cache.
+
+`load_year_files` runs a per-file parser (e.g. parse_ports_for_year) over
+every yearly file on a thread pool. Each normalized result is cached under
+PARSE_CACHE_DIR keyed by the file's path, size and mtime plus a digest of the
+parser's source module, so an unchanged file is never reparsed and editing a
+parser invalidates its cache entries.
+
+`read_raw_csv` is the shared CSV reader for those parsers; it uses pandas'
+pyarrow engine when available (see RAW_CSV_ENGINE in config.py).
+"""
+import hashlib
+import inspect
+import os
+import pickle
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from src.config import PROJECT_ROOT, PARSE_CACHE_DIR, RAW_CSV_ENGINE
+from src.instrument import record
+
+try:
+    import pyarrow  # noqa: F401
+except ImportError:  # pragma: no cover - optional dependency
+    pyarrow = None
+
+
+def csv_engine(engine: str = RAW_CSV_ENGINE) -> str:
+    if engine == "auto":
+        return "pyarrow" if pyarrow is not None else "c"
+    return engine
+
+
+def read_raw_csv(path, engine: str = RAW_CSV_ENGINE, **kwargs) -> pd.DataFrame:
+    """
+    pd.read_csv with the configured engine. Blank header cells are named
+    "Unnamed: <i>" under every engine, as the default C engine does.
+    """
+    engine = csv_engine(engine)
+    df = pd.read_csv(path, engine=engine, **kwargs)
+    if engine == "pyarrow":
+        df.columns = [
+            c if str(c).strip() else f"Unnamed: {i}" for i, c in enumerate(df.columns)
+        ]
+    return df
+
+
+# =========================================================================================================
+# Parsed-file cache
+# =========================================================================================================
+_parser_digests = {}
+
+# Modules every parser applies (name -> FIPS mapping); editing them invalidates the cache too
+SHARED_PARSE_CODE = [PROJECT_ROOT / "src" / "geography.py"]
+
+
+def parser_digest(parser) -> str:
+    """Digest of the source file that defines `parser`."""
+    source = inspect.getsourcefile(parser)
+    if source not in _parser_digests:
+        _parser_digests[source] = hashlib.sha256(Path(source).read_bytes()).hexdigest()
+    return _parser_digests[source]
+
+
+def cache_key(path, parser) -> str:
+    path = Path(path).resolve()
+    st = path.stat()
+    parts = [
+        str(path),
+        str(st.st_size),
+        str(st.st_mtime_ns),
+        f"{parser.__module__}.{parser.__qualname__}",
+        parser_digest(parser),
+        *(hashlib.sha256(p.read_bytes()).hexdigest() for p in SHARED_PARSE_CODE),
+        csv_engine(),
+    ]
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def load_cached(path, year, parser, use_cache: bool = True):
+    """
+    parser(path, year), reusing the cached result when the file is unchanged.
+    Returns (frame, hit).
+    """
+    if not use_cache:
+        return parser(path, year), False
+
+    cache_file = PARSE_CACHE_DIR / f"{cache_key(path, parser)}.pkl"
+    if cache_file.exists():
+        try:
+            return pd.read_pickle(cache_file), True
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass  # unreadable entry: reparse and overwrite it
+
+    df = parser(path, year)
+    PARSE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # Write-then-rename so a concurrent reader never sees a partial file
+    tmp = cache_file.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    df.to_pickle(tmp)
+    os.replace(tmp, cache_file)
+    return df, False
+
+
+def load_year_files(files: dict, parser, max_workers: int = None, use_cache: bool = True) -> dict:
+    """
+    Run `parser(path, year)` for every year -> path in `files` concurrently.
+
+    Returns year -> parsed frame, in the order of `files`.
+    """
+    if not files:
+        return {}
+    max_workers = max_workers or min(len(files), os.cpu_count() or 1)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            year: pool.submit(load_cached, path, year, parser, use_cache)
+            for year, path in files.items()
+        }
+        results = {year: fut.result() for year, fut in futures.items()}
+
+    hits = sum(hit for _, hit in results.values())
+    print(f"Loaded {len(results)} files with {parser.__name__} ({hits} from cache)")
+    record(
+        rows_in=sum(len(df) for df, _ in results.values()),
+        cache_hits=hits,
+        cache_misses=len(results) - hits,
+    )
+    return {year: df for year, (df, _) in results.items()}
+
+
+def clear_cache() -> None:
+    for f in PARSE_CACHE_DIR.glob("*.pkl"):
+        f.unlink()
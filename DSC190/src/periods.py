@@ -0,0 +1,187 @@
+"""
+Period keys for annual, quarterly and monthly panels.
+
+A period is one integer: year * periods_per_year + (sub-period - 1), so an
+annual key is just the year, 2023Q3 is 2023 * 4 + 2 and July 2023 is
+2023 * 12 + 6. Keys sort chronologically, consecutive periods differ by 1,
+and year = key // periods_per_year. All helpers work on whole arrays.
+
+Trends are measured in years ((key - first key) / periods_per_year), so FE
+slopes keep the same units at every frequency.
+"""
+import numpy as np
+import pandas as pd
+
+ANNUAL = "A"
+QUARTERLY = "Q"
+MONTHLY = "M"
+
+PERIODS_PER_YEAR = {ANNUAL: 1, QUARTERLY: 4, MONTHLY: 12}
+
+
+def time_column(freq: str) -> str:
+    """Name of the time key in a panel at `freq` ('year' for annual panels)."""
+    periods_per_year(freq)
+    return "year" if freq == ANNUAL else "period"
+
+
+def periods_per_year(freq: str) -> int:
+    try:
+        return PERIODS_PER_YEAR[freq]
+    except KeyError:
+        raise ValueError(f"Unknown frequency {freq!r}; use one of {list(PERIODS_PER_YEAR)}") from None
+
+
+def add_freq_argument(parser) -> None:
+    """--freq A|Q|M (default annual) for scripts that run on any panel frequency."""
+    parser.add_argument("--freq", choices=list(PERIODS_PER_YEAR), default=ANNUAL,
+                        help="panel frequency (quarterly/monthly need src.cleaning.period_panel first)")
+
+
+def period_key(years, subs, freq: str) -> np.ndarray:
+    """Key from year and 1-based sub-period (quarter or month)."""
+    return np.asarray(years, dtype=np.int64) * periods_per_year(freq) + np.asarray(subs, dtype=np.int64) - 1
+
+
+def period_from_dates(dates, freq: str) -> np.ndarray:
+    """Key of the period each date falls in."""
+    dates = pd.DatetimeIndex(pd.to_datetime(dates))
+    months_per_period = 12 // periods_per_year(freq)
+    subs = (dates.month.to_numpy() - 1) // months_per_period + 1
+    return period_key(dates.year.to_numpy(), subs, freq)
+
+
+def period_year(keys, freq: str) -> np.ndarray:
+    return np.asarray(keys, dtype=np.int64) // periods_per_year(freq)
+
+
+def period_labels(keys, freq: str) -> np.ndarray:
+    """'2023', '2023Q3' or '2023-07'."""
+    keys = np.asarray(keys, dtype=np.int64)
+    n = periods_per_year(freq)
+    years = (keys // n).astype(str)
+    subs = keys % n + 1
+    if freq == ANNUAL:
+        return years
+    if freq == QUARTERLY:
+        return np.char.add(np.char.add(years, "Q"), subs.astype(str))
+    return np.char.add(np.char.add(years, "-"), np.char.zfill(subs.astype(str), 2))
+
+
+def trend_years(keys, first_key, freq: str) -> np.ndarray:
+    """Time since `first_key` in years."""
+    trend = np.asarray(keys, dtype=np.int64) - first_key
+    n = periods_per_year(freq)
+    return trend if n == 1 else trend / n
+
+
+def future_periods(last_key: int, years_ahead: int, freq: str) -> list[int]:
+    """The `years_ahead` years of period keys after `last_key`."""
+    return list(range(last_key + 1, last_key + 1 + years_ahead * periods_per_year(freq)))
+
+
+def per_period_rate(annual_rate, freq: str):
+    """Compound rate per period equivalent to `annual_rate` per year."""
+    n = periods_per_year(freq)
+    return annual_rate if n == 1 else (1.0 + np.asarray(annual_rate, dtype=float)) ** (1.0 / n) - 1.0
+
+
+# =========================================================================================================
+# Snapshots -> periods, annual -> periods
+# =========================================================================================================
+def snapshots_to_periods(
+    df: pd.DataFrame,
+    date_col: str,
+    freq: str,
+    keys: list[str],
+    value_cols: list[str],
+    how: str = "last",
+) -> pd.DataFrame:
+    """
+    Collapse dated snapshots to one row per `keys` + period.
+
+    how='last' keeps the latest snapshot in each period (stocks such as
+    registrations in operation or open stations); how='sum' adds them up
+    (flows such as new registrations).
+    """
+    out = df[[*keys, date_col, *value_cols]].copy()
+    out["period"] = period_from_dates(out[date_col], freq)
+
+    if how == "last":
+        out = out.sort_values([*keys, "period", date_col], kind="stable")
+        out = out.drop_duplicates([*keys, "period"], keep="last")
+        out = out.drop(columns=date_col)
+    elif how == "sum":
+        out = out.groupby([*keys, "period"], as_index=False, observed=True, sort=True)[value_cols].sum()
+    else:
+        raise ValueError(f"how must be 'last' or 'sum', got {how!r}")
+
+    out["year"] = period_year(out["period"], freq)
+    return out.reset_index(drop=True)
+
+
+def interpolate_annual(
+    annual: pd.DataFrame,
+    code_col: str,
+    value_col: str,
+    codes,
+    periods,
+    freq: str,
+) -> np.ndarray:
+    """
+    Linearly interpolate an annual series (e.g. July 1 population estimates)
+    to the middle of each requested period.
+
+    Each annual value is anchored at mid-year. A period before the first or
+    after the last available year takes the nearest annual value. Returns one
+    value per (codes[i], periods[i]); NaN where the code has no data at all.
+    """
+    n = periods_per_year(freq)
+    codes = np.asarray(codes, dtype=np.int64)
+    t = (np.asarray(periods, dtype=np.int64) + 0.5) / n - 0.5  # years since mid-year anchor
+    lower = np.floor(t).astype(np.int64)
+    w = t - lower
+
+    table = annual[[code_col, "year", value_col]].dropna()
+    span = 10_000
+    keys = table[code_col].to_numpy(dtype=np.int64) * span + table["year"].to_numpy(dtype=np.int64)
+    order = np.argsort(keys)
+    keys = keys[order]
+    values = table[value_col].to_numpy(dtype=float)[order]
+
+    def at(at_codes, at_years):
+        want = at_codes * span + at_years
+        pos = np.searchsorted(keys, want)
+        found = np.zeros(len(want), dtype=bool)
+        inside = pos < len(keys)
+        found[inside] = keys[pos[inside]] == want[inside]
+        out = np.full(len(want), np.nan)
+        out[found] = values[pos[found]]
+        return out
+
+    lo = at(codes, lower)
+    hi = at(codes, lower + 1)
+    result = (1.0 - w) * lo + w * hi
+
+    # Outside the observed years (or next to a gap): hold the nearest annual value
+    edge = np.isnan(result)
+    if edge.any():
+        years = table.groupby(code_col)["year"]
+        first = years.min().reindex(codes[edge]).to_numpy(dtype=float)
+        last = years.max().reindex(codes[edge]).to_numpy(dtype=float)
+        nearest = np.clip(np.round(t[edge]), first, last)
+        has_data = ~np.isnan(nearest)
+        fill = np.full(int(edge.sum()), np.nan)
+        fill[has_data] = at(codes[edge][has_data], nearest[has_data].astype(np.int64))
+        result[edge] = np.where(np.isnan(fill), np.where(np.isnan(lo[edge]), hi[edge], lo[edge]), fill)
+    return result
+
+
+def expand_annual(annual: pd.DataFrame, value_cols: list[str], freq: str) -> pd.DataFrame:
+    """Repeat year-keyed values (e.g. annual gas prices) for every period of the year."""
+    n = periods_per_year(freq)
+    years = annual["year"].to_numpy(dtype=np.int64)
+    out = annual.loc[annual.index.repeat(n), value_cols].reset_index(drop=True)
+    out.insert(0, "period", (np.repeat(years, n) * n + np.tile(np.arange(n), len(years))))
+    out.insert(1, "year", np.repeat(years, n))
+    return out
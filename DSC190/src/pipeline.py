@@ -0,0 +1,534 @@
+"""
+Incremental runner for the parse -> clean -> analysis chain.
+
+Each stage declares the files it reads and writes; its code is the stage
+module plus every src.* module it imports, found by walking the imports.
+A stage is skipped when the fingerprint of its inputs and code matches the
+one recorded on the last successful run, all of its outputs still exist and
+no stage upstream of it is out of date. Because fingerprints are taken over
+file contents, a changed raw file only rebuilds the stages downstream of it.
+
+Usage (from the DSC190/ folder):
+    python -m src.pipeline               # run stages that are out of date
+    python -m src.pipeline --dry-run     # only report what would run
+    python -m src.pipeline --force       # rerun every stage
+    python -m src.pipeline --only build_panel logspec
+    python -m src.pipeline --profile build_panel      # cProfile one stage
+
+When dated snapshots are present in SNAPSHOT_DIR, quarterly and monthly
+stages (period_panel_Q, logspec_Q, ... and the _M counterparts) are appended
+to the DAG; a stage's "kwargs" are passed to its entry point, and an optional
+"code" list adds source files the import walk cannot see.
+
+Every stage that runs (or is skipped) is logged to RUN_LOG_FILE with its
+wall/CPU time, peak memory, rows in/out and cache hits (src/instrument.py).
+"""
+import argparse
+import ast
+import functools
+import hashlib
+import importlib
+import json
+from pathlib import Path
+
+from src.config import (
+    PROJECT_ROOT,
+    RAW_DIR,
+    PROCESSED_DIR,
+    RUN_LOG_FILE,
+    FIGURES_DIR,
+    FORECAST_DIR,
+    TEXT_SUMMARIES_DIR,
+    CAUSAL_DIR,
+    PORT_FILES,
+    GAS_FILE,
+    PORTS_CLEAN_FILE,
+    STATION_COUNTS_CLEAN_FILE,
+    POP_CLEAN_FILE,
+    GAS_CLEAN_FILE,
+    EV_REG_CLEAN_FILE,
+    PANEL_FILE,
+    SCENARIO_CUBE_FILE,
+    ATLAS_DIR,
+    PERIOD_PANEL_FILES,
+)
+from src.parsing.parse_ev_registrations import YEAR_FILES as EV_YEAR_FILES
+from src.cleaning.population_states import OLD_FILE as POP_OLD_FILE
+from src.cleaning.population_states import NEW_FILE as POP_NEW_FILE
+from src.cleaning.period_panel import (
+    EV_SNAPSHOT_PATTERN,
+    PORTS_SNAPSHOT_PATTERN,
+    discover_snapshot_files,
+)
+from src.periods import QUARTERLY, MONTHLY
+from src.storage import stored_path
+from src.instrument import RUN_ID, stage as instrumented, append_log, format_entry
+
+STATE_FILE = PROCESSED_DIR / ".pipeline_state.json"
+
+# Cleaned tables as actually read/written (Parquet when pyarrow is installed)
+PORTS_TABLE = stored_path(PORTS_CLEAN_FILE)
+STATION_COUNTS_TABLE = stored_path(STATION_COUNTS_CLEAN_FILE)
+POP_TABLE = stored_path(POP_CLEAN_FILE)
+GAS_TABLE = stored_path(GAS_CLEAN_FILE)
+EV_REG_TABLE = stored_path(EV_REG_CLEAN_FILE)
+PANEL_TABLE = stored_path(PANEL_FILE)
+
+
+
+FORECAST_BASELINE_FILE = FORECAST_DIR / "forecast_panel_baseline.csv"
+FORECAST_ACC_FILE = FORECAST_DIR / "forecast_panel_accelerated.csv"
+FORECAST_ARIMA_FILE = FORECAST_DIR / "forecast_arima.csv"
+ARIMA_FITS_FILE = FORECAST_DIR / "arima_fits.csv"
+
+
+# =========================================================================================================
+# Stage DAG (declared in dependency order)
+# =========================================================================================================
+STAGES = [
+    {
+        "name": "parse_ports",
+        "module": "src.parsing.parse_ports",
+        "entry": "main",
+        "inputs": list(PORT_FILES.values()),
+        "outputs": [PORTS_TABLE, STATION_COUNTS_TABLE],
+    },
+    {
+        "name": "parse_ev_registrations",
+        "module": "src.parsing.parse_ev_registrations",
+        "entry": "main",
+        "inputs": [RAW_DIR / f for f in EV_YEAR_FILES.values()],
+        "outputs": [EV_REG_TABLE],
+    },
+    {
+        "name": "parse_gas_prices",
+        "module": "src.parsing.parse_gas_prices",
+        "entry": "main",
+        "inputs": [GAS_FILE],
+        "outputs": [GAS_TABLE],
+    },
+    {
+        "name": "population_states",
+        "module": "src.cleaning.population_states",
+        "entry": "build_population_states",
+        "inputs": [POP_OLD_FILE, POP_NEW_FILE],
+        "outputs": [POP_TABLE],
+    },
+    {
+        "name": "build_panel",
+        "module": "src.cleaning.build_panel",
+        "entry": "main",
+        "inputs": [PORTS_TABLE, POP_TABLE, GAS_TABLE, EV_REG_TABLE],
+        "outputs": [PANEL_TABLE],
+    },
+    {
+        "name": "descriptives",
+        "module": "src.analysis.descriptives",
+        "entry": "main",
+        "inputs": [PANEL_TABLE],
+        "outputs": [],
+    },
+    {
+        "name": "gas_vs_ev",
+        "module": "src.analysis.gas_vs_ev",
+        "entry": "main",
+        "inputs": [PANEL_TABLE, GAS_TABLE],
+        "outputs": [TEXT_SUMMARIES_DIR / "gas_vs_ev_summary.txt"],
+    },
+    {
+        "name": "logspec",
+        "module": "src.analysis.logspec",
+        "entry": "main",
+        "inputs": [PANEL_TABLE],
+        "outputs": [TEXT_SUMMARIES_DIR / "logspec_summary.txt"],
+    },
+    {
+        "name": "state_gas",
+        "module": "src.analysis.state_gas",
+        "entry": "run_state_gas_fe",
+        "inputs": [PANEL_TABLE],
+        "outputs": [
+            TEXT_SUMMARIES_DIR / "state_gas_summary.txt",
+            FIGURES_DIR / "state_gas_diagnostics.png",
+        ],
+    },
+    {
+        "name": "ml_features",
+        "module": "src.analysis.ml_features",
+        "entry": "main",
+        "inputs": [EV_REG_TABLE],
+        "outputs": [
+            FORECAST_DIR / "ml_features_2023.csv",
+            TEXT_SUMMARIES_DIR / "ml_prediction_summary.txt",
+        ],
+    },
+    {
+        "name": "granger",
+        "module": "src.analysis.granger",
+        "entry": "main",
+        "inputs": [PANEL_TABLE],
+        "outputs": [
+            CAUSAL_DIR / "granger_results_by_state.csv",
+            TEXT_SUMMARIES_DIR / "granger_summary.txt",
+        ],
+    },
+    {
+        "name": "causal_specs",
+        "module": "src.analysis.causal_specs",
+        "entry": "main",
+        "inputs": [PANEL_TABLE],
+        "outputs": [CAUSAL_DIR / "causal_model_main.txt", CAUSAL_DIR / "causal_model_reverse.txt"],
+    },
+    {
+        "name": "collinearity",
+        "module": "src.analysis.collinearity",
+        "entry": "main",
+        "inputs": [PANEL_TABLE],
+        "outputs": [
+            CAUSAL_DIR / name.format(spec)
+            for spec in ("main", "rev")
+            for name in ("vif_{}_raw.csv", "vif_{}_within.csv", "condition_{}.csv")
+        ],
+    },
+    {
+        "name": "forecast_ev_panel",
+        "module": "src.analysis.forecast_ev_panel",
+        "entry": "main",
+        "inputs": [PANEL_TABLE],
+        "outputs": [
+            FORECAST_BASELINE_FILE,
+            FORECAST_ACC_FILE,
+            FORECAST_ARIMA_FILE,
+            ARIMA_FITS_FILE,
+            SCENARIO_CUBE_FILE,
+            SCENARIO_CUBE_FILE.with_suffix(".json"),
+        ],
+    },
+    {
+        "name": "backtest",
+        "module": "src.analysis.backtest",
+        "entry": "main",
+        "inputs": [PANEL_TABLE],
+        "outputs": [
+            FORECAST_DIR / "backtest_forecasts.csv",
+            FORECAST_DIR / "backtest_metrics.csv",
+            TEXT_SUMMARIES_DIR / "backtest_summary.txt",
+        ],
+    },
+    {
+        "name": "forecast_summary",
+        "module": "src.analysis.forecast_summary",
+        "entry": "run_forecast_summary",
+        # The panel model is read from the model cache, or refit from the panel
+        "inputs": [
+            FORECAST_BASELINE_FILE,
+            FORECAST_ACC_FILE,
+            SCENARIO_CUBE_FILE,
+            SCENARIO_CUBE_FILE.with_suffix(".json"),
+            PANEL_TABLE,
+        ],
+        "outputs": [TEXT_SUMMARIES_DIR / "forecast_ev_summary.txt"],
+    },
+    {
+        "name": "plots",
+        "module": "src.visualization.plots",
+        "entry": "main",
+        "inputs": [PANEL_TABLE, GAS_TABLE],
+        "outputs": [
+            FIGURES_DIR / "ev_per_1000_top_states.png",
+            FIGURES_DIR / "ports_vs_ev_scatter.png",
+            FIGURES_DIR / "ev_gas_timeseries.png",
+            FIGURES_DIR / "ev_vs_gas_scatter_levels.png",
+            FIGURES_DIR / "ev_vs_gas_scatter_growth.png",
+        ],
+    },
+    {
+        # Redraws only the states whose inputs changed (per-unit hashes in the manifest)
+        "name": "atlas",
+        "module": "src.visualization.atlas",
+        "entry": "main",
+        "inputs": [
+            PANEL_TABLE,
+            FORECAST_BASELINE_FILE,
+            FORECAST_ACC_FILE,
+            FORECAST_ARIMA_FILE,
+            SCENARIO_CUBE_FILE,
+            SCENARIO_CUBE_FILE.with_suffix(".json"),
+        ],
+        "outputs": [ATLAS_DIR / ".atlas_manifest.json"],
+    },
+]
+
+
+def period_stages(freq: str) -> list[dict]:
+    """Period panel plus the frequency-aware consumers for freq 'Q'/'M'."""
+    snapshots = (
+        list(discover_snapshot_files(EV_SNAPSHOT_PATTERN).values())
+        + list(discover_snapshot_files(PORTS_SNAPSHOT_PATTERN).values())
+    )
+    panel_table = stored_path(PERIOD_PANEL_FILES[freq])
+    suffix = f"_{freq}"
+    return [
+        {
+            "name": f"period_panel{suffix}",
+            "module": "src.cleaning.period_panel",
+            "entry": "main",
+            "kwargs": {"freq": freq},
+            "inputs": snapshots + [POP_TABLE, GAS_TABLE],
+            "outputs": [panel_table],
+        },
+        {
+            "name": f"logspec{suffix}",
+            "module": "src.analysis.logspec",
+            "entry": "main",
+            "kwargs": {"freq": freq},
+            "inputs": [panel_table],
+            "outputs": [TEXT_SUMMARIES_DIR / f"logspec_summary{suffix}.txt"],
+        },
+        {
+            "name": f"state_gas{suffix}",
+            "module": "src.analysis.state_gas",
+            "entry": "run_state_gas_fe",
+            "kwargs": {"freq": freq},
+            "inputs": [panel_table],
+            "outputs": [
+                TEXT_SUMMARIES_DIR / f"state_gas_summary{suffix}.txt",
+                FIGURES_DIR / f"state_gas_diagnostics{suffix}.png",
+            ],
+        },
+        {
+            "name": f"forecast_ev_panel{suffix}",
+            "module": "src.analysis.forecast_ev_panel",
+            "entry": "main",
+            "kwargs": {"freq": freq},
+            "inputs": [panel_table],
+            "outputs": [
+                FORECAST_DIR / f"forecast_panel_baseline{suffix}.csv",
+                FORECAST_DIR / f"forecast_panel_accelerated{suffix}.csv",
+                FORECAST_DIR / f"forecast_arima{suffix}.csv",
+                FORECAST_DIR / f"arima_fits{suffix}.csv",
+                SCENARIO_CUBE_FILE.with_name(f"{SCENARIO_CUBE_FILE.stem}{suffix}.npy"),
+                SCENARIO_CUBE_FILE.with_name(f"{SCENARIO_CUBE_FILE.stem}{suffix}.json"),
+            ],
+        },
+    ]
+
+
+# Quarterly/monthly stages only exist once there are snapshots to build them from
+if discover_snapshot_files(EV_SNAPSHOT_PATTERN) and discover_snapshot_files(PORTS_SNAPSHOT_PATTERN):
+    for _freq in (QUARTERLY, MONTHLY):
+        STAGES.extend(period_stages(_freq))
+
+
+# =========================================================================================================
+# Fingerprints
+# =========================================================================================================
+def file_digest(path: Path) -> str:
+    """sha256 of a file's contents, or 'missing' if it does not exist."""
+    path = Path(path)
+    if not path.exists():
+        return "missing"
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _rel(path: Path) -> str:
+    path = Path(path).resolve()
+    try:
+        return str(path.relative_to(PROJECT_ROOT))
+    except ValueError:
+        return str(path)
+
+
+def _module_path(name: str):
+    """Source file of src module `name` (without importing it), or None if it is not one."""
+    base = PROJECT_ROOT.joinpath(*name.split("."))
+    for path in (base.with_suffix(".py"), base / "__init__.py"):
+        if path.is_file():
+            return path
+    return None
+
+
+def _src_imports(path: Path) -> set[str]:
+    """src.* modules imported anywhere in a file (including function-level imports)."""
+    names = set()
+    for node in ast.walk(ast.parse(path.read_text(), filename=str(path))):
+        if isinstance(node, ast.Import):
+            names.update(a.name for a in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module)
+            # `from src.analysis import scenarios` imports a submodule
+            names.update(f"{node.module}.{a.name}" for a in node.names)
+    return {n for n in names if n == "src" or n.startswith("src.")}
+
+
+@functools.lru_cache(maxsize=None)
+def module_sources(module: str) -> tuple[Path, ...]:
+    """Source files of `module` and every src.* module it imports, transitively."""
+    seen = {}
+    todo = [module]
+    while todo:
+        name = todo.pop()
+        if name in seen:
+            continue
+        path = _module_path(name)
+        seen[name] = path
+        if path is not None:
+            todo.extend(_src_imports(path))
+    return tuple(sorted({p for p in seen.values() if p is not None}))
+
+
+def _code_files(stage: dict) -> list[Path]:
+    """The stage module's transitive src.* imports, plus any extra "code" files."""
+    return list(module_sources(stage["module"])) + list(stage.get("code", []))
+
+
+def stage_fingerprint(stage: dict) -> str:
+    """Combined hash of a stage's input files and source code."""
+    parts = {
+        "inputs": {_rel(p): file_digest(p) for p in stage["inputs"]},
+        "code": {_rel(p): file_digest(p) for p in _code_files(stage)},
+        "entry": stage["entry"],
+        "kwargs": stage.get("kwargs", {}),
+    }
+    blob = json.dumps(parts, sort_keys=True).encode()
+    return hashlib.sha256(blob).hexdigest()
+
+
+def load_state() -> dict:
+    if STATE_FILE.exists():
+        with STATE_FILE.open() as f:
+            return json.load(f)
+    return {}
+
+
+def save_state(state: dict) -> None:
+    tmp = STATE_FILE.with_suffix(".tmp")
+    with tmp.open("w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    tmp.replace(STATE_FILE)
+
+
+def is_current(stage: dict, state: dict) -> bool:
+    """True if the recorded fingerprint matches and every output exists."""
+    recorded = state.get(stage["name"])
+    if recorded is None:
+        return False
+    if any(not Path(p).exists() for p in stage["outputs"]):
+        return False
+    return recorded == stage_fingerprint(stage)
+
+
+def mark_current(names) -> None:
+    """Record the given stages as up to date (e.g. after an incremental ingest)."""
+    state = load_state()
+    for stage in STAGES:
+        if stage["name"] in names:
+            state[stage["name"]] = stage_fingerprint(stage)
+    save_state(state)
+
+
+# =========================================================================================================
+# Runner
+# =========================================================================================================
+def downstream_of(names: set[str]) -> set[str]:
+    """All stages that (transitively) read an output of the given stages."""
+    produced = {}
+    for stage in STAGES:
+        for p in stage["outputs"]:
+            produced[Path(p).resolve()] = stage["name"]
+
+    dirty = set(names)
+    for stage in STAGES:
+        upstream = {produced.get(Path(p).resolve()) for p in stage["inputs"]}
+        if upstream & dirty:
+            dirty.add(stage["name"])
+    return dirty
+
+
+def stale_stages(state: dict, force: bool = False) -> set[str]:
+    """
+    Stages that are out of date plus everything downstream of them. Both the
+    dry run and the real run select stages with this, so they agree.
+    """
+    stale = {s["name"] for s in STAGES if force or not is_current(s, state)}
+    return downstream_of(stale)
+
+
+def run_stage(stage: dict, profile: bool = False, trace_memory: bool = False) -> dict:
+    """Run one stage under the instrumentation layer; returns its log entry."""
+    with instrumented(stage["name"], profile=profile, trace_memory=trace_memory,
+                      module=stage["module"]) as rec:
+        module = importlib.import_module(stage["module"])
+        getattr(module, stage["entry"])(**stage.get("kwargs", {}))
+    return rec.entry
+
+
+def run(only=None, force=False, dry_run=False, profile=(), trace_memory=()) -> list[str]:
+    """
+    Run out-of-date stages in dependency order and return the names that ran
+    (or would run, with dry_run=True). Stages named in `profile` /
+    `trace_memory` run under cProfile / tracemalloc.
+    """
+    known = {s["name"] for s in STAGES}
+    for names in (only, profile, trace_memory):
+        unknown = set(names or ()) - known
+        if unknown:
+            raise ValueError(f"Unknown stage(s): {sorted(unknown)}. Known: {sorted(known)}")
+
+    state = load_state()
+    stale = stale_stages(state, force)
+    ran = []
+
+    for stage in STAGES:
+        name = stage["name"]
+        if only and name not in only:
+            continue
+        if name not in stale:
+            if dry_run:
+                print(f"[skip] {name}")
+                continue
+            print(f"[skip] {name} (up to date)")
+            append_log({"run_id": RUN_ID, "stage": name, "module": stage["module"], "status": "skipped"})
+            continue
+        if dry_run:
+            print(f"[run] {name}")
+            ran.append(name)
+            continue
+
+        print(f"[run]  {name}")
+        entry = run_stage(stage, profile=name in profile, trace_memory=name in trace_memory)
+        print(f"[done] {format_entry(entry)}")
+
+        # Record the fingerprint only after a successful run
+        state[name] = stage_fingerprint(stage)
+        save_state(state)
+        ran.append(name)
+
+    return ran
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the EV panel pipeline incrementally.")
+    parser.add_argument("--only", nargs="+", metavar="STAGE", help="run only these stages")
+    parser.add_argument("--force", action="store_true", help="ignore fingerprints and rerun")
+    parser.add_argument("--dry-run", action="store_true", help="report stages that would run")
+    parser.add_argument("--profile", nargs="+", default=[], metavar="STAGE",
+                        help="run these stages under cProfile")
+    parser.add_argument("--trace-memory", nargs="+", default=[], metavar="STAGE",
+                        help="record the top allocation sites of these stages (tracemalloc)")
+    args = parser.parse_args()
+
+    ran = run(only=args.only, force=args.force, dry_run=args.dry_run,
+              profile=args.profile, trace_memory=args.trace_memory)
+    verb = "Would run" if args.dry_run else "Ran"
+    print(f"\n{verb} {len(ran)} of {len(STAGES)} stages.")
+    if not args.dry_run:
+        print(f"Stage log: run {RUN_ID} in {RUN_LOG_FILE} (summary: python -m src.instrument)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Typed columnar storage for the cleaned tables and the panel.
+
+Each cleaned table is written as Parquet next to its CSV path from config.py
+(e.g. panel.csv -> panel.parquet) with an explicit schema: int16 years,
+categorical states and float32 metrics. Reads support column projection and
+memory-mapped access. The CSV copy is still written when WRITE_CSV_EXPORTS is
+on (it is what the report links to), and can be regenerated at any time with:
+
+    python -m src.storage
+
+pyarrow is optional: without it tables are read/written as CSV using the same
+dtypes.
+"""
+from pathlib import Path
+
+import pandas as pd
+
+from src.config import (
+    PORTS_CLEAN_FILE,
+    STATION_COUNTS_CLEAN_FILE,
+    POP_CLEAN_FILE,
+    GAS_CLEAN_FILE,
+    EV_REG_CLEAN_FILE,
+    PANEL_FILE,
+    PERIOD_PANEL_FILES,
+    WRITE_CSV_EXPORTS,
+)
+from src.instrument import record
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+    pq = None
+
+TABLE_FILES = [
+    PORTS_CLEAN_FILE, STATION_COUNTS_CLEAN_FILE, EV_REG_CLEAN_FILE, POP_CLEAN_FILE, GAS_CLEAN_FILE, PANEL_FILE,
+    *(p for p in PERIOD_PANEL_FILES.values() if p != PANEL_FILE),
+]
+
+# Counts that can exceed float32's exact-integer range (2**24) stay float64.
+SCHEMAS = {
+    PORTS_CLEAN_FILE.name: {
+        "state": "category",
+        "state_fips": "int16",
+        "year": "int16",
+        "ports_total": "float32",
+    },
+    STATION_COUNTS_CLEAN_FILE.name: {
+        "state": "category",
+        "state_fips": "int16",
+        "year": "int16",
+        "fuel": "category",
+        "stations": "Int32",
+        "outlets": "Int32",
+    },
+    EV_REG_CLEAN_FILE.name: {
+        "state": "category",
+        "state_fips": "int16",
+        "year": "int16",
+        "ev_count": "int32",
+        "phev_count": "Int32",
+        "hev_count": "Int32",
+    },
+    POP_CLEAN_FILE.name: {
+        "state_fips": "Int16",
+        "state": "category",
+        "population": "float64",
+        "year": "int16",
+    },
+    GAS_CLEAN_FILE.name: {
+        "year": "int16",
+        "gas_real_2023": "float32",
+    },
+    PANEL_FILE.name: {
+        "state": "category",
+        "year": "int16",
+        "ev_count": "int32",
+        "ports_total": "float32",
+        "state_fips": "Int16",
+        "population": "float64",
+        "gas_real_2023": "float32",
+        "ev_per_1000": "float32",
+        "ports_per_100k": "float32",
+    },
+}
+
+# Quarterly/monthly panels: the annual panel's schema plus the int32 period key
+SCHEMAS.update({
+    path.name: {**SCHEMAS[PANEL_FILE.name], "state_fips": "int16", "period": "int32"}
+    for freq, path in PERIOD_PANEL_FILES.items()
+    if freq != "A"
+})
+
+
+def has_parquet() -> bool:
+    return pq is not None
+
+
+def parquet_path(csv_path: Path) -> Path:
+    return Path(csv_path).with_suffix(".parquet")
+
+
+def stored_path(csv_path: Path) -> Path:
+    """Path of the primary copy of a table (Parquet if available, else CSV)."""
+    return parquet_path(csv_path) if has_parquet() else Path(csv_path)
+
+
+def apply_schema(df: pd.DataFrame, csv_path: Path) -> pd.DataFrame:
+    """Cast the columns listed in the table's schema; other columns are left alone."""
+    schema = SCHEMAS.get(Path(csv_path).name, {})
+    casts = {c: t for c, t in schema.items() if c in df.columns}
+    out = df.astype(casts)
+    for c, t in casts.items():
+        if t == "category":
+            out[c] = out[c].cat.remove_unused_categories()
+    return out
+
+
+def write_table(df: pd.DataFrame, csv_path: Path, csv: bool = WRITE_CSV_EXPORTS) -> pd.DataFrame:
+    """
+    Write a cleaned table with its schema applied. Returns the typed frame.
+    """
+    csv_path = Path(csv_path)
+    csv_path.parent.mkdir(parents=True, exist_ok=True)
+    typed = apply_schema(df.reset_index(drop=True), csv_path)
+
+    if has_parquet():
+        table = pa.Table.from_pandas(typed, preserve_index=False)
+        pq.write_table(table, parquet_path(csv_path))
+    if csv or not has_parquet():
+        typed.to_csv(csv_path, index=False)
+    record(rows_out=len(typed))
+    return typed
+
+
+def read_table(csv_path: Path, columns=None, memory_map: bool = True) -> pd.DataFrame:
+    """
+    Read a cleaned table, optionally only `columns`.
+
+    Uses the Parquet copy when present (memory-mapped, projected), otherwise
+    falls back to parsing the CSV with the table's schema.
+    """
+    csv_path = Path(csv_path)
+    pq_path = parquet_path(csv_path)
+
+    if has_parquet() and pq_path.exists():
+        table = pq.read_table(pq_path, columns=columns, memory_map=memory_map)
+        df = table.to_pandas()
+    else:
+        schema = SCHEMAS.get(csv_path.name, {})
+        if columns is not None:
+            schema = {c: t for c, t in schema.items() if c in columns}
+        df = pd.read_csv(csv_path, usecols=columns, dtype=schema)
+    record(rows_in=len(df))
+    return df
+
+
+def export_csv(csv_path: Path) -> None:
+    """Regenerate the CSV copy of a table from its Parquet file."""
+    df = read_table(csv_path, memory_map=False)
+    df.to_csv(csv_path, index=False)
+    print(f"Exported {csv_path}")
+
+
+def main():
+    for path in TABLE_FILES:
+        if parquet_path(path).exists():
+            export_csv(path)
+
+
+if __name__ == "__main__":
+    main()
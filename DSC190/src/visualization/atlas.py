@@ -0,0 +1,278 @@
+"""
+Per-unit figure atlas: one 2x2 PNG per state with
+
+    EV trend (actual vs FE fit) | ports trend
+    forecast fan                | FE residuals
+
+The fan spans every scenario in the forecast cube (outlet growth 0-50% per
+year) around the baseline, accelerated and ARIMA paths.
+
+Rendering runs on the Agg backend across a process pool. Each worker builds
+its figure, axes and line artists once and then only swaps the data
+(set_data + autoscale) for every unit it draws, instead of building a new
+pyplot/seaborn figure per PNG. Each unit's inputs are hashed together with
+this module's source. A unit whose hash matches the manifest from the last
+run, and whose PNG still exists, is skipped, so an unchanged atlas costs one
+hashing pass.
+
+The payloads are plain arrays keyed by unit, so a county atlas only needs a
+county panel and forecasts with a different `unit_col`.
+
+Usage (from the DSC190/ folder):
+    python -m src.visualization.atlas            # redraw changed units only
+    python -m src.visualization.atlas --force    # redraw everything
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.config import PANEL_FILE, FORECAST_DIR, SCENARIO_CUBE_FILE, ATLAS_DIR
+from src.storage import read_table
+from src.instrument import record
+from src.analysis.model_cache import cached_fit_within
+from src.analysis.scenarios import cube_axes
+
+MANIFEST_NAME = ".atlas_manifest.json"
+
+# Arrays drawn per unit (all float64; the *_years arrays are the x values)
+PAYLOAD_KEYS = [
+    "years", "ev", "ev_fit", "ports", "resid",
+    "fc_years", "baseline", "accelerated", "arima", "fan_low", "fan_high",
+]
+
+
+# =========================================================================================================
+# Payloads and hashes (parent process)
+# =========================================================================================================
+def _series(df: pd.DataFrame, unit_col: str, time_col: str, value_col: str) -> dict:
+    """unit -> value array aligned to the sorted time values of that unit."""
+    out = {}
+    for unit, g in df.sort_values(time_col).groupby(unit_col, observed=True, sort=False):
+        out[str(unit)] = g[value_col].to_numpy(dtype=float)
+    return out
+
+
+def build_payloads(panel: pd.DataFrame, baseline: pd.DataFrame, accelerated: pd.DataFrame,
+                   arima: pd.DataFrame, cube_path=SCENARIO_CUBE_FILE,
+                   unit_col: str = "State", time_col: str = "Year") -> dict:
+    """
+    unit -> dict of arrays (PAYLOAD_KEYS) for every unit in `panel`, which
+    needs unit_col, time_col, EVs_per_1000 and Outlets_per_100k.
+    """
+    panel = panel.dropna(subset=["EVs_per_1000", "Outlets_per_100k"]).copy()
+    panel[unit_col] = panel[unit_col].astype(str)
+    panel["Year_trend"] = panel[time_col] - panel[time_col].min()
+    model = cached_fit_within(panel, "EVs_per_1000", ["Outlets_per_100k", "Year_trend"], unit_col=unit_col)
+    panel["ev_fit"] = model.fittedvalues
+    panel["resid"] = panel["EVs_per_1000"] - panel["ev_fit"]
+
+    fan = {}
+    if Path(cube_path).exists():
+        axes = cube_axes(cube_path)
+        cube = np.load(cube_path, mmap_mode="r")
+        low, high = cube.min(axis=0), cube.max(axis=0)
+        fan = {u: (low[i].astype(float), high[i].astype(float)) for i, u in enumerate(axes["unit"])}
+        fan_years = np.asarray(axes["year"], dtype=float)
+
+    fc = {
+        "baseline": _series(baseline, unit_col, time_col, "EVs_per_1000_forecast_panel_baseline"),
+        "accelerated": _series(accelerated, unit_col, time_col, "EVs_per_1000_forecast_panel_acc"),
+        "arima": _series(arima, unit_col, time_col, "EVs_per_1000_arima"),
+    }
+    fc_years = np.sort(baseline[time_col].unique()).astype(float)
+
+    payloads = {}
+    for unit, g in panel.sort_values(time_col).groupby(unit_col, sort=True):
+        empty = np.full(len(fc_years), np.nan)
+        low, high = fan.get(unit, (empty, empty))
+        if fan and not np.array_equal(fan_years, fc_years):
+            low, high = empty, empty
+        payloads[unit] = {
+            "years": g[time_col].to_numpy(dtype=float),
+            "ev": g["EVs_per_1000"].to_numpy(dtype=float),
+            "ev_fit": g["ev_fit"].to_numpy(dtype=float),
+            "ports": g["Outlets_per_100k"].to_numpy(dtype=float),
+            "resid": g["resid"].to_numpy(dtype=float),
+            "fc_years": fc_years,
+            **{name: fc[name].get(unit, empty) for name in fc},
+            "fan_low": low,
+            "fan_high": high,
+        }
+    return payloads
+
+
+def _code_digest() -> str:
+    return hashlib.sha256(Path(__file__).read_bytes()).hexdigest()
+
+
+def payload_hash(unit: str, payload: dict, code_digest: str) -> str:
+    h = hashlib.sha256(code_digest.encode())
+    h.update(unit.encode())
+    for key in PAYLOAD_KEYS:
+        h.update(np.ascontiguousarray(payload[key], dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+
+def unit_filename(unit: str) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "_", unit.lower()).strip("_")
+    return f"atlas_{slug}.png"
+
+
+# =========================================================================================================
+# Rendering (worker processes)
+# =========================================================================================================
+_figure = None
+
+
+class AtlasFigure:
+    """One reusable figure; `draw` swaps a unit's data into the existing artists."""
+
+    def __init__(self, dpi: int = 110):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        # A bare Figure on its own Agg canvas: no pyplot state, no GUI manager,
+        # and savefig renders once instead of switching canvases on every call
+        self.fig = Figure(figsize=(11, 8), dpi=dpi)
+        FigureCanvasAgg(self.fig)
+        (self.ax_ev, self.ax_ports), (self.ax_fan, self.ax_resid) = self.fig.subplots(2, 2)
+
+        self.ev_line, = self.ax_ev.plot([], [], "o-", color="tab:blue", label="Actual")
+        self.fit_line, = self.ax_ev.plot([], [], "--", color="tab:gray", label="FE fit")
+        self.ax_ev.set_ylabel("EVs per 1,000 people")
+        self.ax_ev.legend(loc="upper left")
+
+        self.ports_line, = self.ax_ports.plot([], [], "s-", color="tab:green")
+        self.ax_ports.set_ylabel("Public ports per 100k people")
+        self.ax_ports.set_title("Charging ports")
+
+        self.hist_line, = self.ax_fan.plot([], [], "o-", color="tab:blue", label="Observed")
+        self.base_line, = self.ax_fan.plot([], [], "-", color="black", label="Baseline")
+        self.acc_line, = self.ax_fan.plot([], [], "-", color="tab:red", label="Accelerated")
+        self.arima_line, = self.ax_fan.plot([], [], ":", color="tab:purple", label="ARIMA")
+        self.fan = None
+        self.ax_fan.set_ylabel("EVs per 1,000 people")
+        self.ax_fan.set_title("Forecast fan (0-50% outlet growth)")
+        self.ax_fan.legend(loc="upper left", fontsize=8)
+
+        self.resid_line, = self.ax_resid.plot([], [], "o", color="black")
+        self.ax_resid.axhline(0, color="tab:red", linestyle="--")
+        self.ax_resid.set_ylabel("Residual (EVs per 1,000)")
+        self.ax_resid.set_title("FE residuals")
+
+        for ax in (self.ax_ev, self.ax_ports, self.ax_fan, self.ax_resid):
+            ax.set_xlabel("Year")
+        # Lay out once; only data and the first title change between units
+        self.ax_ev.set_title("EV adoption")
+        self.fig.tight_layout()
+
+    def draw(self, unit: str, p: dict, out_path: Path) -> None:
+        self.ev_line.set_data(p["years"], p["ev"])
+        self.fit_line.set_data(p["years"], p["ev_fit"])
+        self.ax_ev.set_title(f"{unit}: EV adoption")
+        self.ports_line.set_data(p["years"], p["ports"])
+        self.resid_line.set_data(p["years"], p["resid"])
+
+        self.hist_line.set_data(p["years"], p["ev"])
+        self.base_line.set_data(p["fc_years"], p["baseline"])
+        self.acc_line.set_data(p["fc_years"], p["accelerated"])
+        self.arima_line.set_data(p["fc_years"], p["arima"])
+        if self.fan is not None:
+            self.fan.remove()
+        self.fan = self.ax_fan.fill_between(
+            p["fc_years"], p["fan_low"], p["fan_high"], color="tab:gray", alpha=0.25, linewidth=0
+        )
+
+        for ax in (self.ax_ev, self.ax_ports, self.ax_fan, self.ax_resid):
+            ax.relim()
+            ax.autoscale_view()
+        self.fig.savefig(out_path)
+
+
+def _render_chunk(args) -> list[str]:
+    """Draw a list of (unit, payload, path) with this worker's figure."""
+    global _figure
+    if _figure is None:
+        _figure = AtlasFigure()
+    done = []
+    for unit, payload, out_path in args:
+        _figure.draw(unit, payload, out_path)
+        done.append(unit)
+    return done
+
+
+def _chunks(items: list, n: int) -> list[list]:
+    return [items[i::n] for i in range(n) if items[i::n]]
+
+
+def render_atlas(payloads: dict, out_dir: Path = ATLAS_DIR, force: bool = False,
+                 max_workers: int = None) -> list[str]:
+    """
+    Draw every unit whose inputs changed since the last run. Returns the
+    units drawn.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_dir / MANIFEST_NAME
+    manifest = {}
+    if manifest_path.exists() and not force:
+        with manifest_path.open() as f:
+            manifest = json.load(f)
+
+    code = _code_digest()
+    hashes = {unit: payload_hash(unit, p, code) for unit, p in payloads.items()}
+    todo = [
+        (unit, payloads[unit], out_dir / unit_filename(unit))
+        for unit in payloads
+        if force or manifest.get(unit) != hashes[unit] or not (out_dir / unit_filename(unit)).exists()
+    ]
+
+    drawn = []
+    if todo:
+        max_workers = max_workers or min(len(todo), os.cpu_count() or 1)
+        # One chunk per worker, so each figure is built once per process
+        chunks = _chunks(todo, max_workers)
+        if max_workers == 1:
+            drawn = _render_chunk(todo)
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                for units in pool.map(_render_chunk, chunks):
+                    drawn.extend(units)
+
+    # Keep entries only for units still in the atlas
+    with manifest_path.open("w") as f:
+        json.dump({unit: hashes[unit] for unit in payloads}, f, indent=2, sort_keys=True)
+
+    skipped = len(payloads) - len(drawn)
+    record(cache_hits=skipped, cache_misses=len(drawn), rows_out=len(drawn))
+    print(f"Atlas: drew {len(drawn)} units, {skipped} unchanged, in {out_dir}")
+    return drawn
+
+
+def main(force: bool = False, max_workers: int = None) -> None:
+    panel = read_table(PANEL_FILE, columns=["state", "year", "ev_per_1000", "ports_per_100k"])
+    panel = panel.rename(columns={
+        "state": "State", "year": "Year",
+        "ev_per_1000": "EVs_per_1000", "ports_per_100k": "Outlets_per_100k",
+    })
+    baseline = pd.read_csv(FORECAST_DIR / "forecast_panel_baseline.csv")
+    accelerated = pd.read_csv(FORECAST_DIR / "forecast_panel_accelerated.csv")
+    arima = pd.read_csv(FORECAST_DIR / "forecast_arima.csv")
+
+    payloads = build_payloads(panel, baseline, accelerated, arima)
+    render_atlas(payloads, force=force, max_workers=max_workers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the per-state figure atlas.")
+    parser.add_argument("--force", action="store_true", help="redraw every unit")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    main(force=args.force, max_workers=args.workers)
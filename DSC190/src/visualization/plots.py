@@ -3,6 +3,7 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 
 from src.config import PANEL_FILE, FIGURES_DIR, GAS_CLEAN_FILE
+from src.storage import read_table
 
 
 def build_national_ev_gas(panel: pd.DataFrame, gas: pd.DataFrame) -> pd.DataFrame:
@@ -36,7 +37,7 @@ def build_national_ev_gas(panel: pd.DataFrame, gas: pd.DataFrame) -> pd.DataFram
     return merged
 
 
-def plot_ev_gas_timeseries(merged: pd.DataFrame) -> None:
+def plot_ev_gas_timeseries(merged: pd.DataFrame, out_dir=FIGURES_DIR) -> None:
     """Time-series plot of national EV adoption and real gas prices."""
     fig, ax1 = plt.subplots(figsize=(8, 5))
 
@@ -71,13 +72,13 @@ def plot_ev_gas_timeseries(merged: pd.DataFrame) -> None:
     ax1.legend(lines + lines2, labels + labels2, loc="upper left")
 
     fig.tight_layout()
-    out_path = FIGURES_DIR / "ev_gas_timeseries.png"
+    out_path = out_dir / "ev_gas_timeseries.png"
     plt.savefig(out_path, dpi=150)
     print(f"Saved {out_path}")
     plt.close(fig)
 
 
-def plot_ev_vs_gas_scatter_levels(merged: pd.DataFrame) -> None:
+def plot_ev_vs_gas_scatter_levels(merged: pd.DataFrame, out_dir=FIGURES_DIR) -> None:
     """Scatter of national EV per 1,000 vs real gas prices (levels)."""
     plt.figure(figsize=(6, 5))
     sns.regplot(
@@ -102,13 +103,13 @@ def plot_ev_vs_gas_scatter_levels(merged: pd.DataFrame) -> None:
     plt.title("National EV Adoption vs Gas Price (Levels)")
     plt.tight_layout()
 
-    out_path = FIGURES_DIR / "ev_vs_gas_scatter_levels.png"
+    out_path = out_dir / "ev_vs_gas_scatter_levels.png"
     plt.savefig(out_path, dpi=150)
     print(f"Saved {out_path}")
     plt.close()
 
 
-def plot_ev_vs_gas_scatter_growth(merged: pd.DataFrame) -> None:
+def plot_ev_vs_gas_scatter_growth(merged: pd.DataFrame, out_dir=FIGURES_DIR) -> None:
     """Scatter of national EV growth vs gas price growth (year-to-year % change)."""
     growth = merged.dropna(subset=["ev_growth", "gas_growth"]).copy()
     if growth.empty:
@@ -138,13 +139,13 @@ def plot_ev_vs_gas_scatter_growth(merged: pd.DataFrame) -> None:
     plt.title("EV Adoption vs Gas Price (Growth Rates)")
     plt.tight_layout()
 
-    out_path = FIGURES_DIR / "ev_vs_gas_scatter_growth.png"
+    out_path = out_dir / "ev_vs_gas_scatter_growth.png"
     plt.savefig(out_path, dpi=150)
     print(f"Saved {out_path}")
     plt.close()
 
 
-def lineplot_top_states_ev(panel: pd.DataFrame, top_n: int = 5) -> None:
+def lineplot_top_states_ev(panel: pd.DataFrame, top_n: int = 5, out_dir=FIGURES_DIR) -> None:
     """Line plot of EV adoption over time for the top N states."""
     latest_year = panel["year"].max()
     latest = panel[panel["year"] == latest_year].copy()
@@ -155,6 +156,8 @@ def lineplot_top_states_ev(panel: pd.DataFrame, top_n: int = 5) -> None:
     )
 
     subset = panel[panel["state"].isin(top_states)].copy()
+    # Plain strings so the legend only lists the plotted states
+    subset["state"] = subset["state"].astype(str)
 
     plt.figure(figsize=(8, 5))
     sns.lineplot(
@@ -169,13 +172,13 @@ def lineplot_top_states_ev(panel: pd.DataFrame, top_n: int = 5) -> None:
     plt.xlabel("Year")
     plt.tight_layout()
 
-    out_path = FIGURES_DIR / "ev_per_1000_top_states.png"
+    out_path = out_dir / "ev_per_1000_top_states.png"
     plt.savefig(out_path, dpi=150)
     print(f"Saved {out_path}")
     plt.close()
 
 
-def scatter_ports_vs_ev(panel: pd.DataFrame) -> None:
+def scatter_ports_vs_ev(panel: pd.DataFrame, out_dir=FIGURES_DIR) -> None:
     """Scatter of ports per 100k vs EVs per 1,000 by state-year."""
     plt.figure(figsize=(7, 5))
     sns.scatterplot(
@@ -189,15 +192,15 @@ def scatter_ports_vs_ev(panel: pd.DataFrame) -> None:
     plt.title("EV Adoption vs Public Charging Ports (State-Year)")
     plt.tight_layout()
 
-    out_path = FIGURES_DIR / "ports_vs_ev_scatter.png"
+    out_path = out_dir / "ports_vs_ev_scatter.png"
     plt.savefig(out_path, dpi=150)
     print(f"Saved {out_path}")
     plt.close()
 
 
 def main() -> None:
-    panel = pd.read_csv(PANEL_FILE)
-    gas = pd.read_csv(GAS_CLEAN_FILE)
+    panel = read_table(PANEL_FILE)
+    gas = read_table(GAS_CLEAN_FILE)
 
     # State-level EV vs ports plots
     lineplot_top_states_ev(panel, top_n=5)